@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Optional, Any
+
+CACHE_PATH = "./analysis_cache/analyses.sqlite3"
+TTL_SECONDS = 7 * 24 * 3600  # One week
+MAX_CACHE_BYTES = 64 * 1024 * 1024  # 64 MB
+
+def analysis_key(model: str, messages: List[Dict[str, str]], issue_updated_at: Optional[str] = None,
+                 commit_sha: Optional[str] = None) -> str:
+    """
+    Cache key for one Sonar call.
+
+    Combines the issue revision (its updatedAt), the repository commit, the
+    model and a hash of the exact prompt, so any change to the issue, the
+    code or the prompt construction produces a new key.
+    """
+    prompt_hash = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+    raw = json.dumps([issue_updated_at, commit_sha, model, prompt_hash])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class AnalysisCache:
+    """
+    Persistent SQLite cache of Sonar answers and their citations.
+
+    Entries expire after ttl seconds. When the stored answers exceed
+    max_bytes, the least recently read entries are evicted first. SQLite
+    keeps the cache safe to share between Streamlit sessions and processes.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = TTL_SECONDS, max_bytes: int = MAX_CACHE_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS analyses (
+                       key TEXT PRIMARY KEY,
+                       content TEXT NOT NULL,
+                       citations TEXT NOT NULL,
+                       response TEXT,
+                       created REAL NOT NULL,
+                       accessed REAL NOT NULL,
+                       size INTEGER NOT NULL
+                   )"""
+            )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return {'content', 'citations', 'response'} for a fresh entry, or None."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT content, citations, response, created FROM analyses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[3] > self.ttl:
+                conn.execute("DELETE FROM analyses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE analyses SET accessed = ? WHERE key = ?", (now, key))
+        return {
+            "content": row[0],
+            "citations": json.loads(row[1]),
+            "response": json.loads(row[2]) if row[2] else None,
+        }
+
+    def put(self, key: str, content: str, citations: List[str], response: Optional[Dict[str, Any]] = None):
+        """Store an answer, then drop expired and least recently used entries."""
+        now = time.time()
+        citations_json = json.dumps(list(citations or []))
+        response_json = json.dumps(response) if response is not None else None
+        size = len(content) + len(citations_json) + len(response_json or "")
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, content, citations_json, response_json, now, now, size),
+            )
+            conn.execute("DELETE FROM analyses WHERE created < ?", (now - self.ttl,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM analyses").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, old_size in conn.execute(
+                    "SELECT key, size FROM analyses ORDER BY accessed ASC"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM analyses WHERE key = ?", (old_key,))
+                    total -= old_size
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
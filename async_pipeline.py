@@ -0,0 +1,123 @@
+import asyncio
+import io
+from typing import List, Dict, Tuple, Optional, Any, Callable
+
+import httpx
+from openai import AsyncOpenAI
+
+from github_api import GITHUB_API_URL, build_issue_request, github_headers, parse_issue_response
+from repo_crawler import archive_url, extract_code_files_from_zip, MAX_SCAN_FILES
+from sonar_api import (API_KEY, SONAR_BASE_URL, SONAR_MODEL, MAX_RESPONSE_TOKENS,
+                       analyze_issue_relevance, build_context_messages)
+from utils import parse_github_url
+
+async def run_analysis(repo_url: str, issue_number, branch: str = "main",
+                       allowed_exts: Tuple[str, ...] = (".py", ".js", ".java", ".ts", ".go"),
+                       max_files: int = 20,
+                       on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Analyze an issue with overlapping network stages.
+
+    The repository archive download starts as soon as the URL is parsed and
+    runs concurrently with the GraphQL issue fetch. Extraction, ranking and
+    prompt construction run in a worker thread, and the Sonar answer is
+    streamed, with every content delta passed to on_token as it arrives.
+
+    The archive is read in memory (see extract_code_files_from_zip); this
+    path does not go through the snapshot cache. Every eligible file is
+    scanned and the max_files best matches go into the prompt.
+
+    Returns:
+        Dictionary with the issue, the ranked code chunks, the response
+        content and its citations
+    """
+    owner, repo = parse_github_url(repo_url)
+    if not owner:
+        raise ValueError(f"Invalid GitHub URL: {repo_url}")
+
+    async with httpx.AsyncClient(timeout=30, follow_redirects=True) as http:
+        archive_task = asyncio.create_task(fetch_repo_archive_async(http, owner, repo, branch))
+        try:
+            issue = await fetch_issue_async(http, owner, repo, issue_number)
+            if issue is None:
+                raise Exception(f"Issue #{issue_number} not found or GitHub API error")
+            archive = await archive_task
+        finally:
+            if not archive_task.done():
+                archive_task.cancel()
+
+    repository_chunks = await asyncio.to_thread(extract_code_files_from_zip, archive, allowed_exts, MAX_SCAN_FILES)
+    code_chunks = await asyncio.to_thread(analyze_issue_relevance, issue['title'], issue['body'], repository_chunks,
+                                          top_k=max_files)
+    messages = await asyncio.to_thread(build_context_messages, issue['title'], issue['body'], code_chunks,
+                                       repository_chunks=repository_chunks)
+
+    answer = await stream_sonar_async(messages, on_token=on_token)
+
+    return {
+        "issue": issue,
+        "code_chunks": code_chunks,
+        "content": answer["content"],
+        "citations": answer["citations"],
+    }
+
+def run_analysis_sync(*args, **kwargs) -> Dict[str, Any]:
+    """Run run_analysis from synchronous code (e.g. a Streamlit script)."""
+    return asyncio.run(run_analysis(*args, **kwargs))
+
+async def fetch_issue_async(http: httpx.AsyncClient, owner: str, repo: str, issue_number) -> Optional[Dict[str, Any]]:
+    """Async counterpart of github_api.get_issue_data."""
+    try:
+        response = await http.post(GITHUB_API_URL, json=build_issue_request(owner, repo, issue_number),
+                                   headers=github_headers())
+    except httpx.HTTPError as e:
+        print(f"Network error: {e}")
+        return None
+
+    if response.status_code != 200:
+        print(f"GitHub API Error: HTTP {response.status_code}")
+        return None
+
+    return parse_issue_response(response.json(), owner, repo, issue_number)
+
+async def fetch_repo_archive_async(http: httpx.AsyncClient, owner: str, repo: str, branch: str) -> io.BytesIO:
+    """Download the repository ZIP into memory without writing it to disk."""
+    refs = [branch, "master"] if branch == "main" else [branch]
+    for ref in refs:
+        async with http.stream("GET", archive_url(owner, repo, ref)) as response:
+            if response.status_code != 200:
+                status = response.status_code
+                continue
+            buffer = io.BytesIO()
+            async for block in response.aiter_bytes():
+                buffer.write(block)
+            buffer.seek(0)
+            return buffer
+
+    raise Exception(f"Could not download repository. HTTP {status}")
+
+async def stream_sonar_async(messages: List[Dict[str, str]],
+                             on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """Stream a Sonar completion, passing each content delta to on_token."""
+    parts = []
+    citations = []
+
+    async with AsyncOpenAI(api_key=API_KEY, base_url=SONAR_BASE_URL) as client:
+        stream = await client.chat.completions.create(
+            model=SONAR_MODEL,
+            messages=messages,
+            max_tokens=MAX_RESPONSE_TOKENS,
+            stream=True,
+        )
+        async for chunk in stream:
+            # Perplexity attaches the citations to the streamed chunks
+            citations = getattr(chunk, 'citations', None) or citations
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                if on_token:
+                    on_token(delta)
+
+    return {"content": "".join(parts), "citations": citations}
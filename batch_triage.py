@@ -0,0 +1,153 @@
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Tuple, Optional, Any
+
+import openai
+
+from github_api import get_issues_data, GITHUB_TOKEN
+from repo_crawler import crawl_repo_snapshot, MAX_SCAN_FILES
+from sonar_api import SONAR_MODEL, analyze_issue_relevance, build_context_messages, request_sonar_completion
+from analysis_cache import analysis_key
+from utils import parse_github_url
+
+MAX_RETRIES = 5
+BASE_BACKOFF_SECONDS = 2.0
+MAX_BACKOFF_SECONDS = 60.0
+
+def triage_issues(repo_url: str, issue_numbers: Optional[List[int]] = None,
+                  states: Tuple[str, ...] = ("OPEN",), labels: Optional[List[str]] = None,
+                  limit: Optional[int] = None, branch: str = "main",
+                  allowed_exts: Tuple[str, ...] = (".py", ".js", ".java", ".ts", ".go"),
+                  max_files: int = 20, concurrency: int = 4,
+                  output_path: str = "triage.jsonl") -> List[Dict[str, Any]]:
+    """
+    Analyze many issues of one repository with a single crawl.
+
+    Issues are fetched in batched GraphQL requests (explicit numbers, or a
+    states/labels query), the repository is crawled and indexed once, and
+    the Sonar calls fan out over a bounded thread pool with backoff on rate
+    limits. Each result is appended to output_path as one JSON line as soon
+    as it is ready.
+
+    Returns:
+        List of result records, in completion order
+    """
+    owner, repo = parse_github_url(repo_url)
+    if not owner:
+        raise ValueError(f"Invalid GitHub URL: {repo_url}")
+
+    issues = get_issues_data(owner, repo, issue_numbers=issue_numbers, states=states,
+                             labels=labels, limit=limit)
+    print(f"Fetched {len(issues)} issues from {owner}/{repo}")
+    if not issues:
+        return []
+
+    snapshot = crawl_repo_snapshot(owner, repo, branch, allowed_exts, MAX_SCAN_FILES, token=GITHUB_TOKEN)
+    print(f"Scanned {len(snapshot['code_chunks'])} files at {snapshot['sha'] or 'unknown commit'}")
+
+    results = []
+    write_lock = threading.Lock()
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(triage_issue, issue, snapshot, max_files) for issue in issues]
+        for future in as_completed(futures):
+            record = future.result()
+            with write_lock:
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+            results.append(record)
+            status = "error" if record["error"] else "ok"
+            print(f"[{len(results)}/{len(issues)}] #{record['number']} {status}")
+
+    return results
+
+def triage_issue(issue: Dict[str, Any], snapshot: Dict[str, Any], max_files: int = 20) -> Dict[str, Any]:
+    """Rank the snapshot against one issue and ask Sonar about its max_files best files; errors are recorded, not raised."""
+    record = {
+        "number": issue["number"],
+        "title": issue["title"],
+        "url": issue["url"],
+        "updatedAt": issue.get("updatedAt"),
+        "commit_sha": snapshot["sha"],
+        "files": [],
+        "analysis": None,
+        "citations": [],
+        "error": None,
+    }
+    try:
+        code_chunks = analyze_issue_relevance(issue["title"], issue["body"], snapshot["code_chunks"],
+                                              index=snapshot["index"], top_k=max_files)
+        record["files"] = [c["filename"] for c in code_chunks if c["relevance_score"] > 0][:10]
+
+        messages = build_context_messages(issue["title"], issue["body"], code_chunks,
+                                          graph=snapshot.get("symbol_graph"),
+                                          repository_chunks=snapshot["code_chunks"], commit_sha=snapshot["sha"])
+        key = analysis_key(SONAR_MODEL, messages, issue.get("updatedAt"), snapshot["sha"])
+        response = with_backoff(lambda: request_sonar_completion(messages, key))
+
+        record["analysis"] = response.choices[0].message.content
+        record["citations"] = getattr(response, "citations", None) or []
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+def with_backoff(call, max_retries: int = MAX_RETRIES):
+    """
+    Call with exponential backoff and full jitter on rate limits and server errors.
+
+    A Retry-After header on the error response, when present, sets the
+    minimum wait.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return call()
+        except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError) as e:
+            if attempt == max_retries:
+                raise
+            delay = random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt))
+            response = getattr(e, "response", None)
+            retry_after = response.headers.get("retry-after") if response is not None else None
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            print(f"Sonar call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze many GitHub issues of one repository with a single crawl.")
+    parser.add_argument("repo_url", help="https://github.com/owner/repo")
+    parser.add_argument("--issues", type=int, nargs="+", help="Issue numbers (default: query by state/label)")
+    parser.add_argument("--state", action="append", choices=["OPEN", "CLOSED"],
+                        help="Issue states to query (default: OPEN)")
+    parser.add_argument("--label", action="append", help="Only issues with this label (repeatable)")
+    parser.add_argument("--limit", type=int, help="Maximum number of issues to query")
+    parser.add_argument("--branch", default="main")
+    parser.add_argument("--max-files", type=int, default=20,
+                        help="Best matching files sent to Sonar per issue (the whole repository is scanned)")
+    parser.add_argument("--extensions", default=".py,.js,.java,.ts,.go,.cpp,.c,.rb,.php",
+                        help="File extensions to crawl (comma-separated)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel Sonar calls")
+    parser.add_argument("--output", default="triage.jsonl", help="JSONL file to append results to")
+    args = parser.parse_args()
+
+    triage_issues(
+        args.repo_url,
+        issue_numbers=args.issues,
+        states=tuple(args.state or ["OPEN"]),
+        labels=args.label,
+        limit=args.limit,
+        branch=args.branch,
+        allowed_exts=tuple(ext.strip() for ext in args.extensions.split(',')),
+        max_files=args.max_files,
+        concurrency=args.concurrency,
+        output_path=args.output,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+import argparse
+import http.server
+import io
+import json
+import math
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from types import SimpleNamespace
+from typing import List, Dict, Tuple, Optional, Any
+
+import metrics
+import repo_crawler
+from repo_crawler import download_repo, extract_repo, extract_code_files
+from search_index import SearchIndex
+from code_chunker import chunk_code_files
+
+# Words the synthetic code is built from; the benchmark issue uses some of them
+VOCABULARY = (
+    "user", "session", "token", "cache", "parse", "request", "response", "config",
+    "handler", "login", "order", "payment", "retry", "queue", "worker", "schema",
+    "record", "stream", "buffer", "client", "server", "route", "event", "metric",
+)
+
+BENCH_ISSUE_TITLE = "Login fails when the session token cache expires"
+BENCH_ISSUE_BODY = (
+    "After the cache entry for a user session expires, parseToken raises and the "
+    "login handler returns 500 instead of retrying the request."
+)
+
+LANGUAGES = {
+    ".py": "python",
+    ".js": "javascript",
+    ".go": "go",
+    ".java": "java",
+}
+
+# How often the RSS sampler reads /proc/self/statm
+RSS_SAMPLE_SECONDS = 0.005
+
+def generate_archive(files: int = 200, depth: int = 3, languages: Tuple[str, ...] = (".py", ".js"),
+                     file_kb: float = 4.0, root: str = "bench-main", seed: int = 0) -> bytes:
+    """
+    Build a ZIP archive of a synthetic repository, laid out like a GitHub archive.
+
+    Files are spread over directories up to depth levels deep and are made of
+    generated functions/classes in the requested languages, with sizes varying
+    around file_kb. The same arguments always produce the same archive.
+    """
+    rng = random.Random(seed)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        for n in range(files):
+            ext = languages[n % len(languages)]
+            dirs = [f"{rng.choice(VOCABULARY)}{rng.randrange(4)}" for _ in range(rng.randint(0, depth))]
+            name = "main" if n == 0 else f"{rng.choice(VOCABULARY)}_{n}"
+            path = "/".join([root] + dirs + [name + ext])
+            target = max(64, int(file_kb * 1024 * rng.uniform(0.5, 1.5)))
+            zip_ref.writestr(path, _generate_source(ext, target, rng))
+    return buffer.getvalue()
+
+def _generate_source(ext: str, target_bytes: int, rng: random.Random) -> str:
+    parts = []
+    size = 0
+    while size < target_bytes:
+        a, b = rng.sample(VOCABULARY, 2)
+        func = f"{a}_{b}" if ext == ".py" else a + b.capitalize()
+        stmt = f"{rng.choice(VOCABULARY)}_{rng.choice(VOCABULARY)}"
+        if ext == ".py":
+            part = (f"def {func}({a}, {b}=None):\n"
+                    f"    \"\"\"Handle {a} {b}.\"\"\"\n"
+                    f"    {stmt} = {a}.get('{b}')\n"
+                    f"    if {stmt} is None:\n"
+                    f"        raise KeyError('{b}')\n"
+                    f"    return {stmt}\n\n")
+        elif ext == ".go":
+            part = (f"func {func}({a} string, {b} int) (string, error) {{\n"
+                    f"\tif {b} == 0 {{\n\t\treturn \"\", fmt.Errorf(\"{a}: empty {b}\")\n\t}}\n"
+                    f"\treturn {a}, nil\n}}\n\n")
+        elif ext == ".java":
+            part = (f"public class {func.capitalize()} {{\n"
+                    f"    public String {func}(String {a}, int {b}) {{\n"
+                    f"        if ({b} == 0) {{ throw new IllegalStateException(\"{a}\"); }}\n"
+                    f"        return {a};\n    }}\n}}\n\n")
+        else:
+            part = (f"function {func}({a}, {b}) {{\n"
+                    f"  const {stmt} = {a}[{b}];\n"
+                    f"  if (!{stmt}) {{\n    throw new Error('{b} missing');\n  }}\n"
+                    f"  return {stmt};\n}}\n\n")
+        parts.append(part)
+        size += len(part)
+    return "".join(parts)
+
+def serve_archive(archive: bytes) -> Tuple[http.server.ThreadingHTTPServer, str]:
+    """Serve archive for every *.zip path on a local port; returns (server, base URL)."""
+
+    class ArchiveHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if not self.path.endswith(".zip"):
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Length", str(len(archive)))
+            self.end_headers()
+            self.wfile.write(archive)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ArchiveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+class MockSonarClient:
+    """Stands in for the OpenAI client of sonar_api; answers after a fixed latency."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        from openai.types.chat import ChatCompletion
+        time.sleep(self.latency)
+        prompt_chars = sum(len(m["content"]) for m in messages)
+        return ChatCompletion.model_validate({
+            "id": "bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": "Benchmark answer."},
+            }],
+            "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": 3,
+                      "total_tokens": prompt_chars // 4 + 3},
+        })
+
+class RSSSampler:
+    """Background sampler of the process resident set size, for per-stage peaks."""
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+def current_rss() -> int:
+    """Resident set size in bytes (falls back to the lifetime peak off Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def run_pipeline(archive_path: Optional[str], base_url: Optional[str], work_dir: str,
+                 allowed_exts: Tuple[str, ...], max_files: int) -> List[Dict[str, Any]]:
+    """
+    Run download → extract → walk → index → rank → pack → sonar once.
+
+    Returns one record per stage with wall time, peak RSS and the counters
+    the stage reported through metrics.
+    """
+    import sonar_api
+
+    samples = []
+    run = metrics.begin_run("benchmark")
+
+    def measure(name, func, *args, **kwargs):
+        stages_before = len(run.stages)
+        with RSSSampler() as sampler:
+            started = time.perf_counter()
+            value = func(*args, **kwargs)
+            wall = time.perf_counter() - started
+        sample = {"stage": name, "wall_seconds": wall, "peak_rss": sampler.peak}
+        # Counters come from the instrumented functions themselves
+        for entry in run.stages[stages_before:]:
+            for counter in metrics.COUNTERS:
+                if counter in entry:
+                    sample[counter] = sample.get(counter, 0) + entry[counter]
+        samples.append(sample)
+        return value
+
+    try:
+        temp_dir = os.path.join(work_dir, "downloads")
+        repos_dir = os.path.join(work_dir, "repos")
+        os.makedirs(temp_dir, exist_ok=True)
+        os.makedirs(repos_dir, exist_ok=True)
+
+        if base_url:
+            repo_crawler.GITHUB_WEB_URL = base_url
+            zip_path = measure("download", download_repo, "bench", "bench", "main", temp_dir)
+        else:
+            zip_path = archive_path
+
+        extract_path = measure("extract", extract_repo, zip_path, "bench", repos_dir)
+        code_chunks = measure("walk", extract_code_files, extract_path, allowed_exts, max_files)
+        index = measure("index", lambda: SearchIndex.build(chunk_code_files(code_chunks)))
+        ranked = measure("rank", sonar_api.analyze_issue_relevance,
+                         BENCH_ISSUE_TITLE, BENCH_ISSUE_BODY, code_chunks, index=index)
+        messages = measure("pack", sonar_api.build_context_messages,
+                           BENCH_ISSUE_TITLE, BENCH_ISSUE_BODY, ranked, repository_chunks=code_chunks)
+        measure("sonar", sonar_api.request_sonar_completion, messages)
+    finally:
+        metrics.finish_run(run)
+
+    return samples
+
+def summarize(samples: List[Dict[str, Any]], archive_bytes: int, files: int) -> Dict[str, Dict[str, Any]]:
+    """Per-stage p50/p95/mean latency, throughput and peak RSS over all iterations."""
+    by_stage: Dict[str, List[Dict[str, Any]]] = {}
+    for sample in samples:
+        by_stage.setdefault(sample["stage"], []).append(sample)
+
+    summary = {}
+    for name, stage_samples in by_stage.items():
+        walls = sorted(s["wall_seconds"] for s in stage_samples)
+        mean = sum(walls) / len(walls)
+        entry = {
+            "iterations": len(walls),
+            "p50_seconds": round(percentile(walls, 50), 6),
+            "p95_seconds": round(percentile(walls, 95), 6),
+            "mean_seconds": round(mean, 6),
+            "peak_rss_mb": round(max(s["peak_rss"] for s in stage_samples) / 2 ** 20, 2),
+        }
+        if mean > 0:
+            entry["files_per_second"] = round(files / mean, 2)
+            entry["archive_mb_per_second"] = round(archive_bytes / 2 ** 20 / mean, 2)
+        for counter in metrics.COUNTERS:
+            values = [s[counter] for s in stage_samples if counter in s]
+            if values:
+                entry[counter] = values[-1]
+        summary[name] = entry
+    return summary
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def run_benchmark(files: int = 200, depth: int = 3, languages: Tuple[str, ...] = (".py", ".js"),
+                  file_kb: float = 4.0, iterations: int = 5, warmup: int = 1,
+                  source: str = "server", max_files: Optional[int] = None,
+                  sonar_latency: float = 0.0, seed: int = 0) -> Dict[str, Any]:
+    """
+    Benchmark the crawl → rank → pack pipeline on a synthetic repository.
+
+    The archive is generated once and either served from a local HTTP server
+    (source="server", exercising download_repo) or read from a file path
+    (source="file", download skipped). Sonar is replaced by MockSonarClient,
+    so no network access or API key is used.
+
+    Returns:
+        JSON-serializable report with the configuration, environment and
+        per-stage statistics
+    """
+    import sonar_api
+
+    if source not in ("server", "file"):
+        raise ValueError(f"Unknown archive source: {source}")
+    max_files = max_files or files
+
+    archive = generate_archive(files, depth, languages, file_kb, seed=seed)
+    original_client = sonar_api.client
+    original_web_url = repo_crawler.GITHUB_WEB_URL
+    sonar_api.client = MockSonarClient(sonar_latency)
+    server = None
+    samples = []
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="reposage-bench-") as work_dir:
+            archive_path = os.path.join(work_dir, "bench.zip")
+            with open(archive_path, "wb") as f:
+                f.write(archive)
+            base_url = None
+            if source == "server":
+                server, base_url = serve_archive(archive)
+
+            for i in range(warmup + iterations):
+                iteration_dir = os.path.join(work_dir, f"run{i}")
+                run_samples = run_pipeline(archive_path, base_url, iteration_dir, languages, max_files)
+                if i >= warmup:
+                    samples.extend(run_samples)
+    finally:
+        sonar_api.client = original_client
+        repo_crawler.GITHUB_WEB_URL = original_web_url
+        if server:
+            server.shutdown()
+
+    return {
+        "config": {
+            "files": files, "depth": depth, "languages": list(languages), "file_kb": file_kb,
+            "iterations": iterations, "warmup": warmup, "source": source, "max_files": max_files,
+            "sonar_latency": sonar_latency, "seed": seed, "archive_bytes": len(archive),
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "timestamp": time.time(),
+        "stages": summarize(samples, len(archive), min(files, max_files)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the crawl → rank → pack pipeline.")
+    parser.add_argument("--files", type=int, default=200, help="Files in the synthetic repository")
+    parser.add_argument("--depth", type=int, default=3, help="Maximum directory depth")
+    parser.add_argument("--languages", default=".py,.js",
+                        help=f"Comma-separated extensions out of {','.join(LANGUAGES)}")
+    parser.add_argument("--file-kb", type=float, default=4.0, help="Average file size in KB")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed iterations before measuring")
+    parser.add_argument("--source", choices=["server", "file"], default="server",
+                        help="Serve the archive over local HTTP or read it from disk")
+    parser.add_argument("--max-files", type=int, help="max_files passed to the crawler (default: all files)")
+    parser.add_argument("--sonar-latency", type=float, default=0.0, help="Seconds the mocked Sonar call takes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    languages = tuple(ext.strip() for ext in args.languages.split(","))
+    unknown = [ext for ext in languages if ext not in LANGUAGES]
+    if unknown:
+        parser.error(f"Unsupported languages: {', '.join(unknown)}")
+
+    report = run_benchmark(
+        files=args.files,
+        depth=args.depth,
+        languages=languages,
+        file_kb=args.file_kb,
+        iterations=args.iterations,
+        warmup=args.warmup,
+        source=args.source,
+        max_files=args.max_files,
+        sonar_latency=args.sonar_latency,
+        seed=args.seed,
+    )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+from array import array
+from typing import List, Dict, Optional, Any, Iterable, Iterator, Union
+
+from search_index import tokenize
+
+# Keys every chunk exposes, in the order of the old dict representation
+CHUNK_FIELDS = ("filename", "content", "size", "lines")
+
+class ChunkStore:
+    """
+    Columnar store of crawled files.
+
+    File contents are kept once, UTF-8 encoded, in a single buffer (in memory
+    while crawling, memory-mapped when loaded from the snapshot cache) and
+    are referenced by byte offset and length. Filenames, character sizes and
+    line counts are kept in parallel columns. Iterating the store yields
+    CodeChunk views, which decode their content only when it is read, so
+    concurrent sessions working on the same snapshot share one copy of the
+    code through the page cache instead of each holding its own strings.
+    """
+
+    def __init__(self):
+        self.filenames: List[str] = []
+        self.offsets = array("Q")
+        self.lengths = array("Q")
+        self.sizes = array("Q")
+        self.line_counts = array("Q")
+        self._buffer: Union[bytearray, mmap.mmap] = bytearray()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_chunks(cls, code_chunks: Iterable[Any]) -> "ChunkStore":
+        """Copy dict chunks (or views of another store) into a new store, keeping their order."""
+        store = cls()
+        for chunk in code_chunks:
+            store.append(chunk['filename'], chunk['content'], chunk.get('size'), chunk.get('lines'))
+        return store
+
+    def append(self, filename: str, content: str, size: Optional[int] = None,
+               lines: Optional[int] = None) -> "CodeChunk":
+        """Add a file and return its view."""
+        data = content.encode("utf-8", errors="ignore")
+        with self._lock:
+            if not isinstance(self._buffer, bytearray):
+                raise ValueError("A memory-mapped ChunkStore is read-only")
+            self.filenames.append(filename)
+            self.offsets.append(len(self._buffer))
+            self.lengths.append(len(data))
+            self.sizes.append(len(content) if size is None else size)
+            self.line_counts.append(content.count('\n') + 1 if lines is None else lines)
+            self._buffer += data
+            return CodeChunk(self, len(self.filenames) - 1)
+
+    def content(self, i: int) -> str:
+        offset = self.offsets[i]
+        return self._buffer[offset:offset + self.lengths[i]].decode("utf-8", errors="ignore")
+
+    def chunks(self) -> List["CodeChunk"]:
+        return [CodeChunk(self, i) for i in range(len(self.filenames))]
+
+    def __len__(self) -> int:
+        return len(self.filenames)
+
+    def __iter__(self) -> Iterator["CodeChunk"]:
+        return (CodeChunk(self, i) for i in range(len(self.filenames)))
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the shared content buffer."""
+        return len(self._buffer)
+
+    @staticmethod
+    def write(path: str, code_chunks: Iterable[Any]):
+        """
+        Write chunks to path (contents) and path + ".json" (columns).
+
+        Contents are streamed to disk one file at a time, so writing does not
+        need a second in-memory copy of the snapshot. The columns record a
+        digest of the contents, so a crash between replacing the two files
+        is detected by load() instead of mismatching offsets and buffer.
+        """
+        columns = {"filenames": [], "offsets": [], "lengths": [], "sizes": [], "lines": []}
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        offset = 0
+        digest = hashlib.blake2b(digest_size=16)
+        with open(tmp_path, "wb") as f:
+            for chunk in code_chunks:
+                content = chunk['content']
+                data = content.encode("utf-8", errors="ignore")
+                f.write(data)
+                digest.update(data)
+                columns["filenames"].append(chunk['filename'])
+                columns["offsets"].append(offset)
+                columns["lengths"].append(len(data))
+                columns["sizes"].append(chunk.get('size') or len(content))
+                columns["lines"].append(chunk.get('lines') or content.count('\n') + 1)
+                offset += len(data)
+        columns["digest"] = digest.hexdigest()
+        with open(f"{tmp_path}.json", "w", encoding="utf-8") as f:
+            json.dump(columns, f)
+        os.replace(tmp_path, path)
+        os.replace(f"{tmp_path}.json", f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ChunkStore"]:
+        """Open a store written by write() with its contents memory-mapped, or None if missing or torn."""
+        try:
+            with open(f"{path}.json", "r", encoding="utf-8") as f:
+                columns = json.load(f)
+            with open(path, "rb") as f:
+                # mmap cannot map an empty file
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        except (OSError, ValueError):
+            return None
+        if columns.get("digest") != hashlib.blake2b(buffer, digest_size=16).hexdigest():
+            return None
+        store = cls()
+        store.filenames = columns["filenames"]
+        store.offsets = array("Q", columns["offsets"])
+        store.lengths = array("Q", columns["lengths"])
+        store.sizes = array("Q", columns["sizes"])
+        store.line_counts = array("Q", columns["lines"])
+        store._buffer = buffer
+        return store
+
+class CodeChunk:
+    """
+    View of one file in a ChunkStore.
+
+    Reads like the old chunk dicts (chunk['filename'], chunk.get('size'),
+    chunk.keys()) so existing callers keep working, but holds only a store
+    reference, a row number and an optional relevance score. Content,
+    lowercased text and tokens are derived on every access rather than kept.
+    """
+
+    __slots__ = ("store", "row", "relevance_score")
+
+    def __init__(self, store: ChunkStore, row: int, relevance_score: Optional[float] = None):
+        self.store = store
+        self.row = row
+        self.relevance_score = relevance_score
+
+    @property
+    def filename(self) -> str:
+        return self.store.filenames[self.row]
+
+    @property
+    def content(self) -> str:
+        return self.store.content(self.row)
+
+    @property
+    def size(self) -> int:
+        return self.store.sizes[self.row]
+
+    @property
+    def lines(self) -> int:
+        return self.store.line_counts[self.row]
+
+    def lower(self) -> str:
+        return self.content.lower()
+
+    def tokens(self) -> List[str]:
+        return tokenize(self.content)
+
+    def with_score(self, relevance_score: float) -> "CodeChunk":
+        """A view of the same file carrying a relevance score; the content is not copied."""
+        return CodeChunk(self.store, self.row, relevance_score)
+
+    def keys(self) -> List[str]:
+        return list(CHUNK_FIELDS) + (["relevance_score"] if self.relevance_score is not None else [])
+
+    def __getitem__(self, key: str) -> Any:
+        if key in CHUNK_FIELDS or (key == "relevance_score" and self.relevance_score is not None):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self.keys()}
+
+    def __repr__(self) -> str:
+        return f"CodeChunk({self.filename!r}, size={self.size})"
+
+def with_score(chunk: Any, relevance_score: float) -> Any:
+    """Attach a relevance score to a CodeChunk view or, for plain dicts, a copy."""
+    if isinstance(chunk, CodeChunk):
+        return chunk.with_score(relevance_score)
+    return {**chunk, 'relevance_score': relevance_score}
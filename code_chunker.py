@@ -0,0 +1,178 @@
+import ast
+import re
+from typing import List, Dict, Any, Tuple, Iterable, Iterator
+
+# Chunks longer than this many lines are split at nested definitions, then
+# into fixed windows
+MAX_CHUNK_LINES = 150
+
+# Extensions whose blocks are delimited by braces
+BRACE_EXTS = ('.js', '.jsx', '.ts', '.tsx', '.java', '.go', '.c', '.h', '.cpp', '.hpp',
+              '.cc', '.cs', '.php', '.rs', '.kt', '.swift', '.scala')
+
+_MODIFIERS = r"(?:(?:public|private|protected|internal|static|final|abstract|sealed|override|virtual)\s+)+"
+
+# Lines that start a definition in the supported languages
+DEFINITION_RE = re.compile(
+    r"^\s*(?:async\s+def|def|class|module|function|func|fn|interface|struct|enum|impl|"
+    # Rust:  pub struct Config {  /  pub(crate) async fn load(...)
+    r"pub(?:\([^)]*\))?\s+(?:async\s+)?(?:fn|struct|enum|trait|type)\b|trait\s|"
+    # Go:  type Server struct {
+    r"type\s+[\w$]+\s+(?:struct|interface)\b|"
+    r"(?:export\s+)?(?:default\s+)?(?:async\s+)?function|"
+    r"export\s+(?:default\s+)?(?:abstract\s+)?(?:class|const|let|interface|enum)\b|"
+    # Arrow functions:  const handler = async (req) => {
+    r"(?:const|let|var)\s+[\w$]+\s*=\s*(?:async\s+)?(?:\([^)]*\)|[\w$]+)\s*=>|"
+    # Java, C#, Kotlin:  public final class Foo {  /  public static void main(...)
+    + _MODIFIERS + r"(?:class|interface|enum|record|struct)\b|"
+    + _MODIFIERS + r"[\w<>\[\],\s]*\()"
+)
+
+_NAME_RE = re.compile(r"(?:def|class|module|function|func|fn|interface|struct|enum|trait|impl|const|let|var|type|record)\s+"
+                      r"(?:\([^)]*\)\s*)?([A-Za-z_$][\w$]*)|([A-Za-z_$][\w$]*)\s*\(")
+
+
+def chunk_code_files(code_chunks: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Split every extracted file into function/class-level chunks."""
+    return list(iter_code_units(code_chunks))
+
+
+def iter_code_units(code_chunks: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    """Like chunk_code_files, but one file at a time, for single-pass consumers such as SearchIndex.build."""
+    for chunk in code_chunks:
+        yield from chunk_file(chunk['filename'], chunk['content'])
+
+
+def chunk_file(filename: str, content: str) -> List[Dict[str, Any]]:
+    """
+    Split one file into definition-level chunks with 1-based line ranges.
+
+    Python files are split with ast at top-level functions and classes
+    (oversized classes per method); code between definitions is kept as
+    "module" chunks. Other languages use brace depth or indentation to find
+    top-level blocks. Every line of the file ends up in exactly one chunk.
+    """
+    lines = content.split('\n')
+    spans = None
+    if filename.endswith('.py'):
+        spans = _python_spans(content, len(lines))
+    if spans is None:
+        spans = _block_spans(lines, brace=filename.endswith(BRACE_EXTS))
+
+    units = []
+    for start, end, kind, name in _split_oversized(spans, lines):
+        text = '\n'.join(lines[start - 1:end])
+        if not text.strip():
+            continue
+        units.append({
+            "filename": filename,
+            "name": name,
+            "kind": kind,
+            "start_line": start,
+            "end_line": end,
+            "content": text,
+        })
+    return units
+
+
+def _python_spans(content: str, line_count: int):
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return None
+
+    spans = []
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        kind = "class" if isinstance(node, ast.ClassDef) else "function"
+        if kind == "class" and node.end_lineno - start + 1 > MAX_CHUNK_LINES:
+            spans.extend(_python_class_spans(node, start))
+        else:
+            spans.append((start, node.end_lineno, kind, node.name))
+    return _fill_gaps(spans, line_count)
+
+
+def _python_class_spans(node: ast.ClassDef, start: int):
+    spans = []
+    cursor = start
+    for child in node.body:
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            child_start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+            if child_start > cursor:
+                spans.append((cursor, child_start - 1, "class", node.name))
+            spans.append((child_start, child.end_lineno, "method", f"{node.name}.{child.name}"))
+            cursor = child.end_lineno + 1
+    if cursor <= node.end_lineno:
+        spans.append((cursor, node.end_lineno, "class", node.name))
+    return spans
+
+
+def _block_spans(lines: List[str], brace: bool):
+    """Find top-level blocks by brace depth, or by indentation for other languages."""
+    spans = []
+    depth = 0
+    start = None
+    for i, line in enumerate(lines, 1):
+        stripped = line.strip()
+        at_top = depth == 0 and stripped and not line[0].isspace()
+        if at_top and DEFINITION_RE.match(line):
+            if start is not None:
+                spans.append((start, i - 1))
+            start = i
+        elif at_top and start is not None and not brace and not stripped.startswith(('end', '}', '#')):
+            # Indentation languages: a new unindented statement ends the block
+            spans.append((start, i - 1))
+            start = None
+        if brace:
+            depth = max(0, depth + _brace_delta(line))
+            if depth == 0 and start is not None and '}' in line:
+                spans.append((start, i))
+                start = None
+    if start is not None:
+        spans.append((start, len(lines)))
+
+    named = [(s, e, "block", _definition_name(lines[s - 1])) for s, e in spans]
+    return _fill_gaps(named, len(lines))
+
+
+def _brace_delta(line: str) -> int:
+    # Ignore braces inside string literals and line comments
+    code = re.sub(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|//.*$', '', line)
+    return code.count('{') - code.count('}')
+
+
+def _definition_name(line: str) -> str:
+    # Rust visibility like pub(crate) would otherwise read as a call
+    match = _NAME_RE.search(re.sub(r"\bpub\([^)]*\)", "", line))
+    if not match:
+        return ""
+    return match.group(1) or match.group(2) or ""
+
+
+def _fill_gaps(spans, line_count: int) -> List[Tuple[int, int, str, str]]:
+    """Cover the lines between definitions with "module" spans."""
+    filled = []
+    cursor = 1
+    for start, end, kind, name in sorted(spans):
+        if start > cursor:
+            filled.append((cursor, start - 1, "module", ""))
+        filled.append((start, end, kind, name))
+        cursor = max(cursor, end + 1)
+    if cursor <= line_count:
+        filled.append((cursor, line_count, "module", ""))
+    return filled
+
+
+def _split_oversized(spans, lines: List[str]):
+    for start, end, kind, name in spans:
+        if end - start + 1 <= MAX_CHUNK_LINES:
+            yield start, end, kind, name
+            continue
+        # Split at nested definitions first, then into fixed windows
+        cuts = [start] + [i for i in range(start + 1, end + 1) if DEFINITION_RE.match(lines[i - 1])]
+        for piece_start, piece_end in zip(cuts, cuts[1:] + [end + 1]):
+            piece_name = _definition_name(lines[piece_start - 1]) if piece_start != start else name
+            for window in range(piece_start, piece_end, MAX_CHUNK_LINES):
+                yield window, min(window + MAX_CHUNK_LINES - 1, piece_end - 1), kind, piece_name
@@ -0,0 +1,218 @@
+import hashlib
+import math
+import os
+import re
+from collections import Counter
+from typing import List, Dict, Any, Optional
+
+from search_index import tokenize
+from code_chunker import chunk_file
+from issue_parser import parse_issue, line_hits
+from symbol_graph import SymbolGraph
+
+# Token budget for the repository context in the prompt, as measured by
+# count_tokens (an estimate unless the tiktoken vocabulary is cached)
+DEFAULT_CONTEXT_TOKENS = 6000
+
+# Knapsack weights are rounded up to multiples of this many tokens
+TOKEN_GRANULARITY = 16
+
+# Only the best scoring snippets are considered for packing
+MAX_CANDIDATE_SNIPPETS = 300
+
+# Added to snippets containing a line the issue points at (stack frame or path:line)
+LINE_HIT_BONUS = 100.0
+
+# With a symbol graph, the best scoring snippets are expanded to at most
+# MAX_NEIGHBORS_PER_SEED callees and callers each, scored at NEIGHBOR_WEIGHT
+# of their seed
+GRAPH_SEEDS = 5
+MAX_NEIGHBORS_PER_SEED = 6
+NEIGHBOR_WEIGHT = 0.5
+
+# Vocabulary of tiktoken's cl100k_base encoding, looked up in TIKTOKEN_CACHE_DIR
+CL100K_URL = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+
+_TOKEN_RE = re.compile(r"[A-Za-z]+|[0-9]{1,3}|[^\sA-Za-z0-9]")
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate the number of model tokens in text.
+
+    By default this is an offline estimate that splits words into
+    ~4-character BPE-sized pieces and counts every digit group and
+    punctuation mark as a token, so token budgets are approximate and can
+    be off by a few tens of percent for unusual text. When the optional
+    tiktoken package is installed and TIKTOKEN_CACHE_DIR points at a
+    directory holding its cl100k_base vocabulary, cl100k_base counts are
+    used instead; tiktoken is never allowed to download the vocabulary.
+    Either way this is not the Sonar models' own tokenizer, so budgets
+    leave headroom rather than fill the context window. Which counter is
+    active is logged once.
+    """
+    global _encoding
+    if _encoding is None:
+        _encoding = _load_encoding()
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+
+    tokens = 0
+    for piece in _TOKEN_RE.findall(text):
+        tokens += (len(piece) + 3) // 4 if piece[0].isalpha() else 1
+    return tokens
+
+
+def _load_encoding():
+    cache_dir = os.environ.get("TIKTOKEN_CACHE_DIR")
+    # tiktoken caches the vocabulary under the SHA-1 of its URL and downloads it when missing
+    if cache_dir and os.path.exists(os.path.join(cache_dir, hashlib.sha1(CL100K_URL.encode()).hexdigest())):
+        try:
+            import tiktoken
+            encoding = tiktoken.get_encoding("cl100k_base")
+            print("Token counts: tiktoken cl100k_base")
+            return encoding
+        except Exception as e:
+            print(f"Could not load the tiktoken vocabulary: {e}")
+    print("Token counts: offline estimate")
+    return False
+
+
+def score_snippet(snippet: Dict[str, Any], query_terms: Counter, file_score: float, file_rank: int) -> float:
+    """Score a snippet by its own query term hits on top of its file's relevance."""
+    terms = Counter(tokenize(snippet['content']))
+    hits = sum(1 + math.log(terms[t]) for t in query_terms if terms[t])
+    # The rank prior keeps earlier files ahead when nothing matches the query
+    return hits + file_score + 1.0 / (1 + file_rank)
+
+
+def pack_snippets(snippets: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+    """
+    Choose the snippets with the highest total score that fit in the budget.
+
+    This is a 0/1 knapsack over token counts, solved by dynamic programming
+    with weights rounded up to TOKEN_GRANULARITY tokens.
+    """
+    capacity = budget // TOKEN_GRANULARITY
+    if capacity <= 0 or not snippets:
+        return []
+    weights = [max(1, -(-s['tokens'] // TOKEN_GRANULARITY)) for s in snippets]
+
+    best = [0.0] * (capacity + 1)
+    keep = []
+    for item, weight in enumerate(weights):
+        taken = bytearray(capacity + 1)
+        value = snippets[item]['score']
+        for c in range(capacity, weight - 1, -1):
+            candidate = best[c - weight] + value
+            if candidate > best[c]:
+                best[c] = candidate
+                taken[c] = 1
+        keep.append(taken)
+
+    chosen = []
+    c = capacity
+    for item in range(len(snippets) - 1, -1, -1):
+        if keep[item][c]:
+            chosen.append(snippets[item])
+            c -= weights[item]
+    return chosen
+
+
+def pack_context(code_chunks: List[Dict[str, Any]], query: str = "",
+                 max_tokens: int = DEFAULT_CONTEXT_TOKENS, graph: Optional[SymbolGraph] = None) -> str:
+    """
+    Build the issue-specific code context within a token budget.
+
+    code_chunks are expected in relevance order (see analyze_issue_relevance);
+    each file is split into function/class-level snippets and the file's
+    'relevance_score', when present, is carried over to its snippets.
+    Selected snippets are rendered per file in rank order and by line number.
+    Snippets containing a line referenced by the query (a stack frame or a
+    path:line mention, see issue_parser) are all but guaranteed a place.
+    With a symbol graph, the callers, callees and imported definitions of
+    the best snippets compete for the budget too, also from files outside
+    code_chunks, so related code can displace weaker matches. The repository
+    overview shared by all issues is built separately (see prompt_builder).
+    """
+    query_terms = Counter(tokenize(query))
+    pinned_lines = line_hits(parse_issue(query), [c['filename'] for c in code_chunks]) if query else {}
+    max_file_score = max((c.get('relevance_score', 0) for c in code_chunks), default=0) or 1
+
+    candidates = []
+    for rank, chunk in enumerate(code_chunks):
+        file_score = chunk.get('relevance_score', 0) / max_file_score
+        for n, snippet in enumerate(chunk_file(chunk['filename'], chunk['content'])):
+            snippet['id'] = f"{chunk['filename']}#{n}"
+            snippet['file_rank'] = rank
+            snippet['score'] = score_snippet(snippet, query_terms, file_score, rank)
+            if any(snippet['start_line'] <= line <= snippet['end_line']
+                   for line in pinned_lines.get(chunk['filename'], ())):
+                snippet['score'] += LINE_HIT_BONUS
+            candidates.append(snippet)
+    candidates.sort(key=lambda s: s['score'], reverse=True)
+    candidates = candidates[:MAX_CANDIDATE_SNIPPETS]
+    if graph is not None:
+        candidates += expand_neighbors(candidates, graph, len(code_chunks))
+
+    for snippet in candidates:
+        snippet['tokens'] = count_tokens(_render_header(snippet) + snippet['content'] + "\n\n")
+
+    chosen = pack_snippets(candidates, max_tokens)
+    chosen.sort(key=lambda s: (s['file_rank'], s['start_line']))
+
+    context_parts = []
+    for snippet in chosen:
+        context_parts.append(_render_header(snippet) + snippet['content'] + "\n\n")
+
+    ranked_files = {c['filename'] for c in code_chunks}
+    omitted = len(ranked_files) - len({s['filename'] for s in chosen if s['filename'] in ranked_files})
+    if omitted > 0:
+        context_parts.append(f"... [{omitted} files omitted due to token budget]")
+
+    return "".join(context_parts)
+
+
+def expand_neighbors(candidates: List[Dict[str, Any]], graph: SymbolGraph,
+                     first_rank: int) -> List[Dict[str, Any]]:
+    """
+    Snippets one hop from the best candidates in the symbol graph.
+
+    Neighbors that already are candidates are raised to their share of the
+    seed's score instead. New snippets are cut from the neighbor's file with
+    chunk_file (the graph uses the same unit ids) and rendered after the
+    ranked files.
+    """
+    by_id = {snippet['id']: snippet for snippet in candidates}
+    file_units: Dict[str, List[Dict[str, Any]]] = {}
+    file_ranks: Dict[str, int] = {}
+    added = []
+    for seed in candidates[:GRAPH_SEEDS]:
+        score = seed['score'] * NEIGHBOR_WEIGHT
+        for neighbor_id in graph.neighbors(seed['id'])[:MAX_NEIGHBORS_PER_SEED]:
+            if neighbor_id in by_id:
+                by_id[neighbor_id]['score'] = max(by_id[neighbor_id]['score'], score)
+                continue
+            filename, _, n = neighbor_id.rpartition('#')
+            chunk = graph.files.get(filename)
+            if chunk is None:
+                continue
+            if filename not in file_units:
+                file_units[filename] = chunk_file(filename, chunk['content'])
+                file_ranks[filename] = first_rank + len(file_ranks)
+            units = file_units[filename]
+            if int(n) >= len(units):
+                continue
+            snippet = dict(units[int(n)], id=neighbor_id, file_rank=file_ranks[filename], score=score)
+            by_id[neighbor_id] = snippet
+            added.append(snippet)
+    return added
+
+
+def _render_header(snippet: Dict[str, Any]) -> str:
+    label = f"lines {snippet['start_line']}-{snippet['end_line']}"
+    if snippet.get('name'):
+        label += f", {snippet['kind']} {snippet['name']}"
+    return f"=== FILE: {snippet['filename']} ({label}) ===\n"
@@ -0,0 +1,182 @@
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional, Any, Iterator, Callable, IO
+from urllib.parse import quote
+
+import http_client
+import metrics
+
+GITHUB_REST_URL = "https://api.github.com"
+GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
+CODELOAD_URL = "https://codeload.github.com"
+GITHUB_RAW_URL = "https://raw.githubusercontent.com"
+
+# Parallel raw file downloads when fetching selected blobs
+BLOB_WORKERS = 8
+
+# Repositories larger than this (GitHub's disk usage, in KB) are fetched file by file
+LARGE_REPO_KB = 500 * 1024
+
+REPOSITORY_QUERY = """
+query($owner: String!, $repo: String!, $ref: String!) {
+  repository(owner: $owner, name: $repo) {
+    diskUsage
+    defaultBranchRef {
+      name
+      target {
+        oid
+      }
+    }
+    ref(qualifiedName: $ref) {
+      name
+      target {
+        oid
+      }
+    }
+  }
+}
+"""
+
+def github_headers(token: Optional[str] = None, accept: str = "application/vnd.github+json") -> Dict[str, str]:
+    headers = {"Accept": accept}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return headers
+
+def resolve_repository(owner: str, repo: str, branch: Optional[str] = None,
+                       token: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Resolve a branch, the default branch and their head with one metadata call.
+
+    With a token this is a single GraphQL query. When branch is "main" (the
+    UI default) or None and no such branch exists, the default branch is
+    used, so repositories on "master" or "develop" need no second attempt.
+    Without a token (GraphQL requires one), the REST repository endpoint
+    gives the default branch and size but no head SHA.
+
+    Returns:
+        Dictionary with default_branch, branch (the one to crawl, None if
+        it does not exist), sha (its head commit, or None when unknown) and
+        size_kb
+    """
+    if token:
+        response = http_client.post(
+            GITHUB_GRAPHQL_URL,
+            json={"query": REPOSITORY_QUERY,
+                  "variables": {"owner": owner, "repo": repo, "ref": f"refs/heads/{branch or 'main'}"}},
+            headers=github_headers(token), timeout=10,
+        )
+        repository = (response.json().get("data") or {}).get("repository") if response.status_code == 200 else None
+        if not repository:
+            raise Exception(f"Could not resolve {owner}/{repo}. HTTP {response.status_code}")
+        default = repository.get("defaultBranchRef") or {}
+        ref = repository.get("ref")
+        if not ref and branch in (None, "main"):
+            ref = default
+        return {
+            "default_branch": default.get("name"),
+            "branch": ref.get("name") if ref else None,
+            "sha": ref["target"]["oid"] if ref else None,
+            "size_kb": repository.get("diskUsage") or 0,
+        }
+
+    response = http_client.get(f"{GITHUB_REST_URL}/repos/{owner}/{repo}", headers=github_headers(), timeout=10)
+    if response.status_code != 200:
+        raise Exception(f"Could not resolve {owner}/{repo}. HTTP {response.status_code}")
+    data = response.json()
+    return {
+        "default_branch": data.get("default_branch"),
+        "branch": branch or data.get("default_branch"),
+        "sha": None,
+        "size_kb": data.get("size") or 0,
+    }
+
+def tarball_url(owner: str, repo: str, ref: str) -> str:
+    """URL of the gzipped tarball of a branch or commit."""
+    return f"{CODELOAD_URL}/{owner}/{repo}/tar.gz/{ref}"
+
+class _CountingReader:
+    """File-like wrapper counting the compressed bytes tarfile pulls from the response."""
+
+    def __init__(self, raw: IO[bytes]):
+        self.raw = raw
+        self.bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.bytes += len(data)
+        return data
+
+def iter_tarball(owner: str, repo: str, ref: str) -> Iterator[Tuple[str, int, Callable[[], IO[bytes]]]]:
+    """
+    Stream a repository tarball, yielding (path, size, open) per regular file.
+
+    The archive is decompressed as it arrives (tarfile "r|gz") and nothing
+    is buffered: paths are relative to the repository root, and a member's
+    contents are only read when open() is called before the next item is
+    requested, so filtered files cost no more than their transfer.
+    Closing the generator early closes the connection and stops the download.
+    """
+    response = http_client.get(tarball_url(owner, repo, ref), timeout=30, stream=True)
+    if response.status_code != 200:
+        response.close()
+        raise Exception(f"Could not download repository. HTTP {response.status_code}")
+
+    reader = _CountingReader(response.raw)
+    try:
+        with tarfile.open(fileobj=reader, mode="r|gz") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                # Drop the "owner-repo-sha/" directory every member sits under
+                path = member.name.split('/', 1)[1] if '/' in member.name else member.name
+                yield path, member.size, lambda member=member: tar.extractfile(member)
+    finally:
+        response.close()
+        metrics.record(bytes_downloaded=reader.bytes)
+
+def list_tree(owner: str, repo: str, ref: str, token: Optional[str] = None) -> Dict[str, Any]:
+    """
+    List every file of a commit with the git trees API, without downloading any content.
+
+    Returns:
+        Dictionary with entries ({path, size} per file) and truncated, set
+        when GitHub cut the listing short (very large trees)
+    """
+    url = f"{GITHUB_REST_URL}/repos/{owner}/{repo}/git/trees/{quote(ref, safe='')}?recursive=1"
+    response = http_client.get(url, headers=github_headers(token), timeout=30)
+    if response.status_code != 200:
+        raise Exception(f"Could not list repository files. HTTP {response.status_code}")
+    metrics.record(bytes_downloaded=len(response.content))
+    data = response.json()
+    entries = [{"path": entry["path"], "size": entry.get("size") or 0}
+               for entry in data.get("tree", []) if entry.get("type") == "blob"]
+    return {"entries": entries, "truncated": bool(data.get("truncated"))}
+
+def fetch_blobs(owner: str, repo: str, ref: str, paths: List[str], token: Optional[str] = None,
+                workers: int = BLOB_WORKERS) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """
+    Download selected files of a commit, at most workers at a time.
+
+    Yields (path, content) in the order of paths; content is None for files
+    that could not be fetched.
+    """
+    headers = github_headers(token, accept="*/*")
+
+    def fetch(path: str) -> Tuple[str, Optional[bytes]]:
+        url = f"{GITHUB_RAW_URL}/{owner}/{repo}/{ref}/{quote(path)}"
+        try:
+            response = http_client.get(url, headers=headers, timeout=30)
+        except Exception as e:
+            print(f"Could not fetch {path}: {e}")
+            return path, None
+        if response.status_code != 200:
+            return path, None
+        return path, response.content
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for path, content in executor.map(fetch, paths):
+            # Recorded here: the run's metrics are not visible from pool threads
+            if content is not None:
+                metrics.record(bytes_downloaded=len(content))
+            yield path, content
@@ -1,10 +1,52 @@
 import requests
 import streamlit as st
+import http_client
+import metrics
 
 
 GITHUB_API_URL = "https://api.github.com/graphql"
 GITHUB_TOKEN = st.secrets["GITHUB_TOKEN"]
 
+ISSUE_FIELDS = """
+      title
+      body
+      number
+      url
+      state
+      author {
+        login
+      }
+      createdAt
+      updatedAt
+"""
+
+ISSUE_QUERY = """
+query($owner: String!, $repo: String!, $issueNumber: Int!) {
+  repository(owner: $owner, name: $repo) {
+    issue(number: $issueNumber) {%s    }
+  }
+}
+""" % ISSUE_FIELDS
+
+ISSUES_PAGE_QUERY = """
+query($owner: String!, $repo: String!, $states: [IssueState!], $labels: [String!], $first: Int!, $after: String) {
+  repository(owner: $owner, name: $repo) {
+    issues(states: $states, labels: $labels, first: $first, after: $after,
+           orderBy: {field: UPDATED_AT, direction: DESC}) {
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+      nodes {%s      }
+    }
+  }
+}
+""" % ISSUE_FIELDS
+
+# GitHub caps GraphQL connections (and our aliased batches) at 100 nodes
+ISSUES_PER_REQUEST = 100
+
+@metrics.timed("issue_fetch")
 def get_issue_data(owner, repo, issue_number):
     """
     Fetch issue data from GitHub using GraphQL API.
@@ -14,42 +56,11 @@ def get_issue_data(owner, repo, issue_number):
         print("Error: GITHUB_TOKEN not found in environment variables")
         return None
     
-    query = """
-    query($owner: String!, $repo: String!, $issueNumber: Int!) {
-      repository(owner: $owner, name: $repo) {
-        issue(number: $issueNumber) {
-          title
-          body
-          number
-          url
-          state
-          author {
-            login
-          }
-          createdAt
-          updatedAt
-        }
-      }
-    }
-    """
-    
-    variables = {
-        "owner": owner,
-        "repo": repo,
-        "issueNumber": int(issue_number),
-    }
-
-    headers = {
-        "Authorization": f"Bearer {GITHUB_TOKEN}",
-        "Accept": "application/vnd.github+json",
-        "Content-Type": "application/json",
-    }
-
     try:
-        response = requests.post(
+        response = http_client.post(
             GITHUB_API_URL, 
-            json={"query": query, "variables": variables}, 
-            headers=headers,
+            json=build_issue_request(owner, repo, issue_number), 
+            headers=github_headers(),
             timeout=30
         )
         
@@ -61,32 +72,7 @@ def get_issue_data(owner, repo, issue_number):
             print(f"Response: {response.text}")
             return None
         
-        data = response.json()
-        
-        # Check for GraphQL errors
-        if "errors" in data:
-            print("GraphQL Errors:")
-            for error in data["errors"]:
-                print(f"  - {error.get('message', 'Unknown error')}")
-            return None
-        
-        # Check if data exists
-        if "data" not in data:
-            print("No 'data' field in response")
-            print(f"Full response: {data}")
-            return None
-        
-        # Check if repository exists
-        if not data["data"]["repository"]:
-            print(f"Repository {owner}/{repo} not found or not accessible")
-            return None
-        
-        # Check if issue exists
-        if not data["data"]["repository"]["issue"]:
-            print(f"Issue #{issue_number} not found in {owner}/{repo}")
-            return None
-        
-        return data["data"]["repository"]["issue"]
+        return parse_issue_response(response.json(), owner, repo, issue_number)
         
     except requests.exceptions.RequestException as e:
         print(f"Network error: {e}")
@@ -95,6 +81,129 @@ def get_issue_data(owner, repo, issue_number):
         print(f"Unexpected error: {e}")
         return None
 
+@metrics.timed("issue_fetch")
+def get_issues_data(owner, repo, issue_numbers=None, states=("OPEN",), labels=None, limit=None):
+    """
+    Fetch many issues with as few GraphQL requests as possible.
+    
+    With issue_numbers, up to 100 issues are requested per query using
+    aliased issue fields. Otherwise the repository's issues matching states
+    and labels are paged through 100 at a time, most recently updated first,
+    until limit issues have been collected.
+    Returns a list of issue data (missing issues are skipped).
+    """
+    if not GITHUB_TOKEN:
+        print("Error: GITHUB_TOKEN not found in environment variables")
+        return []
+    
+    if issue_numbers:
+        issues = []
+        numbers = [int(n) for n in issue_numbers]
+        for start in range(0, len(numbers), ISSUES_PER_REQUEST):
+            batch = numbers[start:start + ISSUES_PER_REQUEST]
+            fields = "".join(f"    i{n}: issue(number: {n}) {{{ISSUE_FIELDS}    }}\n" for n in batch)
+            query = ("query($owner: String!, $repo: String!) {\n"
+                     f"  repository(owner: $owner, name: $repo) {{\n{fields}  }}\n}}")
+            data = _post_graphql(query, {"owner": owner, "repo": repo})
+            repository = data and data.get("repository")
+            if not repository:
+                continue
+            issues.extend(repository[f"i{n}"] for n in batch if repository.get(f"i{n}"))
+        return issues
+    
+    issues = []
+    cursor = None
+    while limit is None or len(issues) < limit:
+        variables = {
+            "owner": owner,
+            "repo": repo,
+            "states": list(states) if states else None,
+            "labels": list(labels) if labels else None,
+            "first": ISSUES_PER_REQUEST if limit is None else min(ISSUES_PER_REQUEST, limit - len(issues)),
+            "after": cursor,
+        }
+        data = _post_graphql(ISSUES_PAGE_QUERY, variables)
+        if not data or not data.get("repository"):
+            break
+        page = data["repository"]["issues"]
+        issues.extend(page["nodes"])
+        if not page["pageInfo"]["hasNextPage"]:
+            break
+        cursor = page["pageInfo"]["endCursor"]
+    return issues
+
+def _post_graphql(query, variables):
+    """POST a GraphQL query and return its 'data', or None after logging the failure."""
+    try:
+        response = http_client.post(
+            GITHUB_API_URL,
+            json={"query": query, "variables": variables},
+            headers=github_headers(),
+            timeout=30
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"Network error: {e}")
+        return None
+    
+    if response.status_code != 200:
+        print(f"GitHub API Error: HTTP {response.status_code}")
+        print(f"Response: {response.text}")
+        return None
+    
+    data = response.json()
+    if "errors" in data:
+        print("GraphQL Errors:")
+        for error in data["errors"]:
+            print(f"  - {error.get('message', 'Unknown error')}")
+        # Aliased batches report missing issues as errors next to the found ones
+        if not data.get("data"):
+            return None
+    return data.get("data")
+
+def github_headers():
+    """Headers for authenticated GitHub API requests."""
+    return {
+        "Authorization": f"Bearer {GITHUB_TOKEN}",
+        "Accept": "application/vnd.github+json",
+        "Content-Type": "application/json",
+    }
+
+def build_issue_request(owner, repo, issue_number):
+    """GraphQL request body for a single issue."""
+    variables = {
+        "owner": owner,
+        "repo": repo,
+        "issueNumber": int(issue_number),
+    }
+    return {"query": ISSUE_QUERY, "variables": variables}
+
+def parse_issue_response(data, owner, repo, issue_number):
+    """Return the issue from a GraphQL response, or None (after logging why)."""
+    # Check for GraphQL errors
+    if "errors" in data:
+        print("GraphQL Errors:")
+        for error in data["errors"]:
+            print(f"  - {error.get('message', 'Unknown error')}")
+        return None
+    
+    # Check if data exists
+    if "data" not in data:
+        print("No 'data' field in response")
+        print(f"Full response: {data}")
+        return None
+    
+    # Check if repository exists
+    if not data["data"]["repository"]:
+        print(f"Repository {owner}/{repo} not found or not accessible")
+        return None
+    
+    # Check if issue exists
+    if not data["data"]["repository"]["issue"]:
+        print(f"Issue #{issue_number} not found in {owner}/{repo}")
+        return None
+    
+    return data["data"]["repository"]["issue"]
+
 def test_github_token():
     """Test if GitHub token is valid."""
     if not GITHUB_TOKEN:
@@ -114,7 +223,7 @@ def test_github_token():
     }
     
     try:
-        response = requests.post(
+        response = http_client.post(
             GITHUB_API_URL,
             json={"query": query},
             headers=headers,
@@ -0,0 +1,163 @@
+import email.utils
+import random
+import threading
+import time
+from typing import Dict, Optional, Any
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connection pool sizing for the shared session
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 32
+
+# Retry policy
+MAX_RETRIES = 4
+BASE_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Maximum concurrent requests per host; unlisted hosts use the default
+HOST_CONCURRENCY = {
+    "api.github.com": 8,
+    "raw.githubusercontent.com": 16,
+}
+DEFAULT_HOST_CONCURRENCY = 16
+
+class RateLimitTracker:
+    """
+    Latest GitHub rate-limit budget seen per host and resource.
+
+    Updated from the X-RateLimit-* headers of every response, so callers can
+    check the remaining budget before starting expensive work.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limits: Dict[str, Dict[str, Any]] = {}
+
+    def update(self, host: str, headers) -> None:
+        if "X-RateLimit-Remaining" not in headers:
+            return
+        resource = headers.get("X-RateLimit-Resource", "core")
+        try:
+            entry = {
+                "limit": int(headers.get("X-RateLimit-Limit", 0)),
+                "remaining": int(headers["X-RateLimit-Remaining"]),
+                "reset": int(headers.get("X-RateLimit-Reset", 0)),
+                "updated": time.time(),
+            }
+        except ValueError:
+            return
+        with self._lock:
+            self._limits[f"{host}/{resource}"] = entry
+
+    def get(self, host: str, resource: str = "core") -> Optional[Dict[str, Any]]:
+        """Return {'limit', 'remaining', 'reset', 'updated'} for a host and resource, if seen."""
+        with self._lock:
+            entry = self._limits.get(f"{host}/{resource}")
+        return dict(entry) if entry else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """All tracked budgets keyed by 'host/resource'."""
+        with self._lock:
+            return {key: dict(value) for key, value in self._limits.items()}
+
+rate_limits = RateLimitTracker()
+
+_session = None
+_session_lock = threading.Lock()
+_host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+def get_session() -> requests.Session:
+    """Process-wide keep-alive session shared by every GitHub call."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+def request(method: str, url: str, max_retries: int = MAX_RETRIES, **kwargs) -> requests.Response:
+    """
+    Send a request through the shared session.
+
+    Retries connection errors, 429/5xx responses and GitHub's secondary rate
+    limit (403 with Retry-After or an exhausted budget) with exponential
+    backoff and full jitter. Retry-After and X-RateLimit-Reset set the minimum
+    wait, capped at MAX_BACKOFF_SECONDS; if the server asks for longer, the
+    last response is returned to the caller instead of sleeping. The number
+    of requests in flight per host is bounded by HOST_CONCURRENCY.
+    """
+    host = urlsplit(url).hostname or ""
+    semaphore = _host_semaphore(host)
+
+    for attempt in range(max_retries + 1):
+        try:
+            with semaphore:
+                response = get_session().request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == max_retries:
+                raise
+            time.sleep(_backoff(attempt))
+            continue
+
+        rate_limits.update(host, response.headers)
+        if attempt == max_retries or not _should_retry(response):
+            return response
+
+        delay = max(_backoff(attempt), _server_delay(response))
+        if delay > MAX_BACKOFF_SECONDS:
+            return response
+        response.close()
+        time.sleep(delay)
+
+    return response
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+def _host_semaphore(host: str) -> threading.BoundedSemaphore:
+    with _session_lock:
+        if host not in _host_semaphores:
+            limit = HOST_CONCURRENCY.get(host, DEFAULT_HOST_CONCURRENCY)
+            _host_semaphores[host] = threading.BoundedSemaphore(limit)
+        return _host_semaphores[host]
+
+def _should_retry(response: requests.Response) -> bool:
+    if response.status_code in RETRY_STATUSES:
+        return True
+    # Secondary rate limits come back as 403 with Retry-After or no budget left
+    return response.status_code == 403 and (
+        "Retry-After" in response.headers or response.headers.get("X-RateLimit-Remaining") == "0"
+    )
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt))
+
+def _server_delay(response: requests.Response) -> float:
+    """Seconds the server asked us to wait, from Retry-After or X-RateLimit-Reset."""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            parsed = email.utils.parsedate_to_datetime(retry_after)
+            return max(0.0, parsed.timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        try:
+            return max(0.0, int(response.headers.get("X-RateLimit-Reset", 0)) - time.time())
+        except ValueError:
+            pass
+    return 0.0
@@ -0,0 +1,232 @@
+import keyword
+import re
+from typing import List, Dict, Set, Any, Iterable
+
+from search_index import STOPWORDS
+
+# Extensions recognized in bare file path mentions ("src/app.py:12")
+CODE_EXTS = ('py', 'pyi', 'js', 'jsx', 'mjs', 'cjs', 'ts', 'tsx', 'java', 'kt', 'scala', 'go', 'rs',
+             'c', 'h', 'cc', 'cpp', 'hpp', 'cs', 'rb', 'php', 'swift', 'm', 'mm', 'dart', 'lua', 'sh')
+
+# Weight of each kind of exact hit; pinned files are ordered by their summed weight
+FRAME_WEIGHT = 3.0
+PATH_WEIGHT = 2.0
+DEFINITION_WEIGHT = 1.5
+ERROR_CLASS_WEIGHT = 1.0
+
+# A path or symbol resolving to more files than this is too ambiguous to pin
+MAX_AMBIGUOUS_HITS = 3
+
+# Identifiers beyond this many (in order of appearance) are ignored
+MAX_IDENTIFIERS = 50
+
+# Python:  File "app/models.py", line 42, in save
+_PY_FRAME_RE = re.compile(r'File "(?P<path>[^"\n]+)", line (?P<line>\d+)(?:, in (?P<function>[\w<>.]+))?')
+# Java/Kotlin:  at com.example.Foo.bar(Foo.java:42)
+_JVM_FRAME_RE = re.compile(r'^\s*at (?P<function>[\w$.]+)\((?P<path>[\w$-]+\.(?:java|kt|scala|groovy)):(?P<line>\d+)\)',
+                           re.MULTILINE)
+# Node, browsers, Rust:  at handler (/srv/app/src/api.js:42:7)  /  at src/main.rs:10:5
+_AT_FRAME_RE = re.compile(r'^\s*at (?:(?P<function>[\w$.<>\[\]]+) \()?(?:file://)?(?P<path>[^\s()]+?):(?P<line>\d+)(?::\d+)?\)?\s*$',
+                          re.MULTILINE)
+# Links to files on GitHub:  https://github.com/o/r/blob/main/src/app.py#L42
+_BLOB_URL_RE = re.compile(r'/blob/[^/\s]+/(?P<path>[^\s#?)\]>]+)(?:#L(?P<line>\d+))?')
+# Bare mentions:  src/app.py:42, utils.go, "lib/parser.rb"
+_PATH_RE = re.compile(r'(?<![\w/.@:-])(?P<path>(?:[A-Za-z]:)?(?:[\w.-]+[/\\])*[\w-][\w.-]*\.(?:'
+                      + '|'.join(sorted(CODE_EXTS, key=len, reverse=True))
+                      + r'))\b(?:[:(]\s*(?:line\s*)?(?P<line>\d+))?')
+_ERROR_RE = re.compile(r'\b(?:[a-z_][\w]*\.)*([A-Z][A-Za-z0-9]*(?:Error|Exception|Panic|Fault))\b')
+_INLINE_CODE_RE = re.compile(r'`([^`\n]+)`')
+_FENCE_RE = re.compile(r'```.*?(?:```|$)', re.DOTALL)
+# Code-shaped words in prose: calls, snake_case, camelCase and dotted names
+_CODE_WORD_RE = re.compile(r'\b[A-Za-z_][\w]*(?:\.[A-Za-z_][\w]*)+\b|\b[A-Za-z_]\w*(?=\()'
+                           r'|\b[a-z]+_\w+\b|\b_\w+\b|\b[a-z]+[A-Z]\w*\b')
+_DOTTED_RE = re.compile(r'[A-Za-z_][\w]*(?:\.[A-Za-z_][\w]*)*')
+_URL_RE = re.compile(r'\w+://\S+')
+
+_IGNORED_WORDS = set(keyword.kwlist) | STOPWORDS | {
+    'self', 'cls', 'this', 'null', 'undefined', 'true', 'false', 'print', 'len', 'str', 'int',
+    'dict', 'list', 'var', 'let', 'const', 'function', 'new', 'return', 'e.g', 'i.e',
+}
+# Dotted words ending in these are file names or domains, not symbols
+_NON_SYMBOL_SUFFIXES = set(CODE_EXTS) | {
+    'com', 'org', 'net', 'io', 'dev', 'json', 'yaml', 'yml', 'toml', 'cfg', 'ini', 'md', 'txt',
+    'html', 'css', 'xml', 'lock', 'log', 'csv',
+}
+
+
+def parse_issue(text: str) -> Dict[str, List[Any]]:
+    """
+    Extract exact code references from an issue's title and body.
+
+    Returns a dictionary with:
+        frames: stack frames as {"path", "line", "function"} (Python
+            tracebacks, JVM, Node/browser and Rust "at ..." lines)
+        paths: other file mentions as {"path", "line"}, including GitHub
+            blob links; line is None when not given
+        error_classes: exception/error class names ("KeyError",
+            "NullPointerException")
+        identifiers: code identifiers from inline code spans and code-shaped
+            words (calls, snake_case, camelCase, dotted names)
+    """
+    frames = []
+    seen_frames = set()
+    # Paths as written in the frames, so path mentions do not count them again
+    frame_paths = set()
+    for regex in (_PY_FRAME_RE, _JVM_FRAME_RE, _AT_FRAME_RE):
+        for match in regex.finditer(text):
+            path = match.group('path')
+            frame_paths.add(path)
+            if regex is _JVM_FRAME_RE:
+                # Foo.java in com.example.Foo.bar lives under com/example/
+                package = match.group('function').split('.')[:-2]
+                path = '/'.join(package + [path])
+            key = (path, match.group('line'))
+            if key in seen_frames:
+                continue
+            seen_frames.add(key)
+            frames.append({"path": path, "line": int(match.group('line')), "function": match.group('function')})
+
+    paths = []
+    seen_paths = set()
+    for regex in (_BLOB_URL_RE, _PATH_RE):
+        for match in regex.finditer(text):
+            path = match.group('path').replace('\\', '/')
+            line = int(match.group('line')) if match.group('line') else None
+            if path in frame_paths or (path, line) in seen_paths:
+                continue
+            seen_paths.add((path, line))
+            paths.append({"path": path, "line": line})
+
+    error_classes = _unique(_ERROR_RE.findall(text))
+
+    # Fenced blocks usually hold tracebacks or whole files; only their frames
+    # and error classes are used
+    prose = _URL_RE.sub(' ', _FENCE_RE.sub(' ', text))
+    words = []
+    for span in _INLINE_CODE_RE.findall(prose):
+        words.extend(_DOTTED_RE.findall(span))
+    words.extend(_CODE_WORD_RE.findall(_INLINE_CODE_RE.sub(' ', prose)))
+    words.extend(frame['function'] for frame in frames if frame['function'])
+    identifiers = [word for word in _unique(words)
+                   if len(word) > 2 and word.lower() not in _IGNORED_WORDS
+                   and word.rsplit('.', 1)[-1] not in _NON_SYMBOL_SUFFIXES]
+
+    return {
+        "frames": frames,
+        "paths": paths,
+        "error_classes": error_classes,
+        "identifiers": identifiers[:MAX_IDENTIFIERS],
+    }
+
+
+def resolve_path(path: str, by_basename: Dict[str, List[str]]) -> List[str]:
+    """
+    Map a path from an issue to indexed filenames.
+
+    Issue paths are often absolute or relative to another checkout, and
+    indexed filenames carry the archive's top-level directory, so files are
+    matched on the longest run of trailing path components. Returns [] when
+    nothing matches or the best match is ambiguous.
+    """
+    parts = [p for p in path.replace('\\', '/').split('/') if p not in ('', '.')]
+    if not parts:
+        return []
+    candidates = by_basename.get(parts[-1], [])
+    if not candidates:
+        return []
+
+    def matched(filename: str) -> int:
+        count = 0
+        for a, b in zip(reversed(filename.split('/')), reversed(parts)):
+            if a != b:
+                break
+            count += 1
+        return count
+
+    scored = [(matched(filename), filename) for filename in candidates]
+    best = max(score for score, _ in scored)
+    hits = [filename for score, filename in scored if score == best]
+    return hits if len(hits) <= MAX_AMBIGUOUS_HITS else []
+
+
+def resolve_symbol(name: str, definitions: Dict[str, List[str]]) -> List[str]:
+    """
+    Files defining name, trying "a.b.c", then "b.c" and "c", then "a.b"
+    (a method of a class indexed as one chunk); [] when ambiguous.
+    """
+    parts = name.split('.')
+    candidates = ['.'.join(parts[i:]) for i in range(len(parts))]
+    candidates += ['.'.join(parts[:i]) for i in range(len(parts) - 1, 0, -1)]
+    for symbol in candidates:
+        files = definitions.get(symbol)
+        if files:
+            return files if len(files) <= MAX_AMBIGUOUS_HITS else []
+    return []
+
+
+def index_basenames(filenames: Iterable[str]) -> Dict[str, List[str]]:
+    by_basename: Dict[str, List[str]] = {}
+    for filename in filenames:
+        by_basename.setdefault(filename.rsplit('/', 1)[-1], []).append(filename)
+    return by_basename
+
+
+def exact_hits(parsed: Dict[str, List[Any]], filenames: Iterable[str],
+               definitions: Dict[str, List[str]]) -> Dict[str, float]:
+    """
+    Files referenced exactly by a parsed issue, with their summed hit weight.
+
+    Stack frames and path mentions resolve against the indexed filenames;
+    frame functions, error classes and identifiers resolve against the
+    symbol definitions of the search index.
+    """
+    by_basename = index_basenames(filenames)
+    hits: Dict[str, float] = {}
+
+    def add(files: List[str], weight: float):
+        for filename in files:
+            hits[filename] = hits.get(filename, 0.0) + weight
+
+    for frame in parsed["frames"]:
+        add(resolve_path(frame["path"], by_basename), FRAME_WEIGHT)
+    for mention in parsed["paths"]:
+        add(resolve_path(mention["path"], by_basename), PATH_WEIGHT)
+    for name in parsed["error_classes"]:
+        add(resolve_symbol(name, definitions), ERROR_CLASS_WEIGHT)
+    for name in parsed["identifiers"]:
+        add(resolve_symbol(name, definitions), DEFINITION_WEIGHT)
+    return hits
+
+
+def pin_scores(scores: Dict[str, float], pinned: Dict[str, float]) -> Dict[str, float]:
+    """
+    Lift exactly referenced files above every fuzzy match.
+
+    pinned maps filenames to their exact hit weight (see exact_hits).
+    Pinned files score above the best fuzzy score, ordered by weight
+    scaled to that score; their own fuzzy score only breaks ties. Updates
+    scores in place and returns it.
+    """
+    if not pinned:
+        return scores
+    best = max(scores.values(), default=0.0)
+    scale = max(best, 1.0)
+    for filename, weight in pinned.items():
+        scores[filename] = best + weight * scale + scores.get(filename, 0.0) / 10
+    return scores
+
+
+def line_hits(parsed: Dict[str, List[Any]], filenames: Iterable[str]) -> Dict[str, Set[int]]:
+    """Line numbers the issue points at (frames and path:line mentions), per indexed filename."""
+    by_basename = index_basenames(filenames)
+    lines: Dict[str, Set[int]] = {}
+    for ref in parsed["frames"] + parsed["paths"]:
+        if ref["line"] is None:
+            continue
+        for filename in resolve_path(ref["path"], by_basename):
+            lines.setdefault(filename, set()).add(ref["line"])
+    return lines
+
+
+def _unique(items: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(items))
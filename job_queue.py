@@ -0,0 +1,369 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from typing import List, Dict, Tuple, Optional, Any
+
+QUEUE_PATH = "./job_queue/jobs.sqlite3"
+
+# Worker processes started by start_workers when none is given
+DEFAULT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+# A running job whose worker has not written for this long is handed to another worker
+STALE_SECONDS = 300
+
+# Workers touch their running job this often, however long a stage takes
+HEARTBEAT_SECONDS = 30
+
+# Minimum interval between progress writes while a Sonar answer streams in
+PROGRESS_INTERVAL = 0.3
+
+# Finished jobs are deleted after this long
+KEEP_FINISHED_SECONDS = 24 * 3600
+
+# A job submitted again within this long of an identical successful job gets its result
+REUSE_FINISHED_SECONDS = 5 * 60
+
+POLL_SECONDS = 0.5
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("done", "failed")
+
+def job_key(params: Dict[str, Any]) -> str:
+    """
+    Deduplication key of an analysis job.
+
+    Jobs for the same repository commit (or branch, when the commit could not
+    be resolved), the same issue revision and the same crawl settings get the
+    same key, so they can share one execution.
+    """
+    raw = json.dumps([
+        params["owner"], params["repo"], params.get("sha") or params["branch"],
+        params["issue"]["number"], params["issue"].get("updatedAt"),
+        sorted(params["allowed_exts"]), params["max_files"], params.get("semantic", False),
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class JobQueue:
+    """
+    Analysis jobs in a local SQLite database, shared by the app and the workers.
+
+    submit() returns the id of an identical queued or running job (or one
+    that succeeded in the last reuse_seconds) instead of adding a second
+    one. Workers claim jobs in submission order inside an immediate
+    transaction, so each job runs once however many processes poll, and
+    heartbeat running jobs so only those of dead workers are reclaimed.
+    Progress (the current stage and the answer streamed so far) and the
+    final result are written back to the job row for the app to poll.
+    """
+
+    def __init__(self, path: str = QUEUE_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                       id TEXT PRIMARY KEY,
+                       dedup_key TEXT NOT NULL,
+                       status TEXT NOT NULL,
+                       params TEXT NOT NULL,
+                       stage TEXT,
+                       progress TEXT NOT NULL DEFAULT '',
+                       result TEXT,
+                       error TEXT,
+                       worker INTEGER,
+                       created REAL NOT NULL,
+                       updated REAL NOT NULL
+                   )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def submit(self, params: Dict[str, Any], reuse_seconds: float = REUSE_FINISHED_SECONDS) -> str:
+        """Queue an analysis job, or return the id of an identical one in flight or just finished."""
+        key = job_key(params)
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """SELECT id FROM jobs
+                   WHERE dedup_key = ? AND (status IN (?, ?) OR (status = 'done' AND updated >= ?))
+                   ORDER BY created DESC LIMIT 1""",
+                (key, *ACTIVE_STATUSES, now - reuse_seconds),
+            ).fetchone()
+            if row:
+                return row[0]
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, dedup_key, status, params, created, updated) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, key, json.dumps(params), now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return {'id', 'status', 'stage', 'progress', 'result', 'error', ...} for a job, or None."""
+        row = self._connect().execute(
+            "SELECT id, status, stage, progress, result, error, created, updated FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "status": row[1],
+            "stage": row[2],
+            "progress": row[3],
+            "result": json.loads(row[4]) if row[4] else None,
+            "error": row[5],
+            "created": row[6],
+            "updated": row[7],
+        }
+
+    def claim(self, worker: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Take the oldest queued (or abandoned) job for a worker; returns (id, params) or None."""
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """SELECT id, params FROM jobs
+                   WHERE status = 'queued' OR (status = 'running' AND updated < ?)
+                   ORDER BY created LIMIT 1""",
+                (now - STALE_SECONDS,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, stage = 'starting', progress = '', updated = ? WHERE id = ?",
+                (worker, now, row[0]),
+            )
+        return row[0], json.loads(row[1])
+
+    def update(self, job_id: str, stage: Optional[str] = None, progress: Optional[str] = None):
+        """Record the current stage and/or partial answer of a running job (also a heartbeat)."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET stage = COALESCE(?, stage), progress = COALESCE(?, progress), updated = ? WHERE id = ?",
+                (stage, progress, time.time(), job_id),
+            )
+
+    def finish(self, job_id: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        """Mark a job done (with its result) or failed (with an error message)."""
+        status = "failed" if error else "done"
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, result = ?, error = ?, updated = ? WHERE id = ?",
+                (status, status, json.dumps(result) if result is not None else None, error, now, job_id),
+            )
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?",
+                (*FINISHED_STATUSES, now - KEEP_FINISHED_SECONDS),
+            )
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status."""
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared across threads; isolation_level=None
+        # leaves transaction control to the explicit BEGIN IMMEDIATE statements
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+def submit_analysis(queue: JobQueue, owner: str, repo: str, branch: str, issue: Dict[str, Any],
+                    allowed_exts: Tuple[str, ...], max_files: int, streaming: bool = True,
+                    semantic: bool = False, token: Optional[str] = None) -> str:
+    """
+    Submit an issue analysis and return its job id.
+
+    The branch is resolved to a commit first (a conditional request, usually
+    a 304) so the job deduplicates on the exact commit. The token is only
+    used here; workers read their own from the app secrets, so no credential
+    is written to the queue.
+    """
+    from repo_crawler import resolve_branch_sha
+
+    try:
+        sha = resolve_branch_sha(owner, repo, branch, token=token)
+    except Exception as e:
+        print(f"Could not resolve {owner}/{repo}@{branch}, deduplicating on the branch name: {e}")
+        sha = None
+
+    return queue.submit({
+        "owner": owner,
+        "repo": repo,
+        "branch": branch,
+        "sha": sha,
+        "issue": {key: issue.get(key) for key in ("number", "title", "body", "url", "updatedAt")},
+        "allowed_exts": list(allowed_exts),
+        "max_files": max_files,
+        "streaming": streaming,
+        "semantic": semantic,
+    })
+
+def run_analysis_job(params: Dict[str, Any], report) -> Dict[str, Any]:
+    """
+    Crawl, rank and analyze one issue; the pipeline a worker runs for a job.
+
+    report(stage=..., progress=...) is called as the job advances, with the
+    answer streamed so far as progress.
+    """
+    import metrics
+    from github_api import GITHUB_TOKEN
+    from prefilter import summarize_skips
+    from repo_crawler import crawl_repo_snapshot, MAX_SCAN_FILES
+    from sonar_api import analyze_issue_relevance, stream_sonar_with_context
+
+    issue = params["issue"]
+    run = metrics.begin_run(f"{params['owner']}/{params['repo']}#{issue['number']}")
+    try:
+        report(stage="crawling")
+        snapshot = crawl_repo_snapshot(
+            params["owner"], params["repo"], params["branch"], tuple(params["allowed_exts"]),
+            MAX_SCAN_FILES, streaming=params.get("streaming", True),
+            token=GITHUB_TOKEN, semantic=params.get("semantic", False),
+            query=f"{issue['title']}\n{issue['body'] or ''}",
+            # The job was deduplicated on this commit; the branch may have moved since
+            sha=params.get("sha"),
+        )
+
+        report(stage="ranking")
+        code_chunks = analyze_issue_relevance(
+            issue["title"], issue["body"], snapshot["code_chunks"], index=snapshot["index"],
+            semantic_index=snapshot.get("semantic_index"), top_k=params["max_files"],
+        )
+
+        report(stage="analyzing")
+        stream = stream_sonar_with_context(issue["title"], issue["body"], code_chunks,
+                                           issue_updated_at=issue.get("updatedAt"),
+                                           commit_sha=snapshot["sha"], graph=snapshot.get("symbol_graph"),
+                                           repository_chunks=snapshot["code_chunks"])
+        parts = []
+        last_report = 0.0
+        for delta in stream:
+            parts.append(delta)
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                report(progress="".join(parts))
+                last_report = time.monotonic()
+    finally:
+        metrics.finish_run(run)
+
+    return {
+        "sha": snapshot["sha"],
+        "from_cache": snapshot["from_cache"],
+        "partial": snapshot.get("partial", False),
+        "base_sha": snapshot.get("base_sha"),
+        "changed_files": len(snapshot.get("changed_paths") or []),
+        "scanned_files": len(snapshot["code_chunks"]),
+        "skipped": summarize_skips(snapshot.get("skipped") or []),
+        "files": [{"filename": c["filename"], "relevance_score": c["relevance_score"]} for c in code_chunks],
+        "total_lines": sum(c["lines"] - 1 for c in code_chunks),
+        "content": stream.content,
+        "citations": stream.citations,
+        "answer_from_cache": stream.from_cache,
+        "run": run.to_dict(),
+    }
+
+def worker_loop(path: str = QUEUE_PATH, poll: float = POLL_SECONDS, max_jobs: Optional[int] = None):
+    """Claim and run jobs until max_jobs have run (forever by default)."""
+    queue = JobQueue(path)
+    worker = os.getpid()
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        claimed = queue.claim(worker)
+        if claimed is None:
+            time.sleep(poll)
+            continue
+        job_id, params = claimed
+
+        def report(stage=None, progress=None):
+            queue.update(job_id, stage=stage, progress=progress)
+
+        # A long crawl or Sonar call reports nothing for minutes; without
+        # this the job would look abandoned and run a second time
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(queue, job_id, stop), daemon=True)
+        heartbeat.start()
+        try:
+            result, error = run_analysis_job(params, report), None
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            traceback.print_exc()
+            result, error = None, str(e)
+        finally:
+            stop.set()
+            heartbeat.join()
+        queue.finish(job_id, result=result, error=error)
+        done += 1
+
+def _heartbeat(queue: JobQueue, job_id: str, stop: threading.Event, interval: float = HEARTBEAT_SECONDS):
+    while not stop.wait(interval):
+        try:
+            queue.update(job_id)
+        except sqlite3.Error as e:
+            print(f"Heartbeat for job {job_id} failed: {e}")
+
+_workers: List[multiprocessing.Process] = []
+_workers_lock = threading.Lock()
+
+def start_workers(count: int = DEFAULT_WORKERS, path: str = QUEUE_PATH) -> List[multiprocessing.Process]:
+    """
+    Make sure count worker processes are running for this process (idempotent).
+
+    Workers are spawned rather than forked, since the Streamlit server is
+    multi-threaded, and are daemons, so they stop with the server.
+    """
+    context = multiprocessing.get_context("spawn")
+    with _workers_lock:
+        _workers[:] = [p for p in _workers if p.is_alive()]
+        while len(_workers) < count:
+            process = context.Process(target=worker_loop, args=(path,), daemon=True,
+                                      name=f"reposage-worker-{len(_workers)}")
+            process.start()
+            _workers.append(process)
+        return list(_workers)
+
+def wait_for_job(queue: JobQueue, job_id: str, poll: float = POLL_SECONDS,
+                 timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Poll until a job has finished and return it (None if it vanished or timed out)."""
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        job = queue.get(job_id)
+        if job is None or job["status"] in FINISHED_STATUSES:
+            return job
+        if deadline and time.monotonic() > deadline:
+            return None
+        time.sleep(poll)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run RepoSage analysis workers against the local job queue.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Worker processes to run")
+    parser.add_argument("--queue", default=QUEUE_PATH, help="SQLite job queue path")
+    args = parser.parse_args()
+
+    processes = start_workers(args.workers, args.queue)
+    print(f"Started {len(processes)} workers on {args.queue}")
+    try:
+        while True:
+            time.sleep(5)
+            # Replace workers that died
+            start_workers(args.workers, args.queue)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,35 @@
 import streamlit as st
-from github_api import get_issue_data
-from sonar_api import ask_sonar_with_context
+import metrics
+from github_api import get_issue_data, GITHUB_TOKEN
 from utils import parse_github_url
-from repo_crawler import crawl_and_analyze_repo
+from job_queue import JobQueue, submit_analysis, start_workers, FINISHED_STATUSES, POLL_SECONDS, DEFAULT_WORKERS
 import os
+import time
+
+# Analyses run in worker processes fed from a local job queue. Set
+# REPOSAGE_WORKERS=0 when the workers run separately (python job_queue.py).
+WORKERS = int(os.environ.get("REPOSAGE_WORKERS", DEFAULT_WORKERS))
+
+# Issues are refetched at most this often across reruns and sessions
+ISSUE_CACHE_SECONDS = 5 * 60
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """One job queue handle for the whole server process."""
+    return JobQueue()
+
+@st.cache_data(ttl=ISSUE_CACHE_SECONDS, max_entries=256, show_spinner=False)
+def fetch_issue(owner: str, repo: str, issue_number: str):
+    """get_issue_data shared across reruns and sessions; failures raise so they are not cached."""
+    issue = get_issue_data(owner, repo, issue_number)
+    if issue is None:
+        raise LookupError(f"Issue #{issue_number} not found in {owner}/{repo}")
+    return issue
+
+job_queue = get_job_queue()
+if WORKERS > 0:
+    # Idempotent: only starts workers that are not already running
+    start_workers(WORKERS)
 
 st.set_page_config(page_title="GitHub Issue Helper", layout="wide")
 st.title("🧠 GitHub Issue Helper with Repository Analysis- RepoSage")
@@ -18,8 +44,12 @@ issue_number = st.text_input("Enter issue number (e.g., 42):")
 # Advanced options
 with st.expander("Advanced Options"):
     branch = st.text_input("Branch name (default: main)", value="main")
-    max_files = st.number_input("Maximum files to analyze", min_value=1, max_value=50, value=20)
+    max_files = st.number_input("Files to include in the analysis (best matches of the whole repository)",
+                                min_value=1, max_value=200, value=20)
     file_extensions = st.text_input("File extensions to crawl (comma-separated)", value=".py,.js,.java,.ts,.go,.cpp,.c,.rb,.php")
+    streaming = st.checkbox("Stream the repository tarball (skip extracting to disk)", value=True)
+    semantic = st.checkbox("Semantic retrieval (local embeddings, combined with keyword ranking)", value=False)
+    show_timings = st.checkbox("Show per-run timing breakdown", value=False)
 
 if repo_url and issue_number:
     owner, repo = parse_github_url(repo_url)
@@ -34,7 +64,10 @@ if repo_url and issue_number:
         with col1:
             st.subheader("📋 Issue Information")
             with st.spinner("Fetching issue from GitHub..."):
-                issue = get_issue_data(owner, repo, issue_number)
+                try:
+                    issue = fetch_issue(owner, repo, issue_number)
+                except LookupError:
+                    issue = None
 
             if issue:
                 st.success("✅ Issue fetched successfully")
@@ -48,78 +81,93 @@ if repo_url and issue_number:
         
         with col2:
             st.subheader("🔍 Repository Analysis")
+            # The job id survives reruns, so progress keeps showing after any interaction
+            job_slot = f"analysis_job:{owner}/{repo}#{issue_number}"
             if issue and st.button("🚀 Crawl Repository & Analyze Issue", type="primary"):
-                with st.spinner("Crawling repository and extracting code..."):
-                    try:
-                        # Crawl repository
-                        code_chunks = crawl_and_analyze_repo(
-                            owner, repo, branch, allowed_exts, max_files
-                        )
+                try:
+                    st.session_state[job_slot] = submit_analysis(
+                        job_queue, owner, repo, branch, issue, allowed_exts, max_files,
+                        streaming=streaming, semantic=semantic, token=GITHUB_TOKEN
+                    )
+                except Exception as e:
+                    st.error(f"❌ Error submitting analysis: {str(e)}")
+            
+            job_id = st.session_state.get(job_slot)
+            if issue and job_id:
+                # The crawl and Sonar call run in a worker process; poll the job
+                status_box = st.empty()
+                answer_box = st.empty()
+                job = job_queue.get(job_id)
+                while job and job['status'] not in FINISHED_STATUSES:
+                    if job['status'] == "queued":
+                        status_box.info(f"⏳ Waiting for a worker ({job_queue.counts().get('queued', 0)} jobs queued)...")
+                    else:
+                        status_box.info(f"⏳ {job['stage'].capitalize()}...")
+                    if job['progress']:
+                        answer_box.markdown(job['progress'])
+                    time.sleep(POLL_SECONDS)
+                    job = job_queue.get(job_id)
+                status_box.empty()
+                answer_box.empty()
+                
+                if job is None:
+                    st.error("❌ The analysis job is no longer available. Please run it again.")
+                elif job['status'] == "failed":
+                    st.error(f"❌ Error analyzing issue: {job['error']}")
+                else:
+                    result = job['result']
+                    # The worker's stage timings join this process's Prometheus totals
+                    metrics.merge_run(result['run'])
+                    files = result['files']
+                    
+                    if files:
+                        st.success(f"✅ Scanned {result['scanned_files']} code files, "
+                                   f"selected the {len(files)} most relevant")
+                        if result['sha']:
+                            source = "cached snapshot" if result['from_cache'] else "fresh download"
+                            if result.get('partial'):
+                                source = "large repository, only files matching the issue were fetched"
+                            if result.get('base_sha'):
+                                source = (f"patched from {result['base_sha'][:7]}, "
+                                          f"{result['changed_files']} files changed")
+                            st.caption(f"Commit {result['sha'][:7]} ({source})")
+                        if result.get('skipped'):
+                            reasons = ", ".join(f"{count} {reason}" for reason, count in sorted(result['skipped'].items()))
+                            st.caption(f"Skipped before reading: {reasons}")
                         
-                        if code_chunks:
-                            st.success(f"✅ Extracted {len(code_chunks)} code files")
-                            
-                            # Show some stats
-                            total_lines = sum(chunk['content'].count('\n') for chunk in code_chunks)
-                            st.info(f"📊 Total lines of code analyzed: {total_lines}")
-                            
-                            # Show file list
-                            with st.expander("📁 Files Analyzed"):
-                                for chunk in code_chunks[:10]:  # Show first 10
-                                    st.code(chunk['filename'], language="text")
-                                if len(code_chunks) > 10:
-                                    st.write(f"... and {len(code_chunks) - 10} more files")
-                        else:
-                            st.warning("⚠️ No code files found in the repository")
-                            code_chunks = []
+                        # Show some stats
+                        st.info(f"📊 Total lines of code analyzed: {result['total_lines']}")
                         
-                    except Exception as e:
-                        st.error(f"❌ Error crawling repository: {str(e)}")
-                        code_chunks = []
-                
-                # Analyze with Sonar
-                if 'code_chunks' in locals():
+                        # Show file list
+                        with st.expander("📁 Files Analyzed"):
+                            for file in files[:10]:  # Show first 10
+                                st.code(file['filename'], language="text")
+                            if len(files) > 10:
+                                st.write(f"... and {len(files) - 10} more files")
+                    else:
+                        st.warning("⚠️ No code files found in the repository")
+                    
                     st.subheader("🤖 AI Analysis")
-                    with st.spinner("Analyzing issue with repository context..."):
-                        try:
-                            # Get the full response object instead of just content
-                            response_obj = ask_sonar_with_context(
-                                issue['title'], 
-                                issue['body'], 
-                                code_chunks
-                            )
-                            
-                            # Check if response_obj is a string (old format) or response object (new format)
-                            if isinstance(response_obj, str):
-                                # Old format - just the content
-                                response_content = response_obj
-                                citations = []
-                            else:
-                                # New format - extract content and citations
-                                if hasattr(response_obj, 'choices') and len(response_obj.choices) > 0:
-                                    response_content = response_obj.choices[0].message.content
-                                    # Extract citations from the response object
-                                    citations = getattr(response_obj, 'citations', [])
-                                else:
-                                    response_content = str(response_obj)
-                                    citations = []
-                            
-                            st.success("✅ Analysis complete")
-                            st.markdown("### 🎯 Sonar's Detailed Analysis")
-                            st.markdown(response_content)
-                            
-                            # Display citations if available
-                            if citations:
-                                st.markdown("---")
-                                st.markdown("### 📚 Sources & Citations")
-                                st.markdown("*The analysis above was informed by the following sources:*")
-                                
-                                for i, citation in enumerate(citations, 1):
-                                    # Create clickable links for citations
-                                    st.markdown(f"{i}. [{citation}]({citation})")
-                            
-                        except Exception as e:
-                            st.error(f"❌ Error analyzing with Sonar: {str(e)}")
+                    st.markdown("### 🎯 Sonar's Detailed Analysis")
+                    st.markdown(result['content'])
+                    st.success("✅ Analysis complete" + (" (cached)" if result['answer_from_cache'] else ""))
+                    citations = result['citations']
+                    
+                    # Display citations if available
+                    if citations:
+                        st.markdown("---")
+                        st.markdown("### 📚 Sources & Citations")
+                        st.markdown("*The analysis above was informed by the following sources:*")
+                        
+                        for i, citation in enumerate(citations, 1):
+                            # Create clickable links for citations
+                            st.markdown(f"{i}. [{citation}]({citation})")
+                    
+                    if show_timings:
+                        run = result['run']
+                        with st.expander("⏱️ Timing Breakdown", expanded=True):
+                            st.caption(f"Total: {run['wall_seconds']:.2f}s")
+                            st.table(run['stages'])
 
 # Cleanup section
 if st.button("🧹 Clean Temporary Files"):
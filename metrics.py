@@ -0,0 +1,170 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from collections import OrderedDict
+from typing import List, Dict, Any
+
+# Counters a stage can report, besides its wall time
+COUNTERS = ("bytes_downloaded", "files_scanned", "files_kept", "files_skipped", "prompt_tokens", "completion_tokens")
+
+# Append every finished run as one JSON line to this file when set
+JSON_LOG_PATH = os.environ.get("REPOSAGE_METRICS_LOG")
+
+_current_run = contextvars.ContextVar("reposage_current_run", default=None)
+_current_stage = contextvars.ContextVar("reposage_current_stage", default=None)
+
+_totals_lock = threading.Lock()
+_totals: Dict[str, Dict[str, float]] = {}
+
+# Runs from other processes already added by merge_run, oldest first
+MAX_MERGED_RUNS = 4096
+_merged_runs: "OrderedDict[tuple, None]" = OrderedDict()
+
+class Run:
+    """Stage records of one analysis, in the order the stages finished."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.time()
+        self.wall_seconds = 0.0
+        self.stages: List[Dict[str, Any]] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "run": self.name,
+            "started": self.started,
+            "wall_seconds": round(self.wall_seconds, 4),
+            "stages": self.stages,
+        }
+
+def begin_run(name: str = "analysis") -> Run:
+    """Start collecting stages for a run in the current context."""
+    run = Run(name)
+    run._token = _current_run.set(run)
+    return run
+
+def finish_run(run: Run) -> Run:
+    """Stop collecting for a run and write it to the JSON log sink, if configured."""
+    run.wall_seconds = time.time() - run.started
+    try:
+        _current_run.reset(run._token)
+    except ValueError:
+        # Finished from a different context than it was started in
+        _current_run.set(None)
+    if JSON_LOG_PATH:
+        with _totals_lock, open(JSON_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run.to_dict()) + "\n")
+    return run
+
+@contextmanager
+def start_run(name: str = "analysis"):
+    run = begin_run(name)
+    try:
+        yield run
+    finally:
+        finish_run(run)
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a pipeline stage and collect its counters.
+
+    Yields the stage record; counters can be set on it directly or through
+    record() from code running inside the stage. The record is added to the
+    current run (if any) and to the process-wide totals.
+    """
+    entry = {"stage": name, "wall_seconds": 0.0}
+    token = _current_stage.set(entry)
+    started = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry["wall_seconds"] = round(time.perf_counter() - started, 4)
+        _current_stage.reset(token)
+        run = _current_run.get()
+        if run is not None:
+            run.stages.append(entry)
+        _add_totals(entry)
+
+def timed(name: str):
+    """Decorator that runs the whole function as one stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def observe(name: str, wall_seconds: float, **counters):
+    """Add an already measured stage, for work that cannot run inside stage() (e.g. generators)."""
+    entry = {"stage": name, "wall_seconds": round(wall_seconds, 4), **counters}
+    run = _current_run.get()
+    if run is not None:
+        run.stages.append(entry)
+    _add_totals(entry)
+
+def record(**counters):
+    """Add counter values to the innermost active stage (no-op outside a stage)."""
+    entry = _current_stage.get()
+    if entry is None:
+        return
+    for key, value in counters.items():
+        entry[key] = entry.get(key, 0) + value
+
+def merge_run(run: Dict[str, Any]) -> bool:
+    """
+    Add the stages of a run recorded in another process (a Run.to_dict())
+    to this process's totals.
+
+    Analyses run in worker processes, whose totals the app never sees;
+    their job results carry the run, which the app merges here. A run is
+    merged once however often its result is read. Returns whether it was
+    added.
+    """
+    key = (run.get("run"), run.get("started"))
+    with _totals_lock:
+        if key in _merged_runs:
+            return False
+        _merged_runs[key] = None
+        while len(_merged_runs) > MAX_MERGED_RUNS:
+            _merged_runs.popitem(last=False)
+    for entry in run.get("stages", []):
+        _add_totals(entry)
+    return True
+
+def export_prometheus() -> str:
+    """Process-wide stage totals in the Prometheus text exposition format."""
+    with _totals_lock:
+        totals = {name: dict(values) for name, values in _totals.items()}
+
+    lines = [
+        "# HELP reposage_stage_runs_total Number of times a pipeline stage ran.",
+        "# TYPE reposage_stage_runs_total counter",
+    ]
+    lines += [f'reposage_stage_runs_total{{stage="{name}"}} {int(v["runs"])}' for name, v in sorted(totals.items())]
+    lines += [
+        "# HELP reposage_stage_seconds_total Wall time spent in a pipeline stage.",
+        "# TYPE reposage_stage_seconds_total counter",
+    ]
+    lines += [f'reposage_stage_seconds_total{{stage="{name}"}} {v["wall_seconds"]:.4f}' for name, v in sorted(totals.items())]
+    for counter in COUNTERS:
+        samples = [(name, v[counter]) for name, v in sorted(totals.items()) if counter in v]
+        if not samples:
+            continue
+        lines.append(f"# TYPE reposage_{counter}_total counter")
+        lines += [f'reposage_{counter}_total{{stage="{name}"}} {int(value)}' for name, value in samples]
+    return "\n".join(lines) + "\n"
+
+def _add_totals(entry: Dict[str, Any]):
+    with _totals_lock:
+        totals = _totals.setdefault(entry["stage"], {"runs": 0, "wall_seconds": 0.0})
+        totals["runs"] += 1
+        totals["wall_seconds"] += entry["wall_seconds"]
+        for counter in COUNTERS:
+            if counter in entry:
+                totals[counter] = totals.get(counter, 0) + entry[counter]
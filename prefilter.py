@@ -0,0 +1,191 @@
+import posixpath
+import re
+from typing import List, Dict, Tuple, Optional
+
+# Bytes read from the start of a file to decide whether it is worth reading
+SNIFF_BYTES = 8192
+
+# Files larger than this are skipped without being read
+MAX_FILE_BYTES = 1024 * 1024  # 1 MB
+
+# A sniffed prefix with longer lines than this on average is minified
+MINIFIED_AVG_LINE_CHARS = 500
+
+# Share of control bytes above which a prefix is treated as binary
+BINARY_CONTROL_RATIO = 0.3
+
+# Directories GitHub linguist treats as vendored
+VENDORED_DIRS = {'vendor', 'vendors', 'third_party', 'third-party', 'bower_components', 'Pods'}
+
+GENERATED_NAME_RE = re.compile(
+    r"(_pb2(_grpc)?\.py|\.pb\.(go|cc|h)|_pb\.(js|ts)|\.generated\.\w+|\.g\.dart|\.designer\.cs)$"
+)
+MINIFIED_NAME_RE = re.compile(r"[.-]min\.(js|css|mjs)$|\.bundle\.js$")
+
+# Markers code generators put in the first lines of their output
+GENERATED_MARKERS = (
+    b"@generated", b"DO NOT EDIT", b"Code generated by", b"Autogenerated by",
+    b"auto-generated", b"Generated by the protocol buffer compiler",
+)
+
+# Control bytes that do not occur in text files (tab, newlines, form feed
+# and escape are allowed)
+_TEXT_CONTROLS = {7, 8, 9, 10, 12, 13, 27}
+_CONTROL_BYTES = bytes(b for b in range(32) if b not in _TEXT_CONTROLS)
+
+class PathRules:
+    """
+    Ignore rules of a repository from its .gitignore and .gitattributes files.
+
+    Rules are added per file with the directory the file lives in (relative
+    paths, '/'-separated, as they appear in the crawl). Matching follows git:
+    patterns without a slash match at any depth below their directory,
+    patterns with one are anchored to it, a trailing slash matches
+    directories only, '**' spans directories, and for .gitignore the last
+    matching pattern wins, so '!' re-includes. From .gitattributes the
+    linguist-generated, linguist-vendored and binary attributes are used.
+    """
+
+    def __init__(self):
+        self._ignore: List[Tuple[re.Pattern, bool]] = []
+        self._attributes: List[Tuple[re.Pattern, str, bool]] = []
+
+    def add_gitignore(self, base: str, text: str):
+        for line in text.splitlines():
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            if line.startswith('\\'):
+                line = line[1:]
+            regex = _pattern_regex(base, line)
+            if regex is not None:
+                self._ignore.append((regex, negate))
+
+    def add_gitattributes(self, base: str, text: str):
+        for line in text.splitlines():
+            parts = line.split()
+            if not parts or parts[0].startswith('#'):
+                continue
+            regex = _pattern_regex(base, parts[0])
+            if regex is None:
+                continue
+            for attr in parts[1:]:
+                name, _, value = attr.lstrip('-!').partition('=')
+                if name in ('linguist-generated', 'linguist-vendored', 'binary'):
+                    enabled = not attr.startswith(('-', '!')) and value.lower() not in ('false', '0')
+                    self._attributes.append((regex, name, enabled))
+
+    def match(self, path: str, is_dir: bool = False) -> Optional[str]:
+        """Skip reason for a path ('gitignore', 'generated', 'vendored', 'binary') or None."""
+        target = path + '/' if is_dir else path
+        ignored = False
+        for regex, negate in self._ignore:
+            if regex.match(target):
+                ignored = not negate
+        if ignored:
+            return "gitignore"
+
+        attributes: Dict[str, bool] = {}
+        for regex, name, enabled in self._attributes:
+            if regex.match(target):
+                attributes[name] = enabled
+        if attributes.get('linguist-generated'):
+            return "generated"
+        if attributes.get('linguist-vendored'):
+            return "vendored"
+        if attributes.get('binary') and not is_dir:
+            return "binary"
+        return None
+
+    def __bool__(self) -> bool:
+        return bool(self._ignore or self._attributes)
+
+def _pattern_regex(base: str, pattern: str) -> Optional[re.Pattern]:
+    dir_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/') if dir_only else pattern
+    if not pattern:
+        return None
+    # A slash at the start or in the middle anchors the pattern to its directory
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+            end = pattern.index(']', i + 1)
+            parts.append('[' + pattern[i + 1:end].replace('!', '^', 1) + ']')
+            i = end + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+
+    prefix = re.escape(base.strip('/') + '/') if base.strip('/') else ''
+    # A matched directory covers everything below it
+    suffix = '/.*' if dir_only else '(?:/.*)?'
+    middle = '' if anchored else '(?:.*/)?'
+    return re.compile(f"^{prefix}{middle}{''.join(parts)}{suffix}$", re.DOTALL)
+
+def classify_path(path: str) -> Optional[str]:
+    """Skip reason from the path alone: vendored directories, generated or minified names."""
+    parts = path.replace('\\', '/').split('/')
+    if any(part in VENDORED_DIRS for part in parts[:-1]):
+        return "vendored"
+    if GENERATED_NAME_RE.search(parts[-1]):
+        return "generated"
+    if MINIFIED_NAME_RE.search(parts[-1]):
+        return "minified"
+    return None
+
+def sniff(prefix: bytes) -> Optional[str]:
+    """Skip reason from the first SNIFF_BYTES of a file: binary, minified or generated content."""
+    if not prefix:
+        return None
+    if b'\0' in prefix:
+        return "binary"
+    controls = len(prefix) - len(prefix.translate(None, _CONTROL_BYTES))
+    if controls / len(prefix) > BINARY_CONTROL_RATIO:
+        return "binary"
+
+    lines = prefix.count(b'\n') + 1
+    if len(prefix) >= 1024 and len(prefix) / lines > MINIFIED_AVG_LINE_CHARS:
+        return "minified"
+
+    head = b'\n'.join(prefix.split(b'\n', 5)[:5])
+    if any(marker in head for marker in GENERATED_MARKERS):
+        return "generated"
+    return None
+
+def load_rules(files: Dict[str, str]) -> PathRules:
+    """Build PathRules from {path of a .gitignore/.gitattributes file: its text}."""
+    rules = PathRules()
+    # Shallower files first, so deeper (more specific) rules win
+    for path in sorted(files, key=lambda p: p.count('/')):
+        base, name = posixpath.split(path)
+        if name == '.gitignore':
+            rules.add_gitignore(base, files[path])
+        elif name == '.gitattributes':
+            rules.add_gitattributes(base, files[path])
+    return rules
+
+def summarize_skips(skipped: List[Tuple[str, str]]) -> Dict[str, int]:
+    """Count skipped files per reason."""
+    counts: Dict[str, int] = {}
+    for _, reason in skipped:
+        counts[reason] = counts.get(reason, 0) + 1
+    return counts
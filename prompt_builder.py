@@ -0,0 +1,120 @@
+import hashlib
+import os
+from typing import List, Dict, Any, Optional
+
+from code_chunker import chunk_file
+from context_packer import count_tokens
+from snapshot_cache import MemoCache
+
+# Token budget for the repository overview shared by every issue of a snapshot
+PREFIX_TOKENS = 1500
+
+# Directories deeper than this are folded into their parent in the outline
+OUTLINE_DEPTH = 3
+MAX_OUTLINE_DIRS = 60
+
+# Signature lines are cut to this many characters
+MAX_SIGNATURE_CHARS = 120
+
+PREFIX_MEMO_ENTRIES = 32
+PREFIX_MEMO_SECONDS = 3600
+
+_prefix_memo = MemoCache(PREFIX_MEMO_ENTRIES, PREFIX_MEMO_SECONDS)
+
+
+def repository_prefix(code_chunks: List[Any], commit_sha: Optional[str] = None,
+                      max_tokens: int = PREFIX_TOKENS) -> str:
+    """
+    Snapshot-invariant repository overview for the system prompt.
+
+    Holds a summary of the file types, a directory outline and the
+    signatures of top-level definitions, shallowest modules first, within
+    max_tokens. Everything is sorted, so the text only depends on the set
+    of files: every issue of a snapshot gets the same bytes and the
+    provider can reuse its cached prompt prefix. With commit_sha, the
+    result is memoized per commit and file list.
+    """
+    if not code_chunks:
+        return ""
+
+    key = None
+    if commit_sha:
+        digest = hashlib.sha256()
+        for chunk in code_chunks:
+            digest.update(chunk['filename'].encode("utf-8", "surrogatepass") + b"\0")
+        key = (commit_sha, digest.hexdigest(), max_tokens)
+        cached = _prefix_memo.get(key)
+        if cached is not None:
+            return cached
+
+    filenames = sorted(chunk['filename'] for chunk in code_chunks)
+    parts = [summarize_files(filenames), "\nDirectory outline:\n", outline(filenames)]
+    budget = max_tokens - count_tokens("".join(parts))
+
+    signatures = ["\nTop-level definitions:\n"]
+    by_name = {chunk['filename']: chunk for chunk in code_chunks}
+    listed = 0
+    # Shallow modules first: entry points and packages before their internals
+    for filename in sorted(filenames, key=lambda f: (f.count('/'), f)):
+        lines = module_signatures(filename, by_name[filename]['content'])
+        if not lines:
+            continue
+        block = f"{filename}:\n" + "".join(f"  {line}\n" for line in lines)
+        tokens = count_tokens(block)
+        if tokens > budget:
+            signatures.append("... [remaining files omitted]\n")
+            break
+        budget -= tokens
+        signatures.append(block)
+        listed += 1
+    if listed:
+        parts.extend(signatures)
+
+    prefix = "".join(parts)
+    if key is not None:
+        _prefix_memo.put(key, prefix)
+    return prefix
+
+
+def summarize_files(filenames: List[str]) -> str:
+    """One line with the file count and the extensions present, most common first."""
+    counts: Dict[str, int] = {}
+    for filename in filenames:
+        ext = os.path.splitext(filename)[1] or "(none)"
+        counts[ext] = counts.get(ext, 0) + 1
+    types = ", ".join(f"{ext} ({n})" for ext, n in sorted(counts.items(), key=lambda x: (-x[1], x[0])))
+    return f"Repository contains {len(filenames)} files of types: {types}\n"
+
+
+def outline(filenames: List[str]) -> str:
+    """Indented directory tree with file counts, down to OUTLINE_DEPTH levels."""
+    counts: Dict[str, int] = {}
+    for filename in filenames:
+        parts = filename.split('/')[:-1]
+        for depth in range(1, min(len(parts), OUTLINE_DEPTH) + 1):
+            directory = '/'.join(parts[:depth])
+            counts[directory] = counts.get(directory, 0) + 1
+
+    lines = []
+    for directory in sorted(counts)[:MAX_OUTLINE_DIRS]:
+        depth = directory.count('/')
+        lines.append(f"{'  ' * depth}{directory.rsplit('/', 1)[-1]}/ ({counts[directory]} files)\n")
+    if len(counts) > MAX_OUTLINE_DIRS:
+        lines.append(f"... [{len(counts) - MAX_OUTLINE_DIRS} more directories]\n")
+    return "".join(lines)
+
+
+def module_signatures(filename: str, content: str) -> List[str]:
+    """First line of every top-level function and class of a file."""
+    signatures = []
+    for unit in chunk_file(filename, content):
+        # Methods of split classes are named "Class.method"
+        if unit['kind'] == "module" or not unit['name'] or '.' in unit['name']:
+            continue
+        # Skip decorators, annotations and leading comments
+        for line in unit['content'].split('\n'):
+            line = line.strip()
+            if line and not line.startswith(('@', '#', '//', '/*', '*')):
+                signatures.append(line[:MAX_SIGNATURE_CHARS])
+                break
+    return signatures
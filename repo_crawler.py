@@ -1,12 +1,74 @@
-import requests
 import zipfile
+import http_client
+import metrics
+import fetch_engine
+import io
+import itertools
 import os
 import shutil
-from typing import List, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List, Dict, Tuple, Optional, Any, Iterator
+from urllib.parse import quote
+from snapshot_cache import SnapshotCache, MemoCache, variant_key
+from search_index import SearchIndex
+from code_chunker import chunk_code_files, iter_code_units
+from chunk_store import ChunkStore, CodeChunk
+import prefilter
+from semantic_index import SemanticIndex, EmbedFn, get_default_embedder, embedder_name
+from symbol_graph import SymbolGraph
+from issue_parser import parse_issue, exact_hits, pin_scores
+
+# API and raw-content endpoints come from fetch_engine
+GITHUB_WEB_URL = "https://github.com"
+
+# The compare endpoint lists at most 300 changed files; beyond that the diff
+# is incomplete and a full crawl is required
+MAX_COMPARE_FILES = 300
+
+# Skip common directories that usually don't contain relevant code
+SKIP_DIRS = {
+    '.git', '__pycache__', 'node_modules', '.venv', 'venv', 
+    'build', 'dist', 'target', '.pytest_cache', '.mypy_cache',
+    'coverage', '.coverage', 'htmlcov', '.tox', '.nox'
+}
+
+# Filename keywords that mark a file as worth reading first
+PRIORITY_KEYWORDS = ('main', 'index', 'app', 'server', 'config')
+
+# Files longer than this are truncated before being stored. Files are split
+# into function/class chunks before ranking and packing, so this only
+# guards against huge generated files rather than sizing the prompt.
+MAX_FILE_CHARS = 200000
+
+# Default size of the file reader pool used by extract_code_files
+READ_WORKERS = 8
+
+# Upper bound on the files scanned into one snapshot. Every eligible file up
+# to this bound is indexed; ranking against the issue, not the crawl order,
+# decides which of them reach the prompt.
+MAX_SCAN_FILES = 5000
+
+# Loaded snapshots (chunks plus indexes) kept in memory per process, so a
+# repeated analysis of the same commit skips reloading the snapshot cache
+SNAPSHOT_MEMO_ENTRIES = 8
+SNAPSHOT_MEMO_SECONDS = 15 * 60
+
+# A resolved branch head is trusted for this long before GitHub is asked again
+REF_MEMO_SECONDS = 60
+
+# Files of a very large repository (fetch_engine.LARGE_REPO_KB) fetched for
+# one issue, chosen by ranking their paths against it
+PARTIAL_FETCH_FILES = 200
+
+_snapshot_memo = MemoCache(SNAPSHOT_MEMO_ENTRIES, SNAPSHOT_MEMO_SECONDS)
+_ref_memo = MemoCache(256, REF_MEMO_SECONDS)
+_meta_memo = MemoCache(256, REF_MEMO_SECONDS)
 
 def crawl_and_analyze_repo(owner: str, repo: str, branch: str = "main", 
                           allowed_exts: Tuple[str, ...] = (".py", ".js", ".java", ".ts", ".go"),
-                          max_files: int = 20) -> List[Dict[str, str]]:
+                          max_files: int = 20, streaming: bool = False,
+                          skipped: Optional[List[Tuple[str, str]]] = None,
+                          ref: Optional[str] = None) -> List[CodeChunk]:
     """
     Download and analyze a GitHub repository.
     
@@ -16,10 +78,21 @@ def crawl_and_analyze_repo(owner: str, repo: str, branch: str = "main",
         branch: Branch to download (default: main)
         allowed_exts: Tuple of allowed file extensions
         max_files: Maximum number of files to process
+        streaming: Decode matching files from the tarball as it downloads
+            instead of extracting a ZIP under ./repos
+        skipped: When given, (path, reason) is appended for every file the
+            pre-filter dropped (see prefilter)
+        ref: Commit to download instead of the branch head
     
     Returns:
         List of dictionaries containing filename and content
     """
+    if streaming:
+        try:
+            return stream_code_files(owner, repo, branch, allowed_exts, max_files, skipped, ref)
+        except Exception as e:
+            raise Exception(f"Failed to crawl repository: {str(e)}")
+
     # Create directories
     temp_dir = "temp_downloads"
     repos_dir = "./repos"
@@ -28,13 +101,15 @@ def crawl_and_analyze_repo(owner: str, repo: str, branch: str = "main",
     
     try:
         # Download repository
-        zip_path = download_repo(owner, repo, branch, temp_dir)
+        zip_path = download_repo(owner, repo, branch, temp_dir, ref=ref)
         
-        # Extract repository
-        extract_path = extract_repo(zip_path, repo, repos_dir)
+        # Extract repository; a commit archive is rooted at "<repo>-<sha>/",
+        # renamed so filenames match the branch archives
+        root = f"{repo}-{branch.replace('/', '-')}" if ref else None
+        extract_path = extract_repo(zip_path, repo, repos_dir, root=root)
         
         # Extract code chunks
-        code_chunks = extract_code_files(extract_path, allowed_exts, max_files)
+        code_chunks = extract_code_files(extract_path, allowed_exts, max_files, skipped=skipped)
         
         return code_chunks
         
@@ -49,16 +124,393 @@ def crawl_and_analyze_repo(owner: str, repo: str, branch: str = "main",
         except:
             pass
 
-def download_repo(owner: str, repo: str, branch: str, temp_dir: str) -> str:
-    """Download repository as ZIP file."""
-    url = f"https://github.com/{owner}/{repo}/archive/refs/heads/{branch}.zip"
+@metrics.timed("crawl")
+def crawl_repo_snapshot(owner: str, repo: str, branch: str = "main",
+                        allowed_exts: Tuple[str, ...] = (".py", ".js", ".java", ".ts", ".go"),
+                        max_files: int = MAX_SCAN_FILES, streaming: bool = False,
+                        token: Optional[str] = None,
+                        cache: Optional[SnapshotCache] = None,
+                        semantic: bool = False, embed_fn: Optional[EmbedFn] = None,
+                        query: Optional[str] = None, sha: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Crawl a repository through the on-disk snapshot cache.
+    
+    The branch is resolved to a commit SHA with a conditional request, so an
+    unchanged branch costs one 304 round-trip and the cached files are reused.
+    When the branch has moved since the last cached crawl, only the files
+    changed in between are fetched and patched into the previous snapshot.
+    If the SHA cannot be resolved the repository is crawled without caching.
+    A sha resolved earlier (e.g. when a job was queued) pins the crawl to
+    that commit instead, so the branch is not resolved a second time.
+    
+    Files are split into function/class-level chunks and a BM25 search index
+    over those chunks is persisted next to each snapshot, so ranking an
+    issue against an already crawled commit needs no rescan. max_files only
+    bounds the scan: the whole repository is indexed by default and callers
+    pick the files for the prompt by ranking (see analyze_issue_relevance
+    with top_k), so the file contents are only read back for the winners.
+    With semantic, the chunks are also embedded (see semantic_index) and the
+    vectors are persisted the same way, so embedding cost is paid once per
+    commit. A symbol graph of definitions, imports and calls is built and
+    persisted once per commit too (see symbol_graph), for expanding the
+    prompt context to related code. Recently used snapshots are also kept
+    in memory for SNAPSHOT_MEMO_SECONDS, keyed by (owner, repo, sha, crawl
+    variant).
+    
+    For repositories over fetch_engine.LARGE_REPO_KB that are not cached
+    yet, a query (the issue text) switches to a partial fetch: paths are
+    listed and ranked against the query and only the best
+    PARTIAL_FETCH_FILES files are downloaded (see fetch_ranked_files). Such
+    snapshots are marked partial and are not cached.
+    
+    Returns:
+        Dictionary with the resolved sha (or None), the code chunks, their
+        search index and symbol graph (and semantic index when requested),
+        the (path, reason) pairs the pre-filter skipped, whether they were
+        served from the cache and, after an incremental update, the paths
+        that changed
+    """
+    cache = cache or SnapshotCache()
+    variant = variant_key(allowed_exts, max_files, MAX_FILE_CHARS)
+    index_name = f"index-{variant}.json"
+    skipped_name = f"skipped-{variant}.json"
+    
+    if not sha:
+        try:
+            sha = resolve_branch_sha(owner, repo, branch, token=token, cache=cache)
+        except Exception as e:
+            print(f"Could not resolve {owner}/{repo}@{branch}, crawling without cache: {e}")
+            sha = None
+    
+    memo_key = (owner, repo, sha, variant, embedder_name(embed_fn or get_default_embedder()) if semantic else None)
+    if sha:
+        memoized = _snapshot_memo.get(memo_key)
+        if memoized is not None:
+            result = {key: value for key, value in memoized.items() if key not in ("base_sha", "changed_paths")}
+            result["from_cache"] = True
+            return result
+    
+    result = None
+    if sha:
+        code_chunks = cache.load(owner, repo, sha, variant)
+        if code_chunks is not None:
+            index_data = cache.load_artifact(owner, repo, sha, index_name)
+            # Indexes saved before symbol definitions were recorded are rebuilt once
+            if index_data and "definitions" in index_data:
+                index = SearchIndex.from_dict(index_data)
+            else:
+                index = SearchIndex.build(iter_code_units(code_chunks))
+                cache.save_artifact(owner, repo, sha, index_name, index.to_dict())
+            skipped = [tuple(entry) for entry in cache.load_artifact(owner, repo, sha, skipped_name) or []]
+            result = {"sha": sha, "code_chunks": code_chunks, "index": index, "skipped": skipped,
+                      "from_cache": True}
+    
+    if sha and result is None:
+        base_sha = cache.get_latest(owner, repo, branch, variant)
+        base_chunks = cache.load(owner, repo, base_sha, variant) if base_sha else None
+        if base_chunks:
+            try:
+                update = update_snapshot_incremental(owner, repo, base_sha, sha, base_chunks,
+                                                     allowed_exts, max_files, token=token)
+            except Exception as e:
+                print(f"Incremental update {base_sha[:7]}...{sha[:7]} failed, crawling in full: {e}")
+                update = None
+            if update is not None:
+                code_chunks = update["code_chunks"]
+                changed_paths = update["changed_paths"]
+                changed = set(changed_paths)
+                
+                # Patch the previous index with just the changed files
+                index_data = cache.load_artifact(owner, repo, base_sha, index_name)
+                if index_data and "definitions" in index_data:
+                    index = SearchIndex.from_dict(index_data)
+                    index.update_files(changed_paths, chunk_code_files(
+                        [c for c in code_chunks if c['filename'] in changed]))
+                else:
+                    index = SearchIndex.build(iter_code_units(code_chunks))
+                
+                # Earlier skips of files that did not change still hold
+                skipped = [tuple(entry) for entry in cache.load_artifact(owner, repo, base_sha, skipped_name) or []
+                           if entry[0] not in changed]
+                skipped += update["skipped"]
+                
+                cache.store(owner, repo, sha, variant, code_chunks)
+                cache.save_artifact(owner, repo, sha, index_name, index.to_dict())
+                cache.save_artifact(owner, repo, sha, skipped_name, skipped)
+                cache.set_latest(owner, repo, branch, variant, sha)
+                # Serve the memory-mapped copy so sessions share one buffer
+                code_chunks = cache.load(owner, repo, sha, variant) or code_chunks
+                result = {"sha": sha, "code_chunks": code_chunks, "index": index, "skipped": skipped,
+                          "from_cache": True, "base_sha": base_sha, "changed_paths": changed_paths}
+    
+    if result is None and query and sha and is_large_repository(owner, repo, branch, token):
+        skipped = []
+        code_chunks = fetch_ranked_files(owner, repo, sha, f"{repo}-{branch}", allowed_exts, query,
+                                         token=token, skipped=skipped)
+        result = {"sha": sha, "code_chunks": code_chunks, "index": SearchIndex.build(iter_code_units(code_chunks)),
+                  "symbol_graph": SymbolGraph.build(code_chunks), "skipped": skipped,
+                  "from_cache": False, "partial": True}
+        if semantic:
+            result["semantic_index"] = SemanticIndex.build(chunk_code_files(code_chunks), embed_fn)
+        return result
+    
+    if result is None:
+        skipped = []
+        code_chunks = crawl_and_analyze_repo(owner, repo, branch, allowed_exts, max_files,
+                                             streaming=streaming, skipped=skipped, ref=sha)
+        index = SearchIndex.build(iter_code_units(code_chunks))
+        if sha:
+            cache.store(owner, repo, sha, variant, code_chunks)
+            cache.save_artifact(owner, repo, sha, index_name, index.to_dict())
+            cache.save_artifact(owner, repo, sha, skipped_name, skipped)
+            cache.set_latest(owner, repo, branch, variant, sha)
+            code_chunks = cache.load(owner, repo, sha, variant) or code_chunks
+        result = {"sha": sha, "code_chunks": code_chunks, "index": index, "skipped": skipped,
+                  "from_cache": False}
+    
+    result["symbol_graph"] = load_symbol_graph(owner, repo, result, variant, cache)
+    if semantic:
+        result["semantic_index"] = load_semantic_index(owner, repo, result, variant, cache, embed_fn)
+    
+    if sha:
+        _snapshot_memo.put(memo_key, result)
+    return result
+
+@metrics.timed("graph")
+def load_symbol_graph(owner: str, repo: str, snapshot: Dict[str, Any], variant: str,
+                      cache: SnapshotCache) -> SymbolGraph:
+    """Load the snapshot's symbol graph, or build and persist it (rebuilt in full after incremental updates)."""
+    code_chunks = snapshot["code_chunks"]
+    if not snapshot["sha"]:
+        return SymbolGraph.build(code_chunks)
+    
+    path = cache.artifact_path(owner, repo, snapshot["sha"], f"graph-{variant}.bin")
+    graph = SymbolGraph.load(path, code_chunks)
+    if graph is None:
+        graph = SymbolGraph.build(code_chunks)
+        graph.save(path)
+        cache.track_artifacts(owner, repo, snapshot["sha"])
+    return graph
+
+@metrics.timed("embed")
+def load_semantic_index(owner: str, repo: str, snapshot: Dict[str, Any], variant: str,
+                        cache: SnapshotCache, embed_fn: Optional[EmbedFn] = None) -> SemanticIndex:
+    """
+    Load the snapshot's chunk embeddings, or compute and persist them.
+    
+    After an incremental update the previous commit's vectors are reused and
+    only the chunks of changed files are embedded.
+    """
+    embed_fn = embed_fn or get_default_embedder()
+    sha = snapshot["sha"]
+    name = f"vectors-{variant}-{embedder_name(embed_fn)}.npy"
+    
+    if not sha:
+        return SemanticIndex.build(chunk_code_files(snapshot["code_chunks"]), embed_fn)
+    
+    path = cache.artifact_path(owner, repo, sha, name)
+    semantic_index = SemanticIndex.load(path, embed_fn)
+    if semantic_index is not None:
+        return semantic_index
+    
+    base = None
+    if snapshot.get("base_sha"):
+        base = SemanticIndex.load(cache.artifact_path(owner, repo, snapshot["base_sha"], name), embed_fn)
+    if base is not None:
+        changed = set(snapshot["changed_paths"])
+        base.update_files(snapshot["changed_paths"], chunk_code_files(
+            [c for c in snapshot["code_chunks"] if c['filename'] in changed]))
+        semantic_index = base
+    else:
+        semantic_index = SemanticIndex.build(chunk_code_files(snapshot["code_chunks"]), embed_fn)
+    
+    semantic_index.save(path)
+    cache.track_artifacts(owner, repo, sha)
+    return semantic_index
+
+def update_snapshot_incremental(owner: str, repo: str, base_sha: str, head_sha: str,
+                                code_chunks: List[Dict[str, Any]], allowed_exts: Tuple[str, ...],
+                                max_files: int, token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Patch a previously crawled chunk set up to a newer commit.
     
-    response = requests.get(url, timeout=30)
+    Uses the GitHub compare endpoint to list the paths changed between the
+    two commits and downloads only those files from raw.githubusercontent.com.
+    Unchanged files are kept as they are. New files are only added while the
+    set is below max_files, so the result can differ from a fresh crawl of a
+    repository that has more eligible files than the cap. Changed files go
+    through the path, size and content pre-filter; .gitignore and
+    .gitattributes rules are only applied by full crawls.
+    
+    Returns:
+        Dictionary with the patched code chunks, the changed paths (as
+        chunk filenames) and the changed files the pre-filter skipped, or
+        None when the change set cannot be applied incrementally and a full
+        crawl is needed
+    """
+    if not code_chunks:
+        return None
+    
+    headers = fetch_engine.github_headers(token)
+    
+    url = f"{fetch_engine.GITHUB_REST_URL}/repos/{owner}/{repo}/compare/{base_sha}...{head_sha}"
+    response = http_client.get(url, headers=headers, timeout=30)
+    if response.status_code != 200:
+        return None
+    
+    data = response.json()
+    # Only a linear history can be replayed as a diff of the cached snapshot
+    if data.get("status") not in ("ahead", "identical"):
+        return None
+    files = data.get("files") or []
+    if len(files) >= MAX_COMPARE_FILES:
+        return None
+    
+    # Cached filenames carry the archive's top-level directory ("repo-main/...")
+    root = code_chunks[0]['filename'].split('/', 1)[0]
+    chunks_by_path = {chunk['filename']: chunk for chunk in code_chunks}
+    changed_paths = []
+    skipped = []
+    
+    for changed in files:
+        status = changed.get("status")
+        path = f"{root}/{changed['filename']}"
+        
+        if status == "renamed" and changed.get("previous_filename"):
+            old_path = f"{root}/{changed['previous_filename']}"
+            if chunks_by_path.pop(old_path, None) is not None:
+                changed_paths.append(old_path)
+        
+        if status == "removed":
+            if chunks_by_path.pop(path, None) is not None:
+                changed_paths.append(path)
+            continue
+        
+        if not is_candidate_path(path, allowed_exts):
+            continue
+        reason = prefilter.classify_path(path)
+        if reason:
+            if chunks_by_path.pop(path, None) is not None:
+                changed_paths.append(path)
+            record_skip(skipped, path, reason)
+            continue
+        if path not in chunks_by_path and len(chunks_by_path) >= max_files:
+            continue
+        
+        raw_url = f"{fetch_engine.GITHUB_RAW_URL}/{owner}/{repo}/{head_sha}/{quote(changed['filename'])}"
+        raw_response = http_client.get(raw_url, headers=headers, timeout=30)
+        if raw_response.status_code != 200:
+            return None
+        metrics.record(bytes_downloaded=len(raw_response.content), files_scanned=1)
+        
+        if len(raw_response.content) > prefilter.MAX_FILE_BYTES:
+            chunk, reason = None, "oversized"
+        else:
+            chunk, reason = read_code_stream(io.BytesIO(raw_response.content), path)
+        if chunk:
+            chunks_by_path[path] = chunk
+        else:
+            chunks_by_path.pop(path, None)
+            record_skip(skipped, path, reason)
+        changed_paths.append(path)
+    
+    patched = sorted(chunks_by_path.values(), key=chunk_sort_key)
+    patched = ChunkStore.from_chunks(patched).chunks()
+    
+    return {"code_chunks": patched, "changed_paths": changed_paths, "skipped": skipped}
+
+def get_repository_meta(owner: str, repo: str, branch: str, token: Optional[str] = None) -> Dict[str, Any]:
+    """fetch_engine.resolve_repository, reused for REF_MEMO_SECONDS."""
+    key = (owner, repo, branch, bool(token))
+    meta = _meta_memo.get(key)
+    if meta is None:
+        meta = fetch_engine.resolve_repository(owner, repo, branch, token=token)
+        _meta_memo.put(key, meta)
+    return meta
+
+def is_large_repository(owner: str, repo: str, branch: str, token: Optional[str] = None) -> bool:
+    """Whether the repository is over fetch_engine.LARGE_REPO_KB (False when unknown)."""
+    try:
+        return get_repository_meta(owner, repo, branch, token=token)["size_kb"] > fetch_engine.LARGE_REPO_KB
+    except Exception as e:
+        print(f"Could not check the size of {owner}/{repo}: {e}")
+        return False
+
+def resolve_branch_sha(owner: str, repo: str, branch: str, token: Optional[str] = None,
+                       cache: Optional[SnapshotCache] = None) -> str:
+    """
+    Resolve a branch to its head commit SHA.
+    
+    The first lookup of a branch (with a token) is one GraphQL metadata
+    call, which also falls back to the default branch when "main" does not
+    exist; the branch it resolved to is remembered. After that, that
+    branch is looked up with the ETag from the last lookup sent as
+    If-None-Match, so when it has not moved GitHub answers 304 without a
+    body (and without counting against the rate limit). Without a known
+    branch, "main" falls back to 'master' like download_repo. A head
+    resolved in the last REF_MEMO_SECONDS is returned without a request.
+    """
+    memoized = _ref_memo.get((owner, repo, branch))
+    if memoized:
+        return memoized
+    
+    cache = cache or SnapshotCache()
+    known = cache.get_ref(owner, repo, branch)
+    if token and known is None:
+        try:
+            meta = get_repository_meta(owner, repo, branch, token=token)
+        except Exception as e:
+            print(f"Metadata lookup for {owner}/{repo} failed: {e}")
+            meta = None
+        if meta and meta["sha"]:
+            cache.set_ref(owner, repo, branch, meta["sha"], None, meta["branch"])
+            _ref_memo.put((owner, repo, branch), meta["sha"])
+            return meta["sha"]
+    
+    headers = fetch_engine.github_headers(token, accept="application/vnd.github.sha")
+    
+    refs = [branch, "master"] if branch == "main" else [branch]
+    if known and known.get("branch"):
+        refs = list(dict.fromkeys([known["branch"]] + refs))
+    for ref in refs:
+        request_headers = dict(headers)
+        # Entries from before resolved branches were recorded are for the branch itself
+        if known and known.get("etag") and known.get("branch", branch) == ref:
+            request_headers["If-None-Match"] = known["etag"]
+        
+        url = f"{fetch_engine.GITHUB_REST_URL}/repos/{owner}/{repo}/commits/{ref}"
+        response = http_client.get(url, headers=request_headers, timeout=10)
+        
+        if response.status_code == 304 and known:
+            _ref_memo.put((owner, repo, branch), known["sha"])
+            return known["sha"]
+        if response.status_code == 200:
+            sha = response.text.strip()
+            cache.set_ref(owner, repo, branch, sha, response.headers.get("ETag"), ref)
+            _ref_memo.put((owner, repo, branch), sha)
+            return sha
+        if response.status_code not in (404, 422):
+            break
+    
+    raise Exception(f"Could not resolve branch '{branch}'. HTTP {response.status_code}")
+
+def archive_url(owner: str, repo: str, branch: str, sha: Optional[str] = None) -> str:
+    """URL of the ZIP archive of a branch, or of the commit sha when given."""
+    if sha:
+        return f"{GITHUB_WEB_URL}/{owner}/{repo}/archive/{sha}.zip"
+    return f"{GITHUB_WEB_URL}/{owner}/{repo}/archive/refs/heads/{branch}.zip"
+
+@metrics.timed("download")
+def download_repo(owner: str, repo: str, branch: str, temp_dir: str, ref: Optional[str] = None) -> str:
+    """Download repository as ZIP file (the commit ref when given, else the branch head)."""
+    url = archive_url(owner, repo, branch, sha=ref)
+    
+    response = http_client.get(url, timeout=30)
     if response.status_code != 200:
         # Try 'master' branch if 'main' fails
-        if branch == "main":
-            url = f"https://github.com/{owner}/{repo}/archive/refs/heads/master.zip"
-            response = requests.get(url, timeout=30)
+        if branch == "main" and not ref:
+            url = archive_url(owner, repo, "master")
+            response = http_client.get(url, timeout=30)
             
         if response.status_code != 200:
             raise Exception(f"Could not download repository. HTTP {response.status_code}")
@@ -66,11 +518,253 @@ def download_repo(owner: str, repo: str, branch: str, temp_dir: str) -> str:
     zip_path = os.path.join(temp_dir, f"{repo}.zip")
     with open(zip_path, "wb") as f:
         f.write(response.content)
+    metrics.record(bytes_downloaded=len(response.content))
     
     return zip_path
 
-def extract_repo(zip_path: str, repo: str, repos_dir: str) -> str:
-    """Extract repository ZIP file."""
+def stream_code_files(owner: str, repo: str, branch: str, allowed_exts: Tuple[str, ...],
+                      max_files: int, skipped: Optional[List[Tuple[str, str]]] = None,
+                      ref: Optional[str] = None) -> List[CodeChunk]:
+    """
+    Stream the repository tarball and decode matching files as they arrive, without touching ./repos.
+    
+    Without a ref, the branch (or the default branch when "main" does not
+    exist) is resolved with one metadata call instead of retrying downloads.
+    Filenames are rooted at "<repo>-<branch>/" like the ZIP archives.
+    """
+    if ref is None:
+        try:
+            meta = get_repository_meta(owner, repo, branch)
+            branch = meta["branch"] or branch
+            ref = meta["sha"] or branch
+        except Exception as e:
+            print(f"Could not resolve {owner}/{repo}@{branch}, streaming the branch as named: {e}")
+            ref = branch
+    return extract_code_files_from_tarball(owner, repo, ref, f"{repo}-{branch}", allowed_exts,
+                                           max_files, skipped)
+
+@metrics.timed("download")
+def extract_code_files_from_tarball(owner: str, repo: str, ref: str, root: str,
+                                    allowed_exts: Tuple[str, ...], max_files: int,
+                                    skipped: Optional[List[Tuple[str, str]]] = None) -> List[CodeChunk]:
+    """
+    Decode code files from a streamed tarball (see fetch_engine.iter_tarball).
+    
+    Download, decompression and filtering overlap: every member is checked
+    against the path rules, the listed size and a SNIFF_BYTES prefix before
+    its contents are read, and the download stops once max_files files are
+    kept. .gitignore and .gitattributes apply from the point they appear in
+    the stream; git archives list them before the rest of their directory.
+    """
+    store = ChunkStore()
+    rules = prefilter.PathRules()
+    scanned = 0
+    
+    members = fetch_engine.iter_tarball(owner, repo, ref)
+    try:
+        for path, size, open_member in members:
+            filename = f"{root}/{path}"
+            name = os.path.basename(path)
+            if name in ('.gitignore', '.gitattributes') and size <= prefilter.MAX_FILE_BYTES:
+                text = open_member().read().decode('utf-8', errors='ignore')
+                base = os.path.dirname(filename)
+                if name == '.gitignore':
+                    rules.add_gitignore(base, text)
+                else:
+                    rules.add_gitattributes(base, text)
+                continue
+            if not is_candidate_path(filename, allowed_exts):
+                continue
+            reason = rules.match(filename) or prefilter.classify_path(filename)
+            if reason is None and size > prefilter.MAX_FILE_BYTES:
+                reason = "oversized"
+            if reason:
+                record_skip(skipped, filename, reason)
+                continue
+            
+            scanned += 1
+            chunk, reason = read_code_stream(open_member(), filename)
+            if chunk:
+                store.append(chunk['filename'], chunk['content'], chunk['size'], chunk['lines'])
+                if len(store) >= max_files:
+                    break
+            else:
+                record_skip(skipped, filename, reason)
+    finally:
+        members.close()
+    metrics.record(files_scanned=scanned)
+    
+    code_chunks = sorted(store, key=chunk_sort_key)
+    metrics.record(files_kept=len(code_chunks))
+    
+    return code_chunks
+
+@metrics.timed("download")
+def fetch_ranked_files(owner: str, repo: str, ref: str, root: str, allowed_exts: Tuple[str, ...],
+                       query: str, max_files: int = PARTIAL_FETCH_FILES, token: Optional[str] = None,
+                       skipped: Optional[List[Tuple[str, str]]] = None) -> List[CodeChunk]:
+    """
+    Fetch only the files of a commit most likely to matter for a query.
+    
+    Paths are listed with the git trees API and run through the pre-filter
+    (.gitignore/.gitattributes are fetched first), then ranked against the
+    query without any content: files the query references exactly (stack
+    frames, paths, see issue_parser) first, then BM25 over path terms. The
+    best max_files are downloaded in parallel (fetch_engine.BLOB_WORKERS)
+    and sniffed like crawled files.
+    """
+    tree = fetch_engine.list_tree(owner, repo, ref, token=token)
+    if tree["truncated"]:
+        print(f"File listing of {owner}/{repo}@{ref[:12]} was truncated by GitHub, ranking the listed files")
+    entries = tree["entries"]
+    
+    rule_paths = [e["path"] for e in entries
+                  if os.path.basename(e["path"]) in ('.gitignore', '.gitattributes')
+                  and e["size"] <= prefilter.MAX_FILE_BYTES]
+    rules = prefilter.load_rules({
+        f"{root}/{path}": content.decode('utf-8', errors='ignore')
+        for path, content in fetch_engine.fetch_blobs(owner, repo, ref, rule_paths, token=token)
+        if content is not None
+    })
+    
+    candidates = {}
+    for entry in entries:
+        filename = f"{root}/{entry['path']}"
+        if not is_candidate_path(filename, allowed_exts):
+            continue
+        reason = rules.match(filename) or prefilter.classify_path(filename)
+        if reason is None and entry["size"] > prefilter.MAX_FILE_BYTES:
+            reason = "oversized"
+        if reason:
+            record_skip(skipped, filename, reason)
+        else:
+            candidates[filename] = entry["path"]
+    
+    # Rank paths alone: exact references first, then BM25 over path terms
+    path_index = SearchIndex.build({"filename": f, "content": f} for f in candidates)
+    scores = pin_scores(dict(path_index.rank_files(query)), exact_hits(parse_issue(query), candidates, {}))
+    selected = sorted(candidates, key=lambda f: (-scores.get(f, 0.0),
+                                                 0 if is_priority_file(os.path.basename(f)) else 1))[:max_files]
+    
+    store = ChunkStore()
+    paths = [candidates[f] for f in selected]
+    for filename, (_, content) in zip(selected, fetch_engine.fetch_blobs(owner, repo, ref, paths, token=token)):
+        if content is None:
+            continue
+        chunk, reason = read_code_stream(io.BytesIO(content), filename)
+        if chunk:
+            store.append(chunk['filename'], chunk['content'], chunk['size'], chunk['lines'])
+        else:
+            record_skip(skipped, filename, reason)
+    metrics.record(files_scanned=len(candidates))
+    
+    code_chunks = sorted(store, key=chunk_sort_key)
+    metrics.record(files_kept=len(code_chunks))
+    
+    return code_chunks
+
+@metrics.timed("walk")
+def extract_code_files_from_zip(archive, allowed_exts: Tuple[str, ...], max_files: int,
+                                skipped: Optional[List[Tuple[str, str]]] = None) -> List[CodeChunk]:
+    """
+    Extract code files from a ZIP archive (path or file object) in memory.
+    
+    Only the central directory is scanned up front; members are decompressed
+    only when their path passes the same filters as extract_code_files,
+    including the pre-filter, which needs just the listed size and a
+    SNIFF_BYTES prefix of each member.
+    """
+    store = ChunkStore()
+    
+    with zipfile.ZipFile(archive, 'r') as zip_ref:
+        infos = zip_ref.infolist()
+        rules = prefilter.load_rules({
+            info.filename: zip_ref.read(info).decode('utf-8', errors='ignore')
+            for info in infos
+            if os.path.basename(info.filename) in ('.gitignore', '.gitattributes')
+            and info.file_size <= prefilter.MAX_FILE_BYTES
+        })
+        
+        # Group candidates by directory in archive order, priority files first,
+        # mirroring the order extract_code_files visits them in os.walk
+        dir_order = {}
+        candidates = []
+        for info in infos:
+            if info.is_dir() or not is_candidate_path(info.filename, allowed_exts):
+                continue
+            reason = rules.match(info.filename) or prefilter.classify_path(info.filename)
+            if reason is None and info.file_size > prefilter.MAX_FILE_BYTES:
+                reason = "oversized"
+            if reason:
+                record_skip(skipped, info.filename, reason)
+                continue
+            dirname, fname = os.path.split(info.filename)
+            dir_index = dir_order.setdefault(dirname, len(dir_order))
+            candidates.append((dir_index, 0 if is_priority_file(fname) else 1, info))
+        
+        candidates.sort(key=lambda c: (c[0], c[1]))
+        
+        for _, _, info in candidates:
+            if len(store) >= max_files:
+                break
+            
+            try:
+                with zip_ref.open(info) as f:
+                    chunk, reason = read_code_stream(f, info.filename)
+            except (zipfile.BadZipFile, OSError):
+                continue
+            
+            if chunk:
+                store.append(chunk['filename'], chunk['content'], chunk['size'], chunk['lines'])
+            else:
+                record_skip(skipped, info.filename, reason)
+        metrics.record(files_scanned=len(candidates))
+    
+    code_chunks = sorted(store, key=chunk_sort_key)
+    metrics.record(files_kept=len(code_chunks))
+    
+    return code_chunks
+
+def is_candidate_path(rel_path: str, allowed_exts: Tuple[str, ...]) -> bool:
+    """Check a repository-relative path against the extension and directory filters."""
+    parts = rel_path.replace('\\', '/').split('/')
+    if not parts[-1].endswith(allowed_exts):
+        return False
+    return not any(d in SKIP_DIRS or d.startswith('.') for d in parts[:-1])
+
+def is_priority_file(fname: str) -> bool:
+    """Main files, entry points and configs are read before the rest of a directory."""
+    return any(keyword in fname.lower() for keyword in PRIORITY_KEYWORDS)
+
+def build_code_chunk(rel_path: str, content: str) -> Optional[Dict[str, str]]:
+    """Build the chunk dict for a file, truncating large files and dropping empty ones."""
+    # Skip very large files or empty files
+    if len(content) > MAX_FILE_CHARS:  # Truncate very large files
+        content = content[:MAX_FILE_CHARS] + "\n\n... [File truncated due to size]"
+    elif len(content.strip()) == 0:
+        return None
+    
+    return {
+        "filename": rel_path,
+        "content": content,
+        "size": len(content),
+        "lines": content.count('\n') + 1
+    }
+
+def chunk_sort_key(chunk):
+    """Sort by importance (main files first, then by size)."""
+    filename = chunk['filename'].lower()
+    # Give higher priority to important files
+    if any(keyword in filename for keyword in ['main', 'index', 'app', 'server']):
+        return (0, -chunk['size'])
+    elif any(keyword in filename for keyword in ['config', 'setting', 'const']):
+        return (1, -chunk['size'])
+    else:
+        return (2, -chunk['size'])
+
+@metrics.timed("extract")
+def extract_repo(zip_path: str, repo: str, repos_dir: str, root: Optional[str] = None) -> str:
+    """Extract repository ZIP file, renaming its top-level directory to root when given."""
     extract_path = os.path.join(repos_dir, repo)
     
     # Remove existing directory if it exists
@@ -80,83 +774,167 @@ def extract_repo(zip_path: str, repo: str, repos_dir: str) -> str:
     with zipfile.ZipFile(zip_path, 'r') as zip_ref:
         zip_ref.extractall(extract_path)
     
+    entries = os.listdir(extract_path)
+    if root and len(entries) == 1 and entries[0] != root:
+        os.rename(os.path.join(extract_path, entries[0]), os.path.join(extract_path, root))
+    
     return extract_path
 
-def extract_code_files(extract_path: str, allowed_exts: Tuple[str, ...], max_files: int) -> List[Dict[str, str]]:
-    """Extract and process code files from the repository."""
-    code_chunks = []
-    files_processed = 0
+@metrics.timed("walk")
+def extract_code_files(extract_path: str, allowed_exts: Tuple[str, ...], max_files: int,
+                       workers: int = READ_WORKERS, backend: str = "thread",
+                       skipped: Optional[List[Tuple[str, str]]] = None) -> List[CodeChunk]:
+    """
+    Extract and process code files from the repository.
     
-    # Skip common directories that usually don't contain relevant code
-    skip_dirs = {
-        '.git', '__pycache__', 'node_modules', '.venv', 'venv', 
-        'build', 'dist', 'target', '.pytest_cache', '.mypy_cache',
-        'coverage', '.coverage', 'htmlcov', '.tox', '.nox'
-    }
+    Candidate files are read in parallel by a thread or process pool, in
+    windows that follow the os.walk/priority order, so max_files is still
+    filled with the same files a sequential read would pick. Ignored,
+    vendored, generated, minified, binary and oversized files are dropped
+    by the pre-filter before they are read in full and do not count
+    towards max_files.
     
+    Args:
+        extract_path: Directory the repository was extracted to
+        allowed_exts: Tuple of allowed file extensions
+        max_files: Maximum number of files to process
+        workers: Size of the reader pool (1 reads sequentially)
+        backend: "thread" or "process"
+        skipped: When given, (path, reason) is appended for every file the
+            pre-filter dropped
+    """
+    if backend not in ("thread", "process"):
+        raise ValueError(f"Unknown reader backend: {backend}")
+    
+    # Contents go straight into one shared buffer; each dict is dropped once copied
+    store = ChunkStore()
+    candidates = iter_candidate_files(extract_path, allowed_exts, skipped)
+    
+    if workers <= 1:
+        for fpath, rel_path in candidates:
+            if len(store) >= max_files:
+                break
+            chunk, reason = read_code_file(fpath, rel_path)
+            metrics.record(files_scanned=1)
+            if chunk:
+                store.append(chunk['filename'], chunk['content'], chunk['size'], chunk['lines'])
+            elif reason:
+                record_skip(skipped, rel_path, reason)
+    else:
+        executor_cls = ThreadPoolExecutor if backend == "thread" else ProcessPoolExecutor
+        with executor_cls(max_workers=workers) as executor:
+            while len(store) < max_files:
+                # Read a little ahead of what is still needed to absorb empty files
+                window = list(itertools.islice(candidates, max(workers * 2, max_files - len(store))))
+                if not window:
+                    break
+                metrics.record(files_scanned=len(window))
+                for (_, rel_path), (chunk, reason) in zip(window, executor.map(read_code_file, *zip(*window))):
+                    if chunk and len(store) < max_files:
+                        store.append(chunk['filename'], chunk['content'], chunk['size'], chunk['lines'])
+                    elif reason:
+                        record_skip(skipped, rel_path, reason)
+    
+    code_chunks = sorted(store, key=chunk_sort_key)
+    metrics.record(files_kept=len(code_chunks))
+    
+    return code_chunks
+
+def iter_candidate_files(extract_path: str, allowed_exts: Tuple[str, ...],
+                         skipped: Optional[List[Tuple[str, str]]] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (path, relative path) for every eligible file, priority files first per directory.
+    
+    .gitignore and .gitattributes files are picked up as the walk reaches
+    their directory, so ignored, vendored and generated directories are
+    pruned before they are entered. Files are checked against the same
+    rules, their path and their size (one stat, no read).
+    """
+    rules = prefilter.PathRules()
     for root, dirs, files in os.walk(extract_path):
+        rel_root = os.path.relpath(root, extract_path).replace(os.sep, '/')
+        rel_root = '' if rel_root == '.' else rel_root
+        for name in ('.gitignore', '.gitattributes'):
+            if name in files:
+                try:
+                    with open(os.path.join(root, name), 'r', encoding='utf-8', errors='ignore') as f:
+                        text = f.read(prefilter.MAX_FILE_BYTES)
+                except OSError:
+                    continue
+                if name == '.gitignore':
+                    rules.add_gitignore(rel_root, text)
+                else:
+                    rules.add_gitattributes(rel_root, text)
+        
         # Skip unwanted directories
-        dirs[:] = [d for d in dirs if d not in skip_dirs and not d.startswith('.')]
+        kept_dirs = []
+        for d in dirs:
+            if d in SKIP_DIRS or d.startswith('.'):
+                continue
+            rel_dir = f"{rel_root}/{d}" if rel_root else d
+            reason = rules.match(rel_dir, is_dir=True) or prefilter.classify_path(rel_dir + '/')
+            if reason:
+                record_skip(skipped, rel_dir + '/', reason)
+            else:
+                kept_dirs.append(d)
+        dirs[:] = kept_dirs
         
         # Prioritize certain files (like main files, configs, etc.)
         priority_files = []
         regular_files = []
         
         for fname in files:
-            if fname.endswith(allowed_exts):
-                if any(keyword in fname.lower() for keyword in ['main', 'index', 'app', 'server', 'config']):
-                    priority_files.append(fname)
-                else:
-                    regular_files.append(fname)
+            if not fname.endswith(allowed_exts):
+                continue
+            rel_path = f"{rel_root}/{fname}" if rel_root else fname
+            reason = rules.match(rel_path) or prefilter.classify_path(rel_path)
+            if reason is None:
+                try:
+                    if os.path.getsize(os.path.join(root, fname)) > prefilter.MAX_FILE_BYTES:
+                        reason = "oversized"
+                except OSError:
+                    continue
+            if reason:
+                record_skip(skipped, rel_path, reason)
+            elif is_priority_file(fname):
+                priority_files.append(fname)
+            else:
+                regular_files.append(fname)
         
-        # Process priority files first
         for fname in priority_files + regular_files:
-            if files_processed >= max_files:
-                break
-                
             fpath = os.path.join(root, fname)
-            rel_path = os.path.relpath(fpath, extract_path)
-            
-            try:
-                with open(fpath, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                    
-                    # Skip very large files or empty files
-                    if len(content) > 10000:  # Truncate very large files
-                        content = content[:10000] + "\n\n... [File truncated due to size]"
-                    elif len(content.strip()) == 0:
-                        continue
-                    
-                    code_chunks.append({
-                        "filename": rel_path,
-                        "content": content,
-                        "size": len(content),
-                        "lines": content.count('\n') + 1
-                    })
-                    
-                    files_processed += 1
-                    
-            except (UnicodeDecodeError, PermissionError, IsADirectoryError):
-                # Skip files that can't be read
-                continue
-        
-        if files_processed >= max_files:
-            break
-    
-    # Sort by importance (main files first, then by size)
-    def sort_key(chunk):
-        filename = chunk['filename'].lower()
-        # Give higher priority to important files
-        if any(keyword in filename for keyword in ['main', 'index', 'app', 'server']):
-            return (0, -chunk['size'])
-        elif any(keyword in filename for keyword in ['config', 'setting', 'const']):
-            return (1, -chunk['size'])
-        else:
-            return (2, -chunk['size'])
-    
-    code_chunks.sort(key=sort_key)
-    
-    return code_chunks
+            yield fpath, os.path.relpath(fpath, extract_path)
+
+def read_code_file(fpath: str, rel_path: str) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
+    """Read a file through the content pre-filter; returns (chunk, None) or (None, skip reason)."""
+    try:
+        with open(fpath, 'rb') as f:
+            return read_code_stream(f, rel_path)
+    except (PermissionError, IsADirectoryError, FileNotFoundError):
+        # Skip files that can't be read
+        return None, None
+
+def read_code_stream(f, rel_path: str) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
+    """
+    Build a chunk from a binary file object, sniffing its first SNIFF_BYTES
+    before reading the rest, so binary, minified and generated files cost
+    one small read.
+    """
+    prefix = f.read(prefilter.SNIFF_BYTES)
+    reason = prefilter.sniff(prefix)
+    if reason:
+        return None, reason
+    data = prefix + f.read(prefilter.MAX_FILE_BYTES - len(prefix))
+    # One extra character is enough to know the file needs truncating
+    content = data.decode('utf-8', errors='ignore')[:MAX_FILE_CHARS + 1]
+    chunk = build_code_chunk(rel_path, content)
+    return chunk, None if chunk else "empty"
+
+def record_skip(skipped: Optional[List[Tuple[str, str]]], path: str, reason: str):
+    """Report a file the pre-filter dropped, to the caller's list and the run metrics."""
+    if skipped is not None:
+        skipped.append((path, reason))
+    metrics.record(files_skipped=1, **{f"skipped_{reason}": 1})
 
 def get_repo_summary(code_chunks: List[Dict[str, str]]) -> Dict[str, any]:
     """Generate a summary of the repository."""
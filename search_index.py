@@ -0,0 +1,178 @@
+import math
+import re
+from collections import Counter
+from typing import List, Dict, Tuple, Optional, Any
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+# Extra weight for query terms that appear in a file's path
+FILENAME_BOOST = 3.0
+
+STOPWORDS = {
+    'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are',
+    'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would',
+    'could', 'should', 'may', 'might', 'can', 'cannot', 'not', 'no', 'yes', 'this', 'that',
+    'these', 'those', 'a', 'an', 'it', 'if', 'as', 'from', 'when', 'we', 'i', 'you',
+}
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase search terms.
+
+    Identifiers are kept whole and also split on snake_case and camelCase
+    boundaries, so "getUserName" yields "getusername", "get", "user" and "name".
+    """
+    terms = []
+    for identifier in _IDENTIFIER_RE.findall(text):
+        parts = [p.lower() for piece in identifier.split('_') for p in _CAMEL_RE.findall(piece)]
+        whole = identifier.lower().strip('_')
+        if len(parts) > 1 and len(whole) > 1 and whole not in STOPWORDS:
+            terms.append(whole)
+        terms.extend(p for p in parts if len(p) > 1 and p not in STOPWORDS)
+    return terms
+
+
+class SearchIndex:
+    """
+    Inverted index over code chunks ranked with BM25.
+
+    Term frequencies are kept both per chunk and per file, so callers can rank
+    individual chunks or whole files. Chunks are identified by their position
+    within a file ("path#0", "path#1", ...) so a file can be removed and
+    re-added when it changes without rebuilding the index. Named chunks
+    (functions, classes, methods) are also recorded as symbol definitions,
+    so exact references from an issue resolve without ranking.
+    """
+
+    def __init__(self):
+        self.chunk_postings: Dict[str, Dict[str, int]] = {}
+        self.chunk_lengths: Dict[str, int] = {}
+        self.file_postings: Dict[str, Dict[str, int]] = {}
+        self.file_lengths: Dict[str, int] = {}
+        self.file_chunks: Dict[str, List[str]] = {}
+        self.path_terms: Dict[str, List[str]] = {}
+        self.definitions: Dict[str, List[str]] = {}
+
+    @classmethod
+    def build(cls, code_chunks: List[Dict[str, Any]]) -> "SearchIndex":
+        index = cls()
+        index.add_chunks(code_chunks)
+        return index
+
+    def add_chunks(self, code_chunks: List[Dict[str, Any]]):
+        """Index chunks; every chunk of a file must be added in the same call."""
+        for chunk in code_chunks:
+            filename = chunk['filename']
+            chunk_ids = self.file_chunks.setdefault(filename, [])
+            chunk_id = f"{filename}#{len(chunk_ids)}"
+            chunk_ids.append(chunk_id)
+
+            counts = Counter(tokenize(chunk['content']))
+            self.chunk_lengths[chunk_id] = sum(counts.values())
+            self.file_lengths[filename] = self.file_lengths.get(filename, 0) + self.chunk_lengths[chunk_id]
+            for term, tf in counts.items():
+                self.chunk_postings.setdefault(term, {})[chunk_id] = tf
+                file_tfs = self.file_postings.setdefault(term, {})
+                file_tfs[filename] = file_tfs.get(filename, 0) + tf
+
+            if filename not in self.path_terms:
+                self.path_terms[filename] = sorted(set(tokenize(filename)))
+
+            name = chunk.get('name')
+            if name and chunk.get('kind') != "module":
+                # "Class.method" is also found as "method"
+                for symbol in {name, name.rsplit('.', 1)[-1]}:
+                    files = self.definitions.setdefault(symbol, [])
+                    if filename not in files:
+                        files.append(filename)
+
+    def remove_file(self, filename: str):
+        """Drop every chunk of a file from the index."""
+        for chunk_id in self.file_chunks.pop(filename, []):
+            self.chunk_lengths.pop(chunk_id, None)
+        self.file_lengths.pop(filename, None)
+        self.path_terms.pop(filename, None)
+        for postings, key in ((self.chunk_postings, None), (self.file_postings, filename)):
+            for term in list(postings):
+                docs = postings[term]
+                if key is not None:
+                    docs.pop(key, None)
+                else:
+                    for doc_id in [d for d in docs if d.rsplit('#', 1)[0] == filename]:
+                        del docs[doc_id]
+                if not docs:
+                    del postings[term]
+        for symbol in list(self.definitions):
+            files = self.definitions[symbol]
+            if filename in files:
+                files.remove(filename)
+                if not files:
+                    del self.definitions[symbol]
+
+    def update_files(self, removed: List[str], code_chunks: List[Dict[str, Any]]):
+        """Replace the given files with freshly extracted chunks."""
+        for filename in set(removed) | {chunk['filename'] for chunk in code_chunks}:
+            self.remove_file(filename)
+        self.add_chunks(code_chunks)
+
+    def rank_files(self, query: str) -> List[Tuple[str, float]]:
+        """Return (filename, score) for every indexed file, best first."""
+        query_terms = set(tokenize(query))
+        scores = self._bm25(query_terms, self.file_postings, self.file_lengths)
+        for filename, terms in self.path_terms.items():
+            boost = sum(self._idf(term, self.file_postings, len(self.file_lengths))
+                        for term in query_terms.intersection(terms))
+            if boost:
+                scores[filename] = scores.get(filename, 0.0) + FILENAME_BOOST * boost
+        return sorted(((f, scores.get(f, 0.0)) for f in self.file_lengths), key=lambda x: x[1], reverse=True)
+
+    def rank_chunks(self, query: str, top_k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Return (chunk id, score) for chunks matching the query, best first."""
+        scores = self._bm25(tokenize(query), self.chunk_postings, self.chunk_lengths)
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        return ranked[:top_k] if top_k else ranked
+
+    def _bm25(self, query_terms, postings: Dict[str, Dict[str, int]],
+              lengths: Dict[str, int]) -> Dict[str, float]:
+        if not lengths:
+            return {}
+        avg_length = (sum(lengths.values()) / len(lengths)) or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(query_terms):
+            docs = postings.get(term)
+            if not docs:
+                continue
+            idf = self._idf(term, postings, len(lengths))
+            for doc_id, tf in docs.items():
+                norm = K1 * (1 - B + B * lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        return scores
+
+    @staticmethod
+    def _idf(term: str, postings: Dict[str, Dict[str, int]], doc_count: int) -> float:
+        df = len(postings.get(term, ()))
+        return math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "chunk_postings": self.chunk_postings,
+            "chunk_lengths": self.chunk_lengths,
+            "file_postings": self.file_postings,
+            "file_lengths": self.file_lengths,
+            "file_chunks": self.file_chunks,
+            "path_terms": self.path_terms,
+            "definitions": self.definitions,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SearchIndex":
+        index = cls()
+        for key, value in data.items():
+            setattr(index, key, value)
+        return index
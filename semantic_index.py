@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import zlib
+from typing import List, Dict, Tuple, Optional, Callable
+
+import numpy as np
+
+from search_index import tokenize
+
+# Dimension of the built-in hashing embedder
+HASH_DIM = 512
+
+# Local sentence-transformers model used when the package is installed
+LOCAL_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Share of the combined score that comes from semantic similarity
+SEMANTIC_WEIGHT = 0.4
+
+EmbedFn = Callable[[List[str]], np.ndarray]
+
+_default_embedder = None
+
+def hashing_embed(texts: List[str]) -> np.ndarray:
+    """
+    Embed texts with signed feature hashing of code terms and character trigrams.
+
+    Dependency-free and deterministic. Trigrams of each term let related word
+    forms ("timeout", "timeouts", "timer") land near each other, which exact
+    keyword matching misses.
+    """
+    matrix = np.zeros((len(texts), HASH_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for term in tokenize(text):
+            features = [term] + [f"#{term[i:i + 3]}" for i in range(max(1, len(term) - 2))]
+            for feature in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                matrix[row, h % HASH_DIM] += 1.0 if h & 0x80000000 else -1.0
+    return _normalize(matrix)
+
+def get_default_embedder() -> EmbedFn:
+    """
+    A local sentence-transformers model on CPU when installed, otherwise hashing_embed.
+
+    The returned function has a __name__ that identifies the model, which is
+    used to keep vectors of different embedders apart on disk.
+    """
+    global _default_embedder
+    if _default_embedder is None:
+        try:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(LOCAL_MODEL, device="cpu")
+
+            def minilm_embed(texts: List[str]) -> np.ndarray:
+                return np.asarray(model.encode(texts, batch_size=32, normalize_embeddings=True), dtype=np.float32)
+
+            _default_embedder = minilm_embed
+        except Exception:
+            _default_embedder = hashing_embed
+    return _default_embedder
+
+class SemanticIndex:
+    """
+    Embedding matrix over code chunks with vectorized cosine top-k search.
+
+    Rows are L2-normalized, so cosine similarity is a single matrix-vector
+    product. Chunk ids follow SearchIndex ("path#0", "path#1", ...) so
+    lexical and semantic scores line up. Saved indexes are loaded memory-mapped.
+    """
+
+    def __init__(self, ids: List[str], vectors: np.ndarray, embed_fn: Optional[EmbedFn] = None):
+        self.ids = ids
+        self.vectors = vectors
+        self.embed_fn = embed_fn or get_default_embedder()
+
+    @classmethod
+    def build(cls, units: List[Dict[str, str]], embed_fn: Optional[EmbedFn] = None) -> "SemanticIndex":
+        embed_fn = embed_fn or get_default_embedder()
+        ids = _chunk_ids(units)
+        vectors = _embed(units, embed_fn)
+        return cls(ids, vectors, embed_fn)
+
+    def update_files(self, removed: List[str], units: List[Dict[str, str]]):
+        """Replace the vectors of changed files, embedding only their new chunks."""
+        changed = set(removed) | {unit['filename'] for unit in units}
+        keep = [i for i, chunk_id in enumerate(self.ids) if chunk_id.rsplit('#', 1)[0] not in changed]
+        parts = [np.asarray(self.vectors[keep])] if keep else []
+        if units:
+            parts.append(_embed(units, self.embed_fn))
+        self.ids = [self.ids[i] for i in keep] + _chunk_ids(units)
+        self.vectors = np.vstack(parts) if parts else np.zeros((0, HASH_DIM), dtype=np.float32)
+
+    def search(self, query: str, top_k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Return (chunk id, cosine similarity) for the best matching chunks."""
+        if not self.ids:
+            return []
+        query_vector = self.embed_fn([query])[0]
+        scores = self.vectors @ query_vector
+        k = min(top_k or len(self.ids), len(self.ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+    def rank_files(self, query: str) -> Dict[str, float]:
+        """Best chunk similarity per file."""
+        scores = {}
+        for chunk_id, score in self.search(query):
+            filename = chunk_id.rsplit('#', 1)[0]
+            scores[filename] = max(score, scores.get(filename, score))
+        return scores
+
+    def save(self, path: str):
+        """Write the vectors to path (.npy) and the chunk ids next to it."""
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(self.vectors, dtype=np.float32))
+        with open(f"{tmp_path}.ids.json", "w", encoding="utf-8") as f:
+            json.dump(self.ids, f)
+        os.replace(tmp_path, path)
+        os.replace(f"{tmp_path}.ids.json", f"{path}.ids.json")
+
+    @classmethod
+    def load(cls, path: str, embed_fn: Optional[EmbedFn] = None) -> Optional["SemanticIndex"]:
+        """Load a saved index with the vectors memory-mapped, or None if missing or torn."""
+        try:
+            vectors = np.load(path, mmap_mode="r")
+            with open(f"{path}.ids.json", "r", encoding="utf-8") as f:
+                ids = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # A crash between the two replaces in save() leaves ids from another write
+        if len(ids) != len(vectors):
+            return None
+        return cls(ids, vectors, embed_fn)
+
+def combine_scores(lexical: Dict[str, float], semantic: Dict[str, float],
+                   semantic_weight: float = SEMANTIC_WEIGHT) -> Dict[str, float]:
+    """Blend min-max normalized lexical and semantic scores per file."""
+    lexical = _min_max(lexical)
+    semantic = _min_max(semantic)
+    return {
+        key: (1 - semantic_weight) * lexical.get(key, 0.0) + semantic_weight * semantic.get(key, 0.0)
+        for key in set(lexical) | set(semantic)
+    }
+
+def embedder_name(embed_fn: EmbedFn) -> str:
+    return getattr(embed_fn, "__name__", "custom")
+
+def _chunk_ids(units: List[Dict[str, str]]) -> List[str]:
+    # Same numbering as SearchIndex.add_chunks
+    counts: Dict[str, int] = {}
+    ids = []
+    for unit in units:
+        n = counts.get(unit['filename'], 0)
+        counts[unit['filename']] = n + 1
+        ids.append(f"{unit['filename']}#{n}")
+    return ids
+
+def _embed(units: List[Dict[str, str]], embed_fn: EmbedFn) -> np.ndarray:
+    if not units:
+        return np.zeros((0, HASH_DIM), dtype=np.float32)
+    # The path is part of the text so file names contribute to the vector
+    texts = [f"{os.path.basename(unit['filename'])}\n{unit['content']}" for unit in units]
+    return _normalize(np.asarray(embed_fn(texts), dtype=np.float32))
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def _min_max(scores: Dict[str, float]) -> Dict[str, float]:
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    if high == low:
+        return {key: 1.0 if high > 0 else 0.0 for key in scores}
+    return {key: (value - low) / (high - low) for key, value in scores.items()}
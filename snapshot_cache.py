@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Dict, Tuple, Optional, Any
+
+from chunk_store import ChunkStore, CodeChunk
+
+try:
+    import fcntl
+except ImportError:  # Windows: the index is only guarded within the process
+    fcntl = None
+
+CACHE_DIR = "./snapshot_cache"
+MAX_CACHE_BYTES = 512 * 1024 * 1024  # 512 MB
+
+INDEX_FILE = "index.json"
+INDEX_LOCK_FILE = "index.lock"
+
+# Shared by every SnapshotCache in the process so concurrent Streamlit
+# sessions never interleave read-modify-write cycles on the index file;
+# worker processes are kept apart by a flock on INDEX_LOCK_FILE as well
+_INDEX_LOCK = threading.Lock()
+
+
+def variant_key(allowed_exts: Tuple[str, ...], max_files: int, max_file_chars: int = 0) -> str:
+    """Key for one crawl configuration of a snapshot (extensions and size limits)."""
+    raw = ",".join(sorted(set(allowed_exts))) + f"|{max_files}|{max_file_chars}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class SnapshotCache:
+    """
+    Persistent cache of crawled repositories keyed by (owner, repo, sha).
+
+    Each snapshot lives in its own directory under cache_dir and holds one
+    compact chunk store per crawl variant (see chunk_store) plus any derived
+    artifacts (indexes, etc.).
+    An index file tracks branch refs with their ETags and the last access
+    time of every snapshot so the least recently used ones can be evicted
+    once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ---- refs -----------------------------------------------------------
+
+    def get_ref(self, owner: str, repo: str, branch: str) -> Optional[Dict[str, str]]:
+        """Return the last known {'sha', 'etag', 'branch'} for a branch, if any."""
+        with self._index_lock():
+            index = self._read_index()
+        return index["refs"].get(self._ref_key(owner, repo, branch))
+
+    def set_ref(self, owner: str, repo: str, branch: str, sha: str, etag: Optional[str],
+                resolved: Optional[str] = None):
+        """
+        Remember which commit a branch pointed to and the ETag it came with.
+
+        resolved is the branch actually looked up when the requested one
+        fell back to another (e.g. "main" to the default branch).
+        """
+        with self._index_lock():
+            index = self._read_index()
+            index["refs"][self._ref_key(owner, repo, branch)] = {"sha": sha, "etag": etag,
+                                                                 "branch": resolved or branch}
+            self._write_index(index)
+
+    def get_latest(self, owner: str, repo: str, branch: str, variant: str) -> Optional[str]:
+        """Return the SHA of the most recent snapshot stored for a branch and variant."""
+        with self._index_lock():
+            index = self._read_index()
+        return index["latest"].get(f"{self._ref_key(owner, repo, branch)}#{variant}")
+
+    def set_latest(self, owner: str, repo: str, branch: str, variant: str, sha: str):
+        """Record the snapshot a later incremental crawl of this branch can start from."""
+        with self._index_lock():
+            index = self._read_index()
+            index["latest"][f"{self._ref_key(owner, repo, branch)}#{variant}"] = sha
+            self._write_index(index)
+
+    # ---- snapshots ------------------------------------------------------
+
+    def snapshot_dir(self, owner: str, repo: str, sha: str) -> str:
+        return os.path.join(self.cache_dir, owner, repo, sha)
+
+    def load(self, owner: str, repo: str, sha: str, variant: str) -> Optional[List[CodeChunk]]:
+        """
+        Return the cached code chunks for a snapshot variant, or None on a miss.
+
+        The file contents stay memory-mapped; the chunks are views into them.
+        """
+        path = os.path.join(self.snapshot_dir(owner, repo, sha), f"files-{variant}.bin")
+        store = ChunkStore.load(path)
+        if store is not None:
+            self._touch(owner, repo, sha)
+            return store.chunks()
+        # Snapshots written before the compact format
+        data = self.load_artifact(owner, repo, sha, f"files-{variant}.json")
+        return ChunkStore.from_chunks(data["code_chunks"]).chunks() if data else None
+
+    def store(self, owner: str, repo: str, sha: str, variant: str, code_chunks: List[Any]):
+        """Persist the code chunks for a snapshot variant as a compact chunk store."""
+        ChunkStore.write(self.artifact_path(owner, repo, sha, f"files-{variant}.bin"), code_chunks)
+        self.track_artifacts(owner, repo, sha)
+
+    def load_artifact(self, owner: str, repo: str, sha: str, name: str) -> Optional[Any]:
+        """Load a JSON artifact stored next to a snapshot."""
+        path = os.path.join(self.snapshot_dir(owner, repo, sha), name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._touch(owner, repo, sha)
+        return data
+
+    def save_artifact(self, owner: str, repo: str, sha: str, name: str, data: Any):
+        """Atomically write a JSON artifact next to a snapshot and enforce the size bound."""
+        snap_dir = self.snapshot_dir(owner, repo, sha)
+        os.makedirs(snap_dir, exist_ok=True)
+        path = os.path.join(snap_dir, name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        self._touch(owner, repo, sha, size=_dir_size(snap_dir))
+        self.evict()
+
+    def artifact_path(self, owner: str, repo: str, sha: str, name: str) -> str:
+        """Path for a non-JSON artifact; call track_artifacts after writing it."""
+        snap_dir = self.snapshot_dir(owner, repo, sha)
+        os.makedirs(snap_dir, exist_ok=True)
+        return os.path.join(snap_dir, name)
+
+    def track_artifacts(self, owner: str, repo: str, sha: str):
+        """Account for files written via artifact_path and enforce the size bound."""
+        self._touch(owner, repo, sha, size=_dir_size(self.snapshot_dir(owner, repo, sha)))
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used snapshots until the cache fits in max_bytes."""
+        with self._index_lock():
+            index = self._read_index()
+            entries = index["snapshots"]
+            total = sum(entry["bytes"] for entry in entries.values())
+            for key in sorted(entries, key=lambda k: entries[k]["atime"]):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+                total -= entries[key]["bytes"]
+                del entries[key]
+            self._write_index(index)
+
+    # ---- internals ------------------------------------------------------
+
+    @staticmethod
+    def _ref_key(owner: str, repo: str, branch: str) -> str:
+        return f"{owner}/{repo}@{branch}"
+
+    def _touch(self, owner: str, repo: str, sha: str, size: Optional[int] = None):
+        with self._index_lock():
+            index = self._read_index()
+            entry = index["snapshots"].setdefault(f"{owner}/{repo}/{sha}", {"bytes": 0})
+            entry["atime"] = time.time()
+            if size is not None:
+                entry["bytes"] = size
+            self._write_index(index)
+
+    def _read_index(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.cache_dir, INDEX_FILE), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault("refs", {})
+        index.setdefault("snapshots", {})
+        index.setdefault("latest", {})
+        return index
+
+    @contextmanager
+    def _index_lock(self):
+        """Hold the index for a read-modify-write cycle, across threads and processes."""
+        with _INDEX_LOCK:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.cache_dir, INDEX_LOCK_FILE), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_index(self, index: Dict[str, Any]):
+        path = os.path.join(self.cache_dir, INDEX_FILE)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+
+
+class MemoCache:
+    """
+    Small in-process LRU map with a time-to-live.
+
+    Keeps recently used snapshots (and resolved refs) in memory so repeated
+    analyses in the same process skip reloading and re-parsing them. Entries
+    expire ttl seconds after they were stored. Thread-safe.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Any, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for fname in files:
+            try:
+                total += os.path.getsize(os.path.join(root, fname))
+            except OSError:
+                pass
+    return total
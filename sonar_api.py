@@ -1,12 +1,48 @@
 from openai import OpenAI
-import os
-from typing import List, Dict
+from openai.types.chat import ChatCompletion
+import heapq
+from typing import List, Dict, Optional, Any
 import streamlit as st
+import time
+import metrics
+from search_index import SearchIndex
+from semantic_index import SemanticIndex, combine_scores
+from code_chunker import iter_code_units
+from chunk_store import with_score
+from issue_parser import parse_issue, exact_hits, pin_scores
+from context_packer import pack_context, count_tokens, DEFAULT_CONTEXT_TOKENS
+from prompt_builder import repository_prefix
+from symbol_graph import SymbolGraph
+from analysis_cache import AnalysisCache, analysis_key
 API_KEY = st.secrets["PERPLEXITY_API_KEY"]
+SONAR_BASE_URL = "https://api.perplexity.ai"
+SONAR_MODEL = "sonar-pro"
+MAX_RESPONSE_TOKENS = 4000  # Allow for detailed responses
 
-client = OpenAI(api_key=API_KEY, base_url="https://api.perplexity.ai")
+# Instructions opening every analysis; the repository overview follows them
+SYSTEM_PROMPT = """You are an expert software engineer and debugging assistant. You have been given access to a GitHub repository's codebase along with a specific issue that needs to be resolved.
 
-def ask_sonar(issue_title: str, issue_body: str) -> str:
+Your task is to:
+1. Analyze the issue in the context of the provided codebase
+2. Identify the root cause of the problem
+3. Suggest specific code changes or solutions
+4. Provide step-by-step instructions for implementing the fix
+5. Consider potential side effects and edge cases
+
+Be specific and reference actual files and code sections when possible. If you need more information to provide a complete solution, mention what additional details would be helpful."""
+
+client = OpenAI(api_key=API_KEY, base_url=SONAR_BASE_URL)
+
+_analysis_cache = None
+
+def get_analysis_cache() -> AnalysisCache:
+    """Shared cache of Sonar answers, created on first use."""
+    global _analysis_cache
+    if _analysis_cache is None:
+        _analysis_cache = AnalysisCache()
+    return _analysis_cache
+
+def ask_sonar(issue_title: str, issue_body: str, issue_updated_at: Optional[str] = None) -> str:
     """Original function for simple issue analysis without repository context."""
     system_msg = {
         "role": "system",
@@ -17,30 +53,181 @@ def ask_sonar(issue_title: str, issue_body: str) -> str:
         "content": f"Issue Title: {issue_title}\n\nIssue Description: {issue_body}\n\nWhat might be causing this issue and how can it be resolved?",
     }
 
+    messages = [system_msg, user_msg]
+    key = analysis_key(SONAR_MODEL, messages, issue_updated_at)
+    cached = get_analysis_cache().get(key)
+    if cached:
+        return cached["content"]
+
+    response = client.chat.completions.create(
+        model=SONAR_MODEL,
+        messages=messages,
+    )
+    content = response.choices[0].message.content
+    get_analysis_cache().put(key, content, getattr(response, 'citations', None) or [])
+    return content
+
+def ask_sonar_with_context(issue_title: str, issue_body: str, code_chunks: List[Dict[str, str]],
+                           issue_updated_at: Optional[str] = None, commit_sha: Optional[str] = None,
+                           graph: Optional[SymbolGraph] = None,
+                           repository_chunks: Optional[List[Dict[str, str]]] = None) -> str:
+    """
+    Enhanced function that includes repository context for better issue analysis.
+    
+    Answers are cached by issue revision, commit SHA, model and prompt, so a
+    repeated analysis returns the stored response without calling Sonar.
+    Pass the snapshot's full file list as repository_chunks so the
+    repository overview is the same for every issue (see
+    build_context_messages).
+    """
+    
+    messages = build_context_messages(issue_title, issue_body, code_chunks, graph=graph,
+                                      repository_chunks=repository_chunks, commit_sha=commit_sha)
+
+    try:
+        response = request_sonar_completion(
+            messages, analysis_key(SONAR_MODEL, messages, issue_updated_at, commit_sha)
+        )
+        return response
+    except Exception as e:
+        return f"Error getting response from Sonar API: {str(e)}"
+
+@metrics.timed("sonar")
+def request_sonar_completion(messages: List[Dict[str, str]], cache_key: Optional[str] = None) -> ChatCompletion:
+    """Run a blocking Sonar completion through the analysis cache; API errors propagate."""
+    if cache_key:
+        cached = get_analysis_cache().get(cache_key)
+        if cached:
+            return cached_completion(cached)
+    
     response = client.chat.completions.create(
-        model="sonar-pro",
-        messages=[system_msg, user_msg],
+        model=SONAR_MODEL,
+        messages=messages,
+        max_tokens=MAX_RESPONSE_TOKENS,
     )
-    return response.choices[0].message.content
+    metrics.record(**usage_counters(response.usage, messages, response.choices[0].message.content))
+    if cache_key:
+        get_analysis_cache().put(cache_key, response.choices[0].message.content or "",
+                                 getattr(response, 'citations', None) or [],
+                                 response=response.model_dump())
+    return response
+
+def cached_completion(cached: Dict[str, Any]) -> ChatCompletion:
+    """
+    The ChatCompletion of an analysis cache entry.
+    
+    Streamed answers (see SonarStream) are stored without a response object,
+    so one is rebuilt from their content and citations.
+    """
+    if cached["response"]:
+        return ChatCompletion.model_validate(cached["response"])
+    return ChatCompletion.model_validate({
+        "id": "cached",
+        "object": "chat.completion",
+        "created": 0,
+        "model": SONAR_MODEL,
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": cached["content"]}}],
+        "citations": cached["citations"],
+    })
+
+def stream_sonar_with_context(issue_title: str, issue_body: str, code_chunks: List[Dict[str, str]],
+                              issue_updated_at: Optional[str] = None,
+                              commit_sha: Optional[str] = None,
+                              graph: Optional[SymbolGraph] = None,
+                              repository_chunks: Optional[List[Dict[str, str]]] = None) -> "SonarStream":
+    """Streaming variant of ask_sonar_with_context; iterate the result for content deltas."""
+    messages = build_context_messages(issue_title, issue_body, code_chunks, graph=graph,
+                                      repository_chunks=repository_chunks, commit_sha=commit_sha)
+    return SonarStream(messages, cache_key=analysis_key(SONAR_MODEL, messages, issue_updated_at, commit_sha))
+
+class SonarStream:
+    """
+    Iterable over the content deltas of a streamed Sonar answer.
+    
+    The request is sent when iteration starts. Once the stream is exhausted,
+    content holds the full answer and citations the sources Sonar returned.
+    With a cache_key, a cached answer is yielded in one piece instead and a
+    completed stream is stored for next time.
+    """
+    
+    def __init__(self, messages: List[Dict[str, str]], cache_key: Optional[str] = None):
+        self.messages = messages
+        self.cache_key = cache_key
+        self.from_cache = False
+        self.content = ""
+        self.citations = []
+    
+    def __iter__(self):
+        if self.cache_key:
+            cached = get_analysis_cache().get(self.cache_key)
+            if cached:
+                self.from_cache = True
+                self.content = cached["content"]
+                self.citations = cached["citations"]
+                yield self.content
+                return
+        
+        # Timed by hand: a stage() would stay open across the yields below
+        started = time.perf_counter()
+        usage = None
+        stream = client.chat.completions.create(
+            model=SONAR_MODEL,
+            messages=self.messages,
+            max_tokens=MAX_RESPONSE_TOKENS,
+            stream=True,
+        )
+        parts = []
+        for chunk in stream:
+            # Perplexity attaches the citations and usage to the streamed chunks
+            self.citations = getattr(chunk, 'citations', None) or self.citations
+            usage = getattr(chunk, 'usage', None) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+        self.content = "".join(parts)
+        metrics.observe("sonar", time.perf_counter() - started,
+                        **usage_counters(usage, self.messages, self.content))
+        if self.cache_key and self.content:
+            get_analysis_cache().put(self.cache_key, self.content, self.citations)
+
+def usage_counters(usage, messages: List[Dict[str, str]], content: Optional[str]) -> Dict[str, int]:
+    """Token counters for a completion, estimated locally when the API reports no usage."""
+    if usage is not None:
+        return {"prompt_tokens": usage.prompt_tokens or 0, "completion_tokens": usage.completion_tokens or 0}
+    return {
+        "prompt_tokens": sum(count_tokens(m["content"]) for m in messages),
+        "completion_tokens": count_tokens(content or ""),
+    }
 
-def ask_sonar_with_context(issue_title: str, issue_body: str, code_chunks: List[Dict[str, str]]) -> str:
-    """Enhanced function that includes repository context for better issue analysis."""
+def build_context_messages(issue_title: str, issue_body: str, code_chunks: List[Dict[str, str]],
+                           graph: Optional[SymbolGraph] = None,
+                           repository_chunks: Optional[List[Dict[str, str]]] = None,
+                           commit_sha: Optional[str] = None) -> List[Dict[str, str]]:
+    """
+    Build the system and user messages for an issue analysis with repository context.
+    
+    The system message holds the instructions and the repository overview
+    of repository_chunks (default: code_chunks), which depends only on the
+    snapshot: it is memoized per commit_sha and byte-identical across
+    issues, so provider-side prompt caching applies to it. The user message
+    holds the issue and its ranked code snippets.
+    """
+    
+    with metrics.stage("prompt"):
+        prefix = repository_prefix(repository_chunks if repository_chunks is not None else code_chunks,
+                                   commit_sha)
+        metrics.record(prefix_tokens=count_tokens(prefix))
     
     # Construct context from code chunks
-    context_text = construct_code_context(code_chunks)
+    context_text = construct_code_context(code_chunks, query=f"{issue_title}\n{issue_body or ''}", graph=graph)
     
     system_msg = {
         "role": "system",
-        "content": """You are an expert software engineer and debugging assistant. You have been given access to a GitHub repository's codebase along with a specific issue that needs to be resolved.
-
-Your task is to:
-1. Analyze the issue in the context of the provided codebase
-2. Identify the root cause of the problem
-3. Suggest specific code changes or solutions
-4. Provide step-by-step instructions for implementing the fix
-5. Consider potential side effects and edge cases
-
-Be specific and reference actual files and code sections when possible. If you need more information to provide a complete solution, mention what additional details would be helpful."""
+        "content": SYSTEM_PROMPT + (f"\n\n**Repository Overview:**\n{prefix}" if prefix else ""),
     }
     
     user_msg = {
@@ -62,93 +249,71 @@ Please analyze this issue in the context of the codebase and provide:
 4. Potential risks or considerations
 """
     }
+    
+    return [system_msg, user_msg]
 
-    try:
-        response = client.chat.completions.create(
-            model="sonar-pro",
-            messages=[system_msg, user_msg],
-            max_tokens=4000,  # Allow for detailed responses
-        )
-        print(response)
-        return response
-    except Exception as e:
-        return f"Error getting response from Sonar API: {str(e)}"
-
-def construct_code_context(code_chunks: List[Dict[str, str]], max_context_length: int = 15000) -> str:
-    """Construct a context string from code chunks, prioritizing important files."""
+def construct_code_context(code_chunks: List[Dict[str, str]], query: str = "",
+                           max_context_tokens: int = DEFAULT_CONTEXT_TOKENS,
+                           graph: Optional[SymbolGraph] = None) -> str:
+    """
+    Construct a context string from code chunks within a token budget.
+    
+    Files are split into definition-level snippets and the snippets that
+    best match the query are packed into max_context_tokens model tokens.
+    With the snapshot's symbol graph, the callers and callees of the best
+    snippets are candidates as well.
+    """
     
     if not code_chunks:
         return "No code files were found in the repository."
     
-    context_parts = []
-    current_length = 0
-    
-    # Add repository summary
-    file_count = len(code_chunks)
-    file_types = {}
-    for chunk in code_chunks:
-        ext = os.path.splitext(chunk['filename'])[1]
-        file_types[ext] = file_types.get(ext, 0) + 1
-    
-    summary = f"Repository contains {file_count} files of types: {', '.join(file_types.keys())}\n\n"
-    context_parts.append(summary)
-    current_length += len(summary)
-    
-    # Add code files with smart truncation
-    for i, chunk in enumerate(code_chunks):
-        if current_length > max_context_length:
-            context_parts.append(f"\n... [Additional {len(code_chunks) - i} files omitted due to length constraints]")
-            break
-        
-        file_header = f"=== FILE: {chunk['filename']} ===\n"
-        file_content = chunk['content']
-        
-        # Estimate space needed
-        estimated_length = len(file_header) + len(file_content) + 100  # buffer
-        
-        if current_length + estimated_length > max_context_length:
-            # Truncate this file's content
-            available_space = max_context_length - current_length - len(file_header) - 100
-            if available_space > 200:  # Only include if we have reasonable space
-                truncated_content = file_content[:available_space] + "\n... [File truncated]"
-                context_parts.append(file_header + truncated_content + "\n\n")
-            break
-        else:
-            context_parts.append(file_header + file_content + "\n\n")
-            current_length += estimated_length
-    
-    return "".join(context_parts)
-
-def analyze_issue_relevance(issue_title: str, issue_body: str, code_chunks: List[Dict[str, str]]) -> List[Dict[str, str]]:
-    """Score and sort code chunks by relevance to the issue (simple keyword matching)."""
-    issue_text = (issue_title + " " + (issue_body or "")).lower()
-    
-    # Extract keywords from issue
-    keywords = set()
-    common_words = {'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'can', 'cannot', 'not', 'no', 'yes', 'this', 'that', 'these', 'those', 'a', 'an'}
-    
-    for word in issue_text.split():
-        clean_word = ''.join(c for c in word if c.isalnum()).lower()
-        if len(clean_word) > 2 and clean_word not in common_words:
-            keywords.add(clean_word)
-    
-    # Score each code chunk
-    scored_chunks = []
-    for chunk in code_chunks:
-        score = 0
-        content_lower = chunk['content'].lower()
-        filename_lower = chunk['filename'].lower()
-        
-        for keyword in keywords:
-            # Higher weight for filename matches
-            score += filename_lower.count(keyword) * 3
-            # Regular weight for content matches
-            score += content_lower.count(keyword)
-        
-        scored_chunks.append({
-            **chunk,
-            'relevance_score': score
-        })
+    with metrics.stage("pack"):
+        context = pack_context(code_chunks, query=query, max_tokens=max_context_tokens, graph=graph)
+        metrics.record(prompt_tokens=count_tokens(context))
+    return context
+
+@metrics.timed("rank")
+def analyze_issue_relevance(issue_title: str, issue_body: str, code_chunks: List[Dict[str, str]],
+                            index: Optional[SearchIndex] = None,
+                            semantic_index: Optional[SemanticIndex] = None,
+                            top_k: Optional[int] = None) -> List[Dict[str, str]]:
+    """
+    Score and sort code chunks by relevance to the issue.
+    
+    Stack frames, file paths, error classes and identifiers in the issue
+    are first resolved exactly against the indexed files and symbol
+    definitions (see issue_parser); those files are pinned above every
+    fuzzy match, ordered by how strongly the issue points at them. When
+    they already fill top_k, nothing else is ranked.
+    
+    The remaining files are ranked with BM25 over the chunk search index
+    (plus a boost for query terms in the file path). Pass the index
+    persisted with the repository snapshot to avoid re-tokenizing the code
+    for every issue. With a semantic index, its cosine similarities are
+    blended in so issues that describe symptoms rather than identifiers
+    still find their code. With top_k, only the best top_k files are
+    returned; ranking uses the index alone, so the other files' contents
+    are never read.
+    """
+    issue_text = issue_title + " " + (issue_body or "")
+    if index is None:
+        index = SearchIndex.build(iter_code_units(code_chunks))
+    
+    pinned = exact_hits(parse_issue(issue_text), index.file_lengths, index.definitions)
+    metrics.record(pinned_files=len(pinned))
+    
+    file_scores = {}
+    if not (top_k and len(pinned) >= top_k):
+        file_scores = dict(index.rank_files(issue_text))
+        if semantic_index is not None:
+            file_scores = combine_scores(file_scores, semantic_index.rank_files(issue_text))
+    
+    pin_scores(file_scores, pinned)
+    
+    # Scored views share the crawled contents instead of copying every chunk
+    scored_chunks = [with_score(chunk, file_scores.get(chunk['filename'], 0.0)) for chunk in code_chunks]
     
     # Sort by relevance score (descending) and return
+    if top_k:
+        return heapq.nlargest(top_k, scored_chunks, key=lambda x: x['relevance_score'])
     return sorted(scored_chunks, key=lambda x: x['relevance_score'], reverse=True)
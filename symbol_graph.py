@@ -0,0 +1,246 @@
+import ast
+import hashlib
+import json
+import os
+import re
+import textwrap
+import threading
+from array import array
+from typing import List, Dict, Tuple, Optional, Any, Iterable
+
+from code_chunker import iter_code_units
+
+# A name defined in more places than this is too ambiguous to link (get, run, __init__ ...)
+MAX_FANOUT = 4
+
+# Imports and call sites in languages other than Python, best effort
+_JS_IMPORT_RE = re.compile(r"import\s+(?:type\s+)?(?:([\w$]+)\s*,?\s*)?(?:\{([^}]*)\})?\s*from\s*['\"]([^'\"]+)['\"]")
+_REQUIRE_RE = re.compile(r"(?:const|let|var)\s+(?:\{([^}]*)\}|([\w$]+))\s*=\s*require\(\s*['\"]([^'\"]+)['\"]")
+_JVM_IMPORT_RE = re.compile(r"^\s*import\s+(?:static\s+)?([\w.]+)\s*;?\s*$", re.MULTILINE)
+_CALL_RE = re.compile(r"(?<![\w$.])(?:new\s+)?([A-Za-z_$][\w$]*)\s*\(|\.([A-Za-z_$][\w$]*)\s*\(")
+
+_NOT_CALLS = {
+    'if', 'for', 'while', 'switch', 'catch', 'return', 'function', 'func', 'fn', 'def', 'class',
+    'sizeof', 'typeof', 'await', 'async', 'yield', 'super', 'this', 'self', 'print', 'len', 'require',
+    'import', 'elif', 'with', 'assert', 'not', 'and', 'or', 'in', 'is', 'lambda', 'match', 'case',
+}
+
+
+class SymbolGraph:
+    """
+    Cross-reference graph between the code units of a snapshot.
+
+    Nodes are the function/class-level chunks of code_chunker, identified by
+    the same ids as SearchIndex ("path#0", "path#1", ...). An edge a -> b
+    means unit a calls or imports a name that unit b defines. Python is read
+    with ast; other languages use regular expressions for imports and call
+    sites. Edges are kept as compressed adjacency arrays in both directions
+    (callees and callers), which is what gets persisted next to a snapshot.
+
+    files maps filenames to the snapshot's chunks, so the packer can read a
+    neighbor's source even when its file was not among the ranked files.
+    """
+
+    def __init__(self, ids: List[str], out_offsets: array, out_targets: array,
+                 in_offsets: array, in_targets: array, code_chunks: Iterable[Any] = ()):
+        self.ids = ids
+        self.out_offsets = out_offsets
+        self.out_targets = out_targets
+        self.in_offsets = in_offsets
+        self.in_targets = in_targets
+        self.positions = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        self.files = {chunk['filename']: chunk for chunk in code_chunks}
+
+    @classmethod
+    def build(cls, code_chunks: List[Any]) -> "SymbolGraph":
+        """Extract definitions and references from every unit, then link references to definitions."""
+        ids: List[str] = []
+        filenames: List[str] = []
+        references: List[List[Tuple[str, Optional[str]]]] = []
+        definitions: Dict[str, List[int]] = {}
+        counts: Dict[str, int] = {}
+
+        # Only names are kept per unit, so contents are read one file at a time
+        for unit in iter_code_units(code_chunks):
+            filename = unit['filename']
+            n = counts.get(filename, 0)
+            counts[filename] = n + 1
+            node = len(ids)
+            ids.append(f"{filename}#{n}")
+            filenames.append(filename)
+            if unit['name'] and unit['kind'] != "module":
+                for symbol in {unit['name'], unit['name'].rsplit('.', 1)[-1]}:
+                    definitions.setdefault(symbol, []).append(node)
+            references.append(extract_references(filename, unit['content']))
+
+        edges = []
+        for node, refs in enumerate(references):
+            targets = set()
+            for name, module in refs:
+                targets.update(_resolve(name, module, filenames[node], definitions, filenames))
+            targets.discard(node)
+            edges.append(sorted(targets))
+
+        out_offsets, out_targets = _compress(edges)
+        callers: List[List[int]] = [[] for _ in ids]
+        for node, targets in enumerate(edges):
+            for target in targets:
+                callers[target].append(node)
+        in_offsets, in_targets = _compress(callers)
+        return cls(ids, out_offsets, out_targets, in_offsets, in_targets, code_chunks)
+
+    def callees(self, chunk_id: str) -> List[str]:
+        """Units that chunk_id calls or imports."""
+        return self._adjacent(chunk_id, self.out_offsets, self.out_targets)
+
+    def callers(self, chunk_id: str) -> List[str]:
+        """Units that call or import chunk_id."""
+        return self._adjacent(chunk_id, self.in_offsets, self.in_targets)
+
+    def neighbors(self, chunk_id: str) -> List[str]:
+        """One-hop neighborhood: callees first, then callers."""
+        callees = self.callees(chunk_id)
+        return callees + [c for c in self.callers(chunk_id) if c not in callees]
+
+    def _adjacent(self, chunk_id: str, offsets: array, targets: array) -> List[str]:
+        node = self.positions.get(chunk_id)
+        if node is None:
+            return []
+        return [self.ids[t] for t in targets[offsets[node]:offsets[node + 1]]]
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.out_targets)
+
+    def save(self, path: str):
+        """
+        Write the adjacency arrays to path and the node ids to path + ".json".
+
+        The JSON records a digest of the arrays, so load() can tell when a
+        crash between the two replaces left files from different builds.
+        """
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        digest = hashlib.blake2b(digest_size=16)
+        with open(tmp_path, "wb") as f:
+            for column in (self.out_offsets, self.out_targets, self.in_offsets, self.in_targets):
+                column.tofile(f)
+                digest.update(column.tobytes())
+        with open(f"{tmp_path}.json", "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "edges": len(self.out_targets), "typecode": self.out_targets.typecode,
+                       "digest": digest.hexdigest()}, f)
+        os.replace(tmp_path, path)
+        os.replace(f"{tmp_path}.json", f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str, code_chunks: Iterable[Any] = ()) -> Optional["SymbolGraph"]:
+        """Load a graph written by save(), or None if missing or its two files do not belong together."""
+        try:
+            with open(f"{path}.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            nodes, edges = len(meta["ids"]), meta["edges"]
+            columns = []
+            digest = hashlib.blake2b(digest_size=16)
+            with open(path, "rb") as f:
+                for length in (nodes + 1, edges, nodes + 1, edges):
+                    column = array(meta["typecode"])
+                    column.fromfile(f, length)
+                    digest.update(column.tobytes())
+                    columns.append(column)
+                if f.read(1):
+                    return None
+        except (OSError, ValueError, EOFError, KeyError, TypeError):
+            return None
+        if meta.get("digest") != digest.hexdigest():
+            return None
+        out_offsets, out_targets, in_offsets, in_targets = columns
+        # Guards lookups against arrays that slipped past the digest check
+        for offsets, targets in ((out_offsets, out_targets), (in_offsets, in_targets)):
+            if offsets[-1] != len(targets) or (targets and max(targets) >= nodes):
+                return None
+        return cls(meta["ids"], *columns, code_chunks=code_chunks)
+
+
+def extract_references(filename: str, content: str) -> List[Tuple[str, Optional[str]]]:
+    """(name, module or None) for every name a unit calls or imports."""
+    if filename.endswith('.py'):
+        refs = _python_references(content)
+        if refs is not None:
+            return refs
+
+    refs = []
+    for match in _JS_IMPORT_RE.finditer(content):
+        names = [match.group(1)] + (match.group(2) or '').split(',')
+        refs.extend((_import_name(name), match.group(3)) for name in names if name and name.strip())
+    for match in _REQUIRE_RE.finditer(content):
+        names = (match.group(1) or match.group(2) or '').split(',')
+        refs.extend((_import_name(name), match.group(3)) for name in names if name.strip())
+    for match in _JVM_IMPORT_RE.finditer(content):
+        module, _, name = match.group(1).rpartition('.')
+        refs.append((name, module or None))
+    for match in _CALL_RE.finditer(content):
+        name = match.group(1) or match.group(2)
+        if name not in _NOT_CALLS:
+            refs.append((name, None))
+    return list(dict.fromkeys(refs))
+
+
+def _python_references(content: str) -> Optional[List[Tuple[str, Optional[str]]]]:
+    try:
+        tree = ast.parse(textwrap.dedent(content))
+    except (SyntaxError, ValueError):
+        return None
+
+    refs = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            func = node.func
+            if isinstance(func, ast.Name):
+                refs.append((func.id, None))
+            elif isinstance(func, ast.Attribute):
+                refs.append((func.attr, None))
+        elif isinstance(node, ast.ImportFrom):
+            module = ('.' * node.level) + (node.module or '')
+            refs.extend((alias.name, module) for alias in node.names if alias.name != '*')
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                module, _, name = alias.name.rpartition('.')
+                refs.append((name, module or None))
+        elif isinstance(node, ast.ClassDef):
+            refs.extend((base.id, None) for base in node.bases if isinstance(base, ast.Name))
+    return [ref for ref in dict.fromkeys(refs) if ref[0] not in _NOT_CALLS]
+
+
+def _import_name(name: str) -> str:
+    # "foo as bar" imports foo
+    return name.strip().split(' as ')[0].strip()
+
+
+def _resolve(name: str, module: Optional[str], filename: str,
+             definitions: Dict[str, List[int]], filenames: List[str]) -> List[int]:
+    candidates = definitions.get(name)
+    if not candidates:
+        return []
+    # Definitions in the same file win for calls
+    local = [c for c in candidates if filenames[c] == filename]
+    if local and module is None:
+        return local
+    if module:
+        # "app.store" / "./store" / "../lib/store" point at .../app/store.* or .../store.*
+        parts = [p for p in re.split(r"[./\\]+", module) if p]
+        if parts:
+            suffix = '/'.join(parts)
+            matching = [c for c in candidates
+                        if os.path.splitext(filenames[c])[0].endswith(suffix)
+                        or os.path.dirname(filenames[c]).endswith(suffix)]
+            if matching:
+                return matching
+    return candidates if len(candidates) <= MAX_FANOUT else []
+
+
+def _compress(adjacency: List[List[int]]) -> Tuple[array, array]:
+    offsets = array("I", [0])
+    targets = array("I")
+    for row in adjacency:
+        targets.extend(row)
+        offsets.append(len(targets))
+    return offsets, targets
@@ -0,0 +1,78 @@
+import http.server
+import os
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubServer:
+    """
+    Local HTTP server standing in for GitHub in tests.
+
+    Replies are registered per method and path (query strings are ignored)
+    and served in order, the last one repeating. Every request is recorded
+    as (method, full path, headers).
+    """
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], List[Tuple[int, Dict[str, str], bytes]]] = {}
+        self.requests: List[Tuple[str, str, Dict[str, str]]] = []
+        self.bytes_sent = 0
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                stub.requests.append((self.command, self.path, dict(self.headers)))
+                replies = stub.routes.get((self.command, urlsplit(self.path).path))
+                status, headers, body = replies.pop(0) if replies and len(replies) > 1 else \
+                    (replies[0] if replies else (404, {}, b""))
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    for start in range(0, len(body), 1 << 14):
+                        self.wfile.write(body[start:start + (1 << 14)])
+                        stub.bytes_sent += min(1 << 14, len(body) - start)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            do_GET = _reply
+            do_POST = _reply
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def add(self, path: str, body: bytes = b"", status: int = 200,
+            headers: Optional[Dict[str, str]] = None, method: str = "GET"):
+        self.routes.setdefault((method, path), []).append((status, headers or {}, body))
+
+    def paths(self) -> List[str]:
+        return [path for _, path, _ in self.requests]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    yield server
+    server.close()
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+import sonar_api
+from analysis_cache import AnalysisCache, analysis_key
+
+MESSAGES = [{"role": "system", "content": "You are a debugger."}, {"role": "user", "content": "Why does it crash?"}]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnalysisCache(str(tmp_path / "analyses.sqlite3"))
+
+
+def test_analysis_key_changes_with_issue_commit_model_and_prompt():
+    key = analysis_key("sonar-pro", MESSAGES, "2026-01-01T00:00:00Z", "a" * 40)
+
+    assert key == analysis_key("sonar-pro", [dict(m) for m in MESSAGES], "2026-01-01T00:00:00Z", "a" * 40)
+    assert key != analysis_key("sonar-pro", MESSAGES, "2026-01-02T00:00:00Z", "a" * 40)
+    assert key != analysis_key("sonar-pro", MESSAGES, "2026-01-01T00:00:00Z", "b" * 40)
+    assert key != analysis_key("sonar", MESSAGES, "2026-01-01T00:00:00Z", "a" * 40)
+    assert key != analysis_key("sonar-pro", MESSAGES[:1], "2026-01-01T00:00:00Z", "a" * 40)
+
+
+def test_hit_and_miss(cache):
+    cache.put("k", "answer", ["https://example.com"], response={"id": "r1"})
+
+    assert cache.get("k") == {"content": "answer", "citations": ["https://example.com"], "response": {"id": "r1"}}
+    assert cache.get("other") is None
+
+
+def test_entry_expires_after_ttl(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "analyses.sqlite3"), ttl=0.1)
+    cache.put("k", "answer", [])
+    assert cache.get("k") is not None
+
+    time.sleep(0.2)
+
+    assert cache.get("k") is None
+    # Expired entries are deleted, not just hidden
+    assert cache._connect().execute("SELECT COUNT(*) FROM analyses").fetchone()[0] == 0
+
+
+def test_least_recently_read_entries_are_evicted_first(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "analyses.sqlite3"), max_bytes=250)
+    cache.put("a", "x" * 100, [])
+    time.sleep(0.01)
+    cache.put("b", "y" * 100, [])
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.put("c", "z" * 100, [])
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+class NoApi:
+    """Stands in for the OpenAI client; any call is a cache miss that should not happen."""
+
+    def __getattr__(self, name):
+        raise AssertionError("Sonar was called despite a cached answer")
+
+
+def test_blocking_call_reuses_streamed_answer(cache, monkeypatch):
+    monkeypatch.setattr(sonar_api, "_analysis_cache", cache)
+    monkeypatch.setattr(sonar_api, "client", NoApi())
+    # SonarStream stores content and citations without a response object
+    cache.put("k", "streamed answer", ["https://example.com/a"])
+
+    response = sonar_api.request_sonar_completion(MESSAGES, "k")
+
+    assert response.choices[0].message.content == "streamed answer"
+    assert response.citations == ["https://example.com/a"]
+    assert cache.get("k")["content"] == "streamed answer"
+
+
+def test_stream_yields_cached_answer_in_one_piece(cache, monkeypatch):
+    monkeypatch.setattr(sonar_api, "_analysis_cache", cache)
+    monkeypatch.setattr(sonar_api, "client", NoApi())
+    cache.put("k", "cached answer", ["https://example.com/b"])
+
+    stream = sonar_api.SonarStream(MESSAGES, cache_key="k")
+
+    assert list(stream) == ["cached answer"]
+    assert stream.from_cache
+    assert stream.citations == ["https://example.com/b"]
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from chunk_store import ChunkStore, with_score
+
+CHUNKS = [
+    {"filename": "r-main/app.py", "content": "def main():\n    print('héllo')\n"},
+    {"filename": "r-main/empty.py", "content": ""},
+    {"filename": "r-main/lib/ünï.js", "content": "export const x = 1;", "size": 99, "lines": 7},
+]
+
+
+def test_append_and_read_back():
+    store = ChunkStore.from_chunks(CHUNKS)
+
+    assert [c.to_dict() for c in store] == [
+        {"filename": "r-main/app.py", "content": CHUNKS[0]["content"], "size": 31, "lines": 3},
+        {"filename": "r-main/empty.py", "content": "", "size": 0, "lines": 1},
+        {"filename": "r-main/lib/ünï.js", "content": "export const x = 1;", "size": 99, "lines": 7},
+    ]
+
+
+def test_write_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "store.bin")
+    ChunkStore.write(path, ChunkStore.from_chunks(CHUNKS))
+
+    loaded = ChunkStore.load(path)
+
+    assert [c.to_dict() for c in loaded] == [c.to_dict() for c in ChunkStore.from_chunks(CHUNKS)]
+    with pytest.raises(ValueError):
+        loaded.append("r-main/new.py", "x = 1")
+
+
+def test_empty_store_round_trip(tmp_path):
+    path = str(tmp_path / "store.bin")
+    ChunkStore.write(path, [])
+
+    assert len(ChunkStore.load(path)) == 0
+
+
+def test_load_rejects_mismatched_files(tmp_path):
+    path = str(tmp_path / "store.bin")
+    ChunkStore.write(path, CHUNKS)
+    # Contents from a different write than the columns
+    with open(path, "wb") as f:
+        f.write(b"def other():\n    pass\n")
+
+    assert ChunkStore.load(path) is None
+
+
+def test_load_missing_store(tmp_path):
+    assert ChunkStore.load(str(tmp_path / "missing.bin")) is None
+
+
+def test_views_behave_like_chunk_dicts():
+    chunk = next(iter(ChunkStore.from_chunks(CHUNKS)))
+    scored = with_score(chunk, 2.5)
+
+    assert scored["relevance_score"] == 2.5
+    assert "relevance_score" not in chunk
+    assert scored["content"] == chunk["content"]
+    assert chunk.get("missing", "default") == "default"
+    assert json.loads(json.dumps(scored.to_dict()))["filename"] == "r-main/app.py"
@@ -0,0 +1,95 @@
+import pytest
+
+from code_chunker import chunk_file
+
+
+def definitions(filename, content):
+    return [(unit["name"], unit["kind"]) for unit in chunk_file(filename, content) if unit["kind"] != "module"]
+
+
+def test_python_functions_and_classes():
+    content = "import os\n\n@cache\ndef load(path):\n    return path\n\nclass Store(Base):\n    def get(self):\n        pass\n"
+
+    assert definitions("app/store.py", content) == [("load", "function"), ("Store", "class")]
+
+
+@pytest.mark.parametrize("header, name", [
+    ("public class Invoice {", "Invoice"),
+    ("public final class Invoice {", "Invoice"),
+    ("abstract class Invoice {", "Invoice"),
+    ("public interface Invoice {", "Invoice"),
+    ("public enum Invoice {", "Invoice"),
+    ("public record Invoice(int total) {", "Invoice"),
+    ("class Invoice {", "Invoice"),
+])
+def test_java_type_declarations(header, name):
+    content = f"package billing;\n\nimport java.util.List;\n\n{header}\n    int total() {{\n        return 0;\n    }}\n}}\n"
+
+    assert definitions("src/Invoice.java", content) == [(name, "block")]
+
+
+def test_java_file_with_two_top_level_types():
+    content = "public class A {\n}\n\nfinal class B extends A {\n    void run() {}\n}\n"
+
+    assert [name for name, _ in definitions("A.java", content)] == ["A", "B"]
+
+
+def test_csharp_and_kotlin_modifiers():
+    assert definitions("Svc.cs", "public sealed class Svc\n{\n}\n") == [("Svc", "block")]
+    assert definitions("Svc.kt", "internal class Svc {\n}\n") == [("Svc", "block")]
+
+
+def test_javascript_and_typescript():
+    content = (
+        "import x from './x';\n\n"
+        "export default class App {\n  render() {}\n}\n\n"
+        "export function helper(a) {\n  return a;\n}\n\n"
+        "const handler = async (req, res) => {\n  res.send(1);\n};\n\n"
+        "let double = n => {\n  return n * 2;\n};\n\n"
+        "export interface Props {\n  id: number;\n}\n\n"
+        "async function main() {\n}\n"
+    )
+
+    assert [name for name, _ in definitions("src/app.ts", content)] == [
+        "App", "helper", "handler", "double", "Props", "main",
+    ]
+
+
+def test_plain_constants_are_not_definitions():
+    assert definitions("src/config.js", "const limit = 10;\nlet name = compute(limit);\n") == []
+
+
+def test_go_types_and_functions():
+    content = (
+        "package server\n\n"
+        "type Server struct {\n\taddr string\n}\n\n"
+        "type Handler interface {\n\tServe()\n}\n\n"
+        "func (s *Server) Start() error {\n\treturn nil\n}\n\n"
+        "func New(addr string) *Server {\n\treturn &Server{addr: addr}\n}\n"
+    )
+
+    assert [name for name, _ in definitions("server.go", content)] == ["Server", "Handler", "Start", "New"]
+
+
+def test_rust_and_c():
+    content = "pub struct A {}\n\npub(crate) fn run() {\n}\n\nimpl A {\n}\n\npub trait Shape {\n}\n"
+    assert [n for n, _ in definitions("lib.rs", content)] == ["A", "run", "A", "Shape"]
+    assert [n for n, _ in definitions("main.c", "static int add(int a, int b) {\n  return a + b;\n}\n")] == ["add"]
+
+
+def test_every_line_is_covered_once():
+    content = "package x;\n\npublic class A {\n  void f() {}\n}\n// trailing\n"
+    units = chunk_file("A.java", content)
+
+    covered = [line for unit in units for line in range(unit["start_line"], unit["end_line"] + 1)]
+    assert covered == sorted(set(covered))
+    assert covered[0] == 1 and covered[-1] == len(content.split("\n"))
+
+
+def test_java_definitions_reach_the_search_index():
+    from search_index import SearchIndex
+    content = "package billing;\n\npublic class Invoice {\n    public int total() {\n        return 0;\n    }\n}\n"
+
+    index = SearchIndex.build(chunk_file("r-main/src/Invoice.java", content))
+
+    assert index.definitions["Invoice"] == ["r-main/src/Invoice.java"]
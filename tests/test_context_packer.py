@@ -0,0 +1,50 @@
+from itertools import combinations
+
+from context_packer import pack_snippets, pack_context, TOKEN_GRANULARITY
+
+
+def snippet(name, tokens, score):
+    return {"name": name, "tokens": tokens, "score": score}
+
+
+def test_knapsack_prefers_best_total_score_over_greedy():
+    # Greedy by score would take "big" alone (10); two small ones score 12
+    snippets = [snippet("big", 96, 10.0), snippet("a", 48, 6.0), snippet("b", 48, 6.0)]
+
+    chosen = pack_snippets(snippets, 96)
+
+    assert sorted(s["name"] for s in chosen) == ["a", "b"]
+
+
+def test_knapsack_matches_brute_force():
+    snippets = [snippet(str(i), tokens, score) for i, (tokens, score) in
+                enumerate([(40, 3.0), (70, 5.0), (20, 1.5), (90, 6.5), (35, 2.0), (60, 4.5)])]
+    budget = 160
+
+    chosen = pack_snippets(snippets, budget)
+
+    def weight(items):
+        return sum(-(-s["tokens"] // TOKEN_GRANULARITY) * TOKEN_GRANULARITY for s in items)
+
+    best = max(sum(s["score"] for s in combo)
+               for n in range(len(snippets) + 1) for combo in combinations(snippets, n)
+               if weight(combo) <= budget)
+    assert weight(chosen) <= budget
+    assert sum(s["score"] for s in chosen) == best
+
+
+def test_knapsack_with_no_budget_or_snippets():
+    assert pack_snippets([snippet("a", 10, 1.0)], 0) == []
+    assert pack_snippets([], 1000) == []
+
+
+def test_pack_context_keeps_the_snippet_an_issue_points_at():
+    filler = "\n".join(f"    value_{n} = compute_{n}()" for n in range(60))
+    code = "\n\n".join(f"def handler_{i}():\n{filler}\n    return 0" for i in range(6))
+    chunks = [{"filename": "r-main/app.py", "content": code}]
+    line = code.split("\n").index("def handler_4():") + 2
+
+    context = pack_context(chunks, query=f'File "app.py", line {line}, in handler_4', max_tokens=900)
+
+    assert "function handler_4" in context
+    assert context.count("=== FILE:") == 1
@@ -0,0 +1,149 @@
+import io
+import json
+import os
+import tarfile
+
+import pytest
+
+import fetch_engine
+import metrics
+import repo_crawler
+
+
+def make_tarball(files, root="o-r-abc123"):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for path, content in files.items():
+            data = content if isinstance(content, bytes) else content.encode("utf-8")
+            info = tarfile.TarInfo(f"{root}/{path}")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def github(stub_server, monkeypatch):
+    for name in ("GITHUB_REST_URL", "CODELOAD_URL", "GITHUB_RAW_URL"):
+        monkeypatch.setattr(fetch_engine, name, stub_server.url)
+    monkeypatch.setattr(fetch_engine, "GITHUB_GRAPHQL_URL", f"{stub_server.url}/graphql")
+    return stub_server
+
+
+def repository_reply(ref=None, default="trunk", disk_usage=10):
+    target = lambda name, oid: {"name": name, "target": {"oid": oid}}
+    return json.dumps({"data": {"repository": {
+        "diskUsage": disk_usage,
+        "defaultBranchRef": target(default, "a" * 40),
+        "ref": target(ref, "b" * 40) if ref else None,
+    }}}).encode()
+
+
+def test_resolve_repository_falls_back_to_the_default_branch(github):
+    github.add("/graphql", repository_reply(), method="POST")
+
+    meta = fetch_engine.resolve_repository("o", "r", "main", token="t")
+
+    assert meta == {"default_branch": "trunk", "branch": "trunk", "sha": "a" * 40, "size_kb": 10}
+    assert len(github.requests) == 1
+
+
+def test_resolve_repository_keeps_an_explicit_missing_branch(github):
+    github.add("/graphql", repository_reply(), method="POST")
+
+    meta = fetch_engine.resolve_repository("o", "r", "feature", token="t")
+
+    assert meta["branch"] is None
+    assert meta["sha"] is None
+
+
+def test_resolve_repository_without_token_uses_rest(github):
+    github.add("/repos/o/r", json.dumps({"default_branch": "develop", "size": 42}).encode())
+
+    meta = fetch_engine.resolve_repository("o", "r")
+
+    assert meta == {"default_branch": "develop", "branch": "develop", "sha": None, "size_kb": 42}
+
+
+def test_iter_tarball_strips_the_root_directory(github):
+    github.add("/o/r/tar.gz/abc", make_tarball({"a.py": "x = 1\n", "pkg/b.py": "y = 2\n"}))
+
+    members = [(path, size, open_member().read()) for path, size, open_member in
+               fetch_engine.iter_tarball("o", "r", "abc")]
+
+    assert members == [("a.py", 6, b"x = 1\n"), ("pkg/b.py", 6, b"y = 2\n")]
+
+
+def test_tarball_stream_stops_once_enough_files_are_kept(github):
+    # Incompressible contents, so the archive is much larger than what two files need
+    files = {f"pkg/mod{i:03}.py": "\n".join(f"x{n} = '{os.urandom(30).hex()}'" for n in range(600))
+             for i in range(100)}
+    archive = make_tarball(files)
+    github.add("/o/r/tar.gz/abc", archive)
+
+    run = metrics.begin_run()
+    chunks = repo_crawler.extract_code_files_from_tarball("o", "r", "abc", "r-main", (".py",), 2)
+    metrics.finish_run(run)
+
+    assert [c["filename"] for c in chunks] == ["r-main/pkg/mod000.py", "r-main/pkg/mod001.py"]
+    downloaded = sum(stage.get("bytes_downloaded", 0) for stage in run.stages)
+    assert 0 < downloaded < len(archive) / 4
+
+
+def test_tarball_stream_applies_gitignore_and_gitattributes(github):
+    github.add("/o/r/tar.gz/abc", make_tarball({
+        ".gitignore": "/generated/\n*.tmp.py\n",
+        ".gitattributes": "lib/schema.py linguist-generated\n",
+        "app.py": "print('app')\n",
+        "generated/out.py": "x = 1\n",
+        "notes.tmp.py": "x = 2\n",
+        "lib/schema.py": "x = 3\n",
+        "lib/util.py": "def util():\n    pass\n",
+    }))
+    skipped = []
+
+    chunks = repo_crawler.extract_code_files_from_tarball("o", "r", "abc", "r-main", (".py",), 100, skipped)
+
+    assert sorted(c["filename"] for c in chunks) == ["r-main/app.py", "r-main/lib/util.py"]
+    assert sorted(skipped) == [
+        ("r-main/generated/out.py", "gitignore"),
+        ("r-main/lib/schema.py", "generated"),
+        ("r-main/notes.tmp.py", "gitignore"),
+    ]
+
+
+def test_list_tree_keeps_only_blobs(github):
+    github.add("/repos/o/r/git/trees/abc", json.dumps({"truncated": False, "tree": [
+        {"path": "src", "type": "tree"},
+        {"path": "src/a.py", "type": "blob", "size": 12},
+    ]}).encode())
+
+    assert fetch_engine.list_tree("o", "r", "abc") == {"entries": [{"path": "src/a.py", "size": 12}],
+                                                        "truncated": False}
+    assert github.paths() == ["/repos/o/r/git/trees/abc?recursive=1"]
+
+
+def test_fetch_blobs_keeps_order_and_reports_missing_files(github):
+    github.add("/o/r/abc/a.py", b"a")
+    github.add("/o/r/abc/dir/c%20d.py", b"c")
+
+    fetched = list(fetch_engine.fetch_blobs("o", "r", "abc", ["a.py", "missing.py", "dir/c d.py"], workers=3))
+
+    assert fetched == [("a.py", b"a"), ("missing.py", None), ("dir/c d.py", b"c")]
+
+
+def test_branch_resolved_by_fallback_is_revalidated(github, tmp_path):
+    from snapshot_cache import SnapshotCache
+    github.add("/graphql", repository_reply(default="develop"), method="POST")
+    github.add("/repos/o/r/commits/develop", b"a" * 40, headers={"ETag": '"e1"'})
+    github.add("/repos/o/r/commits/develop", status=304)
+    cache = SnapshotCache(str(tmp_path))
+
+    shas = []
+    for _ in range(3):
+        repo_crawler._ref_memo.clear()
+        repo_crawler._meta_memo.clear()
+        shas.append(repo_crawler.resolve_branch_sha("o", "r", "main", token="t", cache=cache))
+
+    assert shas == ["a" * 40] * 3
+    assert github.paths() == ["/graphql", "/repos/o/r/commits/develop", "/repos/o/r/commits/develop"]
+    assert github.requests[-1][2].get("If-None-Match") == '"e1"'
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+import http_client
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    real_sleep = http_client.time.sleep
+    test_thread = threading.current_thread()
+
+    # time is shared with background threads (e.g. Streamlit's, once sonar_api is imported)
+    def sleep(seconds):
+        if threading.current_thread() is test_thread:
+            slept.append(seconds)
+        else:
+            real_sleep(seconds)
+
+    monkeypatch.setattr(http_client.time, "sleep", sleep)
+    monkeypatch.setattr(http_client, "_backoff", lambda attempt: 0.0)
+    return slept
+
+
+def test_retries_server_errors_until_success(stub_server, sleeps):
+    stub_server.add("/x", status=503)
+    stub_server.add("/x", status=502)
+    stub_server.add("/x", b"ok")
+
+    response = http_client.get(f"{stub_server.url}/x")
+
+    assert response.status_code == 200
+    assert response.content == b"ok"
+    assert len(stub_server.requests) == 3
+    assert len(sleeps) == 2
+
+
+def test_retry_after_sets_the_minimum_wait(stub_server, sleeps):
+    stub_server.add("/x", status=429, headers={"Retry-After": "2"})
+    stub_server.add("/x", b"ok")
+
+    assert http_client.get(f"{stub_server.url}/x").status_code == 200
+    assert sleeps == [2.0]
+
+
+def test_secondary_rate_limit_is_retried(stub_server, sleeps):
+    stub_server.add("/x", status=403, headers={"Retry-After": "1"})
+    stub_server.add("/x", b"ok")
+
+    assert http_client.get(f"{stub_server.url}/x").status_code == 200
+    assert sleeps == [1.0]
+
+
+def test_plain_403_is_returned_without_retrying(stub_server, sleeps):
+    stub_server.add("/x", status=403)
+
+    assert http_client.get(f"{stub_server.url}/x").status_code == 403
+    assert len(stub_server.requests) == 1
+    assert sleeps == []
+
+
+def test_long_retry_after_returns_the_response(stub_server, sleeps):
+    stub_server.add("/x", status=429, headers={"Retry-After": str(int(http_client.MAX_BACKOFF_SECONDS) + 60)})
+    stub_server.add("/x", b"ok")
+
+    assert http_client.get(f"{stub_server.url}/x").status_code == 429
+    assert len(stub_server.requests) == 1
+    assert sleeps == []
+
+
+def test_gives_up_after_max_retries(stub_server, sleeps):
+    stub_server.add("/x", status=500)
+
+    assert http_client.get(f"{stub_server.url}/x", max_retries=2).status_code == 500
+    assert len(stub_server.requests) == 3
+
+
+def test_rate_limit_headers_are_tracked(stub_server):
+    stub_server.add("/x", b"ok", headers={"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "4321",
+                                          "X-RateLimit-Reset": "1700000000"})
+
+    http_client.get(f"{stub_server.url}/x")
+
+    budget = http_client.rate_limits.get("127.0.0.1")
+    assert budget["limit"] == 5000
+    assert budget["remaining"] == 4321
@@ -0,0 +1,96 @@
+from issue_parser import parse_issue, resolve_path, resolve_symbol, index_basenames, exact_hits, line_hits, pin_scores
+
+PYTHON_ISSUE = """Saving a user crashes
+
+```
+Traceback (most recent call last):
+  File "/home/me/project/app/models.py", line 42, in save
+    self.store.put(key)
+KeyError: 'id'
+```
+
+It started after `UserStore.put` changed, see app/store.py:17 and
+https://github.com/o/r/blob/main/app/views.py#L8
+"""
+
+
+def test_python_traceback():
+    parsed = parse_issue(PYTHON_ISSUE)
+
+    assert parsed["frames"] == [{"path": "/home/me/project/app/models.py", "line": 42, "function": "save"}]
+    assert {"path": "app/store.py", "line": 17} in parsed["paths"]
+    assert {"path": "app/views.py", "line": 8} in parsed["paths"]
+    assert parsed["error_classes"] == ["KeyError"]
+    assert "UserStore.put" in parsed["identifiers"]
+
+
+def test_frame_paths_are_not_repeated_as_mentions():
+    parsed = parse_issue(PYTHON_ISSUE)
+
+    assert all(p["path"] != "/home/me/project/app/models.py" for p in parsed["paths"])
+
+
+def test_jvm_and_node_frames():
+    parsed = parse_issue(
+        "java.lang.NullPointerException\n"
+        "    at com.example.billing.Invoice.total(Invoice.java:88)\n"
+        "    at handler (/srv/app/src/api.js:42:7)\n"
+    )
+
+    assert {"path": "com/example/billing/Invoice.java", "line": 88,
+            "function": "com.example.billing.Invoice.total"} in parsed["frames"]
+    assert {"path": "/srv/app/src/api.js", "line": 42, "function": "handler"} in parsed["frames"]
+    assert parsed["error_classes"] == ["NullPointerException"]
+
+
+def test_urls_and_file_names_are_not_identifiers():
+    parsed = parse_issue("See docs.example.com and config.yaml, then call load_config()")
+
+    assert parsed["identifiers"] == ["load_config"]
+
+
+def test_resolve_path_matches_trailing_components():
+    by_basename = index_basenames(["r-main/app/models.py", "r-main/lib/models.py", "r-main/app/views.py"])
+
+    assert resolve_path("/home/me/project/app/models.py", by_basename) == ["r-main/app/models.py"]
+    assert sorted(resolve_path("models.py", by_basename)) == ["r-main/app/models.py", "r-main/lib/models.py"]
+    assert resolve_path("missing.py", by_basename) == []
+
+
+def test_resolve_path_gives_up_when_ambiguous():
+    by_basename = index_basenames([f"r-main/pkg{i}/__init__.py" for i in range(10)])
+
+    assert resolve_path("__init__.py", by_basename) == []
+
+
+def test_resolve_symbol_tries_suffixes_then_prefixes():
+    definitions = {"put": ["a.py", "b.py"], "UserStore": ["store.py"], "UserStore.put": ["store.py"]}
+
+    assert resolve_symbol("app.UserStore.put", definitions) == ["store.py"]
+    assert resolve_symbol("UserStore.missing", definitions) == ["store.py"]
+    assert resolve_symbol("nothing", definitions) == []
+
+
+def test_exact_hits_sum_weights():
+    filenames = ["r-main/app/models.py", "r-main/app/store.py", "r-main/app/views.py"]
+    definitions = {"UserStore.put": ["r-main/app/store.py"], "save": ["r-main/app/models.py"]}
+
+    hits = exact_hits(parse_issue(PYTHON_ISSUE), filenames, definitions)
+
+    assert hits["r-main/app/models.py"] > hits["r-main/app/views.py"]
+    assert hits["r-main/app/store.py"] > hits["r-main/app/views.py"]
+
+
+def test_line_hits():
+    lines = line_hits(parse_issue(PYTHON_ISSUE), ["r-main/app/models.py", "r-main/app/store.py"])
+
+    assert lines == {"r-main/app/models.py": {42}, "r-main/app/store.py": {17}}
+
+
+def test_pin_scores_lift_pinned_files_above_fuzzy_matches():
+    scores = {"fuzzy.py": 12.0, "weak.py": 1.0, "pinned.py": 0.5, "strong.py": 0.1}
+
+    pin_scores(scores, {"pinned.py": 2.0, "strong.py": 3.0})
+
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    assert ranked == ["strong.py", "pinned.py", "fuzzy.py", "weak.py"]
@@ -0,0 +1,135 @@
+import time
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue, job_key
+
+ISSUE = {"number": 7, "title": "Crash on save", "body": "Traceback ...", "url": None, "updatedAt": "2026-01-02T00:00:00Z"}
+
+
+def params(**overrides):
+    base = {"owner": "o", "repo": "r", "branch": "main", "sha": "a" * 40, "issue": dict(ISSUE),
+            "allowed_exts": [".py"], "max_files": 10, "streaming": True, "semantic": False}
+    base.update(overrides)
+    return base
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_job_key_ignores_branch_once_the_commit_is_known():
+    assert job_key(params()) == job_key(params(branch="release"))
+    assert job_key(params()) != job_key(params(sha="b" * 40))
+    assert job_key(params(sha=None)) != job_key(params(sha=None, branch="release"))
+    assert job_key(params(allowed_exts=[".js", ".py"])) == job_key(params(allowed_exts=[".py", ".js"]))
+
+
+def test_submit_deduplicates_identical_jobs(queue):
+    first = queue.submit(params())
+
+    assert queue.submit(params()) == first
+    assert queue.submit(params(issue=dict(ISSUE, updatedAt="2026-02-01T00:00:00Z"))) != first
+    assert queue.counts() == {"queued": 2}
+
+
+def test_submit_reuses_recent_result_but_not_failures(queue):
+    done = queue.submit(params())
+    queue.claim(worker=1)
+    queue.finish(done, result={"content": "ok"})
+    failed = queue.submit(params(sha="b" * 40))
+    queue.claim(worker=1)
+    queue.finish(failed, error="boom")
+
+    assert queue.submit(params()) == done
+    assert queue.submit(params(), reuse_seconds=0) != done
+    assert queue.submit(params(sha="b" * 40)) != failed
+
+
+def test_claim_takes_jobs_in_order_once(queue):
+    first = queue.submit(params())
+    second = queue.submit(params(sha="b" * 40))
+
+    assert queue.claim(worker=1) == (first, params())
+    assert queue.claim(worker=2)[0] == second
+    assert queue.claim(worker=3) is None
+    assert queue.get(first)["status"] == "running"
+    assert queue.get(first)["stage"] == "starting"
+
+
+def test_update_and_finish_are_visible_to_get(queue):
+    job_id = queue.submit(params())
+    queue.claim(worker=1)
+    queue.update(job_id, stage="analyzing", progress="partial answer")
+
+    job = queue.get(job_id)
+    assert (job["status"], job["stage"], job["progress"]) == ("running", "analyzing", "partial answer")
+
+    queue.finish(job_id, result={"content": "answer"})
+    assert queue.get(job_id)["result"] == {"content": "answer"}
+    assert queue.get("missing") is None
+
+
+def test_stale_running_job_is_reclaimed(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "STALE_SECONDS", 0.2)
+    job_id = queue.submit(params())
+    queue.claim(worker=1)
+
+    # Heartbeats keep the job with its worker
+    time.sleep(0.15)
+    queue.update(job_id)
+    time.sleep(0.1)
+    assert queue.claim(worker=2) is None
+
+    # Once they stop, another worker takes the job over
+    time.sleep(0.25)
+    assert queue.claim(worker=2)[0] == job_id
+
+
+def test_heartbeat_touches_job_until_stopped(queue):
+    job_id = queue.submit(params())
+    queue.claim(worker=1)
+    before = queue.get(job_id)["updated"]
+    stop = job_queue.threading.Event()
+    thread = job_queue.threading.Thread(target=job_queue._heartbeat, args=(queue, job_id, stop, 0.05))
+    thread.start()
+    time.sleep(0.2)
+    stop.set()
+    thread.join()
+
+    assert queue.get(job_id)["updated"] > before
+
+
+class FakeStream:
+    content = "answer"
+    citations = []
+    from_cache = False
+
+    def __iter__(self):
+        return iter(["ans", "wer"])
+
+
+def test_run_analysis_job_crawls_the_submitted_commit(monkeypatch):
+    import repo_crawler
+    import sonar_api
+
+    crawled = {}
+
+    def fake_crawl(owner, repo, branch, allowed_exts, max_files, **kwargs):
+        crawled.update(kwargs, branch=branch)
+        return {"sha": kwargs["sha"], "code_chunks": [], "index": None, "from_cache": True}
+
+    monkeypatch.setattr(repo_crawler, "crawl_repo_snapshot", fake_crawl)
+    monkeypatch.setattr(sonar_api, "analyze_issue_relevance", lambda *args, **kwargs: [])
+    monkeypatch.setattr(sonar_api, "stream_sonar_with_context", lambda *args, **kwargs: FakeStream())
+    reports = []
+
+    result = job_queue.run_analysis_job(params(), lambda **kwargs: reports.append(kwargs))
+
+    assert crawled["sha"] == "a" * 40
+    assert crawled["branch"] == "main"
+    assert result["sha"] == "a" * 40
+    assert result["content"] == "answer"
+    assert [r["stage"] for r in reports if "stage" in r] == ["crawling", "ranking", "analyzing"]
@@ -0,0 +1,64 @@
+import pytest
+
+import prefilter
+from prefilter import PathRules
+
+
+@pytest.fixture
+def rules():
+    rules = PathRules()
+    rules.add_gitignore("r-main", "# comment\n*.log.py\n/build/\ndocs/**/gen_*.py\n!keep.log.py\n")
+    rules.add_gitignore("r-main/sub", "local.py\n")
+    rules.add_gitattributes("r-main", "api/*.py linguist-generated\nthird/** linguist-vendored\n"
+                                      "data.py binary\napi/manual.py -linguist-generated\n")
+    return rules
+
+
+@pytest.mark.parametrize("path, reason", [
+    ("r-main/app.py", None),
+    ("r-main/x.log.py", "gitignore"),
+    ("r-main/deep/x.log.py", "gitignore"),
+    ("r-main/keep.log.py", None),
+    ("r-main/build/out.py", "gitignore"),
+    ("r-main/src/build/out.py", None),
+    ("r-main/docs/a/b/gen_x.py", "gitignore"),
+    ("r-main/sub/local.py", "gitignore"),
+    ("r-main/local.py", None),
+    ("r-main/api/client.py", "generated"),
+    ("r-main/api/manual.py", None),
+    ("r-main/third/lib/x.py", "vendored"),
+    ("r-main/data.py", "binary"),
+])
+def test_path_rules_follow_git_matching(rules, path, reason):
+    assert rules.match(path) == reason
+
+
+def test_trailing_slash_only_matches_directories(rules):
+    assert rules.match("r-main/build", is_dir=True) == "gitignore"
+    assert rules.match("r-main/build") is None
+
+
+@pytest.mark.parametrize("path, reason", [
+    ("r/vendor/lib.go", "vendored"),
+    ("r/proto/user_pb2.py", "generated"),
+    ("r/web/app.min.js", "minified"),
+    ("r/src/app.py", None),
+])
+def test_classify_path(path, reason):
+    assert prefilter.classify_path(path) == reason
+
+
+@pytest.mark.parametrize("prefix, reason", [
+    (b"def f():\n    return 1\n", None),
+    (b"\x00\x01\x02binary", "binary"),
+    (b"var a=1;" * 400, "minified"),
+    (b"# Code generated by protoc-gen-go. DO NOT EDIT.\npackage x\n", "generated"),
+    (b"", None),
+])
+def test_sniff(prefix, reason):
+    assert prefilter.sniff(prefix) == reason
+
+
+def test_summarize_skips():
+    skipped = [("a", "gitignore"), ("b", "binary"), ("c", "gitignore")]
+    assert prefilter.summarize_skips(skipped) == {"gitignore": 2, "binary": 1}
@@ -0,0 +1,155 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+import fetch_engine
+import repo_crawler
+from chunk_store import ChunkStore
+from snapshot_cache import SnapshotCache, variant_key
+from test_fetch_engine import make_tarball
+
+SHA = "c" * 40
+
+
+def make_zip(files, root):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for path, content in files.items():
+            archive.writestr(f"{root}/{path}", content)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def web(stub_server, monkeypatch, tmp_path):
+    monkeypatch.setattr(repo_crawler, "GITHUB_WEB_URL", stub_server.url)
+    # The ZIP path extracts under ./repos
+    monkeypatch.chdir(tmp_path)
+    return stub_server
+
+
+def test_zip_crawl_downloads_the_resolved_commit(web):
+    web.add(f"/o/r/archive/{SHA}.zip", make_zip({"app.py": "print('pinned')\n"}, f"r-{SHA}"))
+
+    chunks = repo_crawler.crawl_and_analyze_repo("o", "r", "main", (".py",), 10, ref=SHA)
+
+    assert web.paths() == [f"/o/r/archive/{SHA}.zip"]
+    # Same filenames as a crawl of the branch archive
+    assert [c["filename"] for c in chunks] == ["r-main/app.py"]
+    assert chunks[0]["content"] == "print('pinned')\n"
+
+
+def test_zip_crawl_without_commit_falls_back_to_master(web):
+    web.add("/o/r/archive/refs/heads/main.zip", status=404)
+    web.add("/o/r/archive/refs/heads/master.zip", make_zip({"app.py": "x = 1\n"}, "r-master"))
+
+    chunks = repo_crawler.crawl_and_analyze_repo("o", "r", "main", (".py",), 10)
+
+    assert web.paths() == ["/o/r/archive/refs/heads/main.zip", "/o/r/archive/refs/heads/master.zip"]
+    assert [c["filename"] for c in chunks] == ["r-master/app.py"]
+
+
+def test_missing_commit_archive_is_not_replaced_by_a_branch(web):
+    web.add(f"/o/r/archive/{SHA}.zip", status=404)
+
+    with pytest.raises(Exception, match="HTTP 404"):
+        repo_crawler.crawl_and_analyze_repo("o", "r", "main", (".py",), 10, ref=SHA)
+    assert web.paths() == [f"/o/r/archive/{SHA}.zip"]
+
+
+BASE, HEAD = "a" * 40, "b" * 40
+
+BASE_CHUNKS = [
+    {"filename": "r-main/app.py", "content": "print('old')\n"},
+    {"filename": "r-main/old_name.py", "content": "def moved():\n    pass\n"},
+    {"filename": "r-main/gone.py", "content": "x = 1\n"},
+    {"filename": "r-main/api_pb2.py", "content": "# once hand written\n"},
+]
+
+
+@pytest.fixture
+def github(stub_server, monkeypatch):
+    for name in ("GITHUB_REST_URL", "GITHUB_RAW_URL", "CODELOAD_URL"):
+        monkeypatch.setattr(fetch_engine, name, stub_server.url)
+    return stub_server
+
+
+def compare_reply(files, status="ahead"):
+    return json.dumps({"status": status, "files": files}).encode()
+
+
+def base_chunks():
+    return ChunkStore.from_chunks(BASE_CHUNKS).chunks()
+
+
+def test_incremental_update_applies_compare(github):
+    github.add(f"/repos/o/r/compare/{BASE}...{HEAD}", compare_reply([
+        {"filename": "app.py", "status": "modified"},
+        {"filename": "new name.py", "status": "renamed", "previous_filename": "old_name.py"},
+        {"filename": "gone.py", "status": "removed"},
+        {"filename": "api_pb2.py", "status": "modified"},
+        {"filename": "vendor/lib.py", "status": "added"},
+        {"filename": "README.md", "status": "modified"},
+    ]))
+    github.add(f"/o/r/{HEAD}/app.py", b"print('new')\n")
+    github.add(f"/o/r/{HEAD}/new%20name.py", b"def moved():\n    return 1\n")
+
+    update = repo_crawler.update_snapshot_incremental("o", "r", BASE, HEAD, base_chunks(), (".py",), 10)
+
+    chunks = {c["filename"]: c["content"] for c in update["code_chunks"]}
+    assert chunks == {"r-main/app.py": "print('new')\n", "r-main/new name.py": "def moved():\n    return 1\n"}
+    assert update["changed_paths"] == ["r-main/app.py", "r-main/old_name.py", "r-main/new name.py",
+                                       "r-main/gone.py", "r-main/api_pb2.py"]
+    assert update["skipped"] == [("r-main/api_pb2.py", "generated"), ("r-main/vendor/lib.py", "vendored")]
+    # Only the changed files that pass the pre-filter are downloaded
+    assert sorted(github.paths()) == sorted([f"/repos/o/r/compare/{BASE}...{HEAD}",
+                                             f"/o/r/{HEAD}/app.py", f"/o/r/{HEAD}/new%20name.py"])
+
+
+def test_incremental_update_skips_files_by_content(github):
+    github.add(f"/repos/o/r/compare/{BASE}...{HEAD}", compare_reply([{"filename": "app.py", "status": "modified"}]))
+    github.add(f"/o/r/{HEAD}/app.py", b"\0\1\2binary")
+
+    update = repo_crawler.update_snapshot_incremental("o", "r", BASE, HEAD, base_chunks(), (".py",), 10)
+
+    assert "r-main/app.py" not in [c["filename"] for c in update["code_chunks"]]
+    assert update["changed_paths"] == ["r-main/app.py"]
+    assert update["skipped"] == [("r-main/app.py", "binary")]
+
+
+@pytest.mark.parametrize("reply", [
+    compare_reply([{"filename": f"f{i}.py", "status": "added"} for i in range(repo_crawler.MAX_COMPARE_FILES)]),
+    compare_reply([], status="diverged"),
+])
+def test_incremental_update_gives_up_on_large_or_diverged_compare(github, reply):
+    github.add(f"/repos/o/r/compare/{BASE}...{HEAD}", reply)
+
+    assert repo_crawler.update_snapshot_incremental("o", "r", BASE, HEAD, base_chunks(), (".py",), 10) is None
+    assert github.paths() == [f"/repos/o/r/compare/{BASE}...{HEAD}"]
+
+
+def test_incremental_update_gives_up_when_a_file_is_missing(github):
+    github.add(f"/repos/o/r/compare/{BASE}...{HEAD}", compare_reply([{"filename": "app.py", "status": "modified"}]))
+    github.add(f"/o/r/{HEAD}/app.py", status=404)
+
+    assert repo_crawler.update_snapshot_incremental("o", "r", BASE, HEAD, base_chunks(), (".py",), 10) is None
+
+
+def test_snapshot_crawls_in_full_when_compare_is_too_large(github, tmp_path):
+    cache = SnapshotCache(str(tmp_path / "cache"))
+    variant = variant_key((".py",), 10, repo_crawler.MAX_FILE_CHARS)
+    cache.store("o", "r", BASE, variant, BASE_CHUNKS)
+    cache.set_latest("o", "r", "main", variant, BASE)
+    github.add(f"/repos/o/r/compare/{BASE}...{HEAD}", compare_reply(
+        [{"filename": f"f{i}.py", "status": "added"} for i in range(repo_crawler.MAX_COMPARE_FILES)]))
+    github.add(f"/o/r/tar.gz/{HEAD}", make_tarball({"app.py": "print('head')\n"}))
+
+    snapshot = repo_crawler.crawl_repo_snapshot("o", "r", "main", (".py",), 10, streaming=True,
+                                                cache=cache, sha=HEAD)
+
+    assert [c["filename"] for c in snapshot["code_chunks"]] == ["r-main/app.py"]
+    assert snapshot["from_cache"] is False
+    assert "changed_paths" not in snapshot
+    assert cache.get_latest("o", "r", "main", variant) == HEAD
+    assert not [p for p in github.paths() if p.startswith(f"/o/r/{HEAD}/")]
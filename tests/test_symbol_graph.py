@@ -0,0 +1,88 @@
+import json
+import os
+from array import array
+
+from symbol_graph import SymbolGraph, extract_references
+
+CHUNKS = [
+    {"filename": "r-main/app/store.py", "content": "def load(path):\n    return open(path).read()\n\n\ndef save(path, data):\n    pass\n"},
+    {"filename": "r-main/app/main.py", "content": "from app.store import load\n\n\ndef main():\n    print(load('x'))\n"},
+    {"filename": "r-main/web/client.js", "content": "import { fetchUser } from './api';\n\nfunction render() {\n  return fetchUser(1);\n}\n"},
+    {"filename": "r-main/web/api.js", "content": "export function fetchUser(id) {\n  return id;\n}\n"},
+]
+
+
+def test_build_links_calls_and_imports_to_definitions():
+    graph = SymbolGraph.build(CHUNKS)
+
+    assert graph.ids == ["r-main/app/store.py#0", "r-main/app/store.py#1", "r-main/app/main.py#0",
+                         "r-main/app/main.py#1", "r-main/web/client.js#0", "r-main/web/client.js#1",
+                         "r-main/web/api.js#0"]
+    assert graph.callees("r-main/app/main.py#1") == ["r-main/app/store.py#0"]
+    assert graph.callees("r-main/web/client.js#1") == ["r-main/web/api.js#0"]
+    assert graph.callers("r-main/app/store.py#0") == ["r-main/app/main.py#0", "r-main/app/main.py#1"]
+    assert graph.callers("r-main/app/store.py#1") == []
+
+
+def test_neighbors_lists_callees_then_callers_once():
+    graph = SymbolGraph.build(CHUNKS)
+
+    assert graph.neighbors("r-main/web/api.js#0") == ["r-main/web/client.js#0", "r-main/web/client.js#1"]
+    assert graph.neighbors("r-main/app/main.py#1") == ["r-main/app/store.py#0"]
+    assert graph.neighbors("r-main/missing.py#0") == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "graph.bin")
+    graph = SymbolGraph.build(CHUNKS)
+    graph.save(path)
+
+    loaded = SymbolGraph.load(path, CHUNKS)
+
+    assert loaded.ids == graph.ids
+    assert loaded.edge_count == graph.edge_count
+    assert all(loaded.neighbors(i) == graph.neighbors(i) for i in graph.ids)
+    assert loaded.files["r-main/web/api.js"] is CHUNKS[3]
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp") or f.endswith(".tmp.json")]
+
+
+def test_load_missing_returns_none(tmp_path):
+    assert SymbolGraph.load(str(tmp_path / "graph.bin")) is None
+
+
+def test_load_rejects_files_from_different_builds(tmp_path):
+    old, new = str(tmp_path / "old.bin"), str(tmp_path / "new.bin")
+    SymbolGraph.build(CHUNKS[:2]).save(old)
+    SymbolGraph.build(CHUNKS).save(new)
+
+    # A crash between the two replaces leaves the new arrays next to the old ids
+    os.replace(new, old)
+
+    assert SymbolGraph.load(old, CHUNKS) is None
+
+
+def test_load_rejects_ids_from_a_smaller_graph(tmp_path):
+    path = str(tmp_path / "graph.bin")
+    SymbolGraph.build(CHUNKS).save(path)
+    with open(f"{path}.json", encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["ids"] = meta["ids"][:2]
+    with open(f"{path}.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    assert SymbolGraph.load(path) is None
+
+
+def test_load_rejects_out_of_range_targets(tmp_path):
+    path = str(tmp_path / "graph.bin")
+    SymbolGraph(["a#0", "b#0"], array("I", [0, 1, 1]), array("I", [5]),
+                array("I", [0, 0, 0]), array("I")).save(path)
+
+    assert SymbolGraph.load(path) is None
+
+
+def test_extract_references_reads_imports_and_calls():
+    refs = extract_references("r-main/web/client.js", CHUNKS[2]["content"])
+
+    assert ("fetchUser", "./api") in refs
+    assert ("fetchUser", None) in refs